@@ -5,6 +5,7 @@ import com.traffic.incidentreporter.repository.IncidentRepository;
 import com.traffic.incidentreporter.service.GeminiService;
 import lombok.RequiredArgsConstructor;
 import org.springframework.messaging.simp.SimpMessagingTemplate;
+import org.springframework.data.domain.PageRequest;
 import org.springframework.http.ResponseEntity;
 import org.springframework.web.bind.annotation.*;
 import org.springframework.web.multipart.MultipartFile;
@@ -94,8 +95,20 @@ public class IncidentController {
             @RequestParam(value = "imageAfter", required = false) MultipartFile imageAfter,
             @RequestParam("type") String type,
             @RequestParam(value = "description", required = false) String description,
-            @RequestParam(value = "video", required = false) MultipartFile video
+            @RequestParam(value = "video", required = false) MultipartFile video,
+            @RequestParam(value = "videoUrl", required = false) String videoUrlRef,
+            @RequestParam(value = "idempotencyKey", required = false) String idempotencyKey,
+            @RequestHeader(value = "Idempotency-Key", required = false) String idempotencyHeader
     ) {
+        // 0. Retried upload: return the incident created by the first attempt
+        String key = idempotencyHeader != null ? idempotencyHeader : idempotencyKey;
+        if (key != null) {
+            java.util.Optional<Incident> existing = incidentRepository.findByIdempotencyKey(key);
+            if (existing.isPresent()) {
+                return ResponseEntity.ok(existing.get());
+            }
+        }
+
         // 1. Save Images (if present)
         String[] fileNames = new String[3];
         MultipartFile[] files = {imageBefore, imageDuring, imageAfter};
@@ -134,6 +147,9 @@ public class IncidentController {
             } catch (Exception e) {
                 e.printStackTrace();
             }
+        } else if (videoUrlRef != null && !videoUrlRef.isEmpty()) {
+            // Video already sits in the shared data folder, only its URL is sent
+            videoUrl = videoUrlRef;
         }
 
         // 2. Analyze with Gemini (Multi-image) OR Skip if no images
@@ -173,6 +189,7 @@ public class IncidentController {
         incident.setVideoUrl(videoUrl); // Set the video URL
         incident.setAiReport(aiAnalysis);
         incident.setAlertSent(false);
+        incident.setIdempotencyKey(key);
 
         Incident saved = incidentRepository.save(incident);
 
@@ -192,4 +209,18 @@ public class IncidentController {
     public List<Incident> getAllIncidents() {
         return incidentRepository.findAll();
     }
+
+    /**
+     * One page of incidents with id > afterId, ordered by id.
+     * Clients keep the last id they have seen and ask for the next page until a
+     * page comes back shorter than the limit, so a refresh only transfers new rows.
+     */
+    @GetMapping("/page")
+    public List<Incident> getIncidentPage(
+            @RequestParam(value = "afterId", defaultValue = "0") Long afterId,
+            @RequestParam(value = "limit", defaultValue = "100") int limit
+    ) {
+        int pageSize = Math.max(1, Math.min(limit, 500));
+        return incidentRepository.findByIdGreaterThanOrderByIdAsc(afterId, PageRequest.of(0, pageSize));
+    }
 }
@@ -0,0 +1,119 @@
+package com.traffic.incidentreporter.controller;
+
+import org.springframework.http.HttpStatus;
+import org.springframework.http.ResponseEntity;
+import org.springframework.web.bind.annotation.*;
+
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.nio.file.StandardOpenOption;
+import java.util.HashMap;
+import java.util.Map;
+import java.util.UUID;
+
+/**
+ * Chunked, resumable upload of video evidence.
+ *
+ * Flow: POST /api/uploads (fileName) -> uploadId, then PUT chunks with
+ * ?offset=N in order, then POST /api/uploads/{id}/complete -> videoUrl.
+ * The number of bytes already received is the size of the partial file, so an
+ * interrupted client resumes by asking GET /api/uploads/{id} for the offset.
+ * The returned videoUrl is passed as the "videoUrl" field of /api/incidents/report.
+ */
+@RestController
+@RequestMapping("/api/uploads")
+@CrossOrigin(origins = "*")
+public class UploadController {
+
+    private final Path dataLocation = Paths.get("..", "data").toAbsolutePath().normalize();
+    private final Path uploadLocation = dataLocation.resolve("uploads");
+
+    public UploadController() {
+        try {
+            Files.createDirectories(this.uploadLocation);
+        } catch (Exception ex) {
+            throw new RuntimeException("Could not create the directory for chunked uploads.", ex);
+        }
+    }
+
+    @PostMapping
+    public ResponseEntity<Map<String, Object>> createUpload(
+            @RequestParam("fileName") String fileName) {
+        try {
+            String uploadId = UUID.randomUUID().toString().replace("-", "");
+            String safeName = Paths.get(fileName).getFileName().toString();
+            Files.writeString(uploadLocation.resolve(uploadId + ".name"), safeName);
+            Files.createFile(uploadLocation.resolve(uploadId + ".part"));
+            return ResponseEntity.ok(status(uploadId));
+        } catch (Exception e) {
+            return ResponseEntity.internalServerError().body(Map.of("error", String.valueOf(e.getMessage())));
+        }
+    }
+
+    @GetMapping("/{uploadId}")
+    public ResponseEntity<Map<String, Object>> getUpload(@PathVariable String uploadId) {
+        if (!isKnown(uploadId)) {
+            return ResponseEntity.notFound().build();
+        }
+        try {
+            return ResponseEntity.ok(status(uploadId));
+        } catch (Exception e) {
+            return ResponseEntity.internalServerError().body(Map.of("error", String.valueOf(e.getMessage())));
+        }
+    }
+
+    @PutMapping("/{uploadId}")
+    public synchronized ResponseEntity<Map<String, Object>> appendChunk(
+            @PathVariable String uploadId,
+            @RequestParam("offset") long offset,
+            @RequestBody byte[] chunk) {
+        if (!isKnown(uploadId)) {
+            return ResponseEntity.notFound().build();
+        }
+        try {
+            Path part = uploadLocation.resolve(uploadId + ".part");
+            long received = Files.size(part);
+            if (offset != received) {
+                // Out of order or already received: tell the client where to resume
+                return ResponseEntity.status(HttpStatus.CONFLICT).body(status(uploadId));
+            }
+            Files.write(part, chunk, StandardOpenOption.APPEND);
+            return ResponseEntity.ok(status(uploadId));
+        } catch (Exception e) {
+            return ResponseEntity.internalServerError().body(Map.of("error", String.valueOf(e.getMessage())));
+        }
+    }
+
+    @PostMapping("/{uploadId}/complete")
+    public synchronized ResponseEntity<Map<String, Object>> completeUpload(@PathVariable String uploadId) {
+        if (!isKnown(uploadId)) {
+            return ResponseEntity.notFound().build();
+        }
+        try {
+            Path nameFile = uploadLocation.resolve(uploadId + ".name");
+            String name = "vid_" + System.currentTimeMillis() + "_" + Files.readString(nameFile).trim();
+            Files.move(uploadLocation.resolve(uploadId + ".part"), dataLocation.resolve(name));
+            Files.deleteIfExists(nameFile);
+
+            Map<String, Object> result = new HashMap<>();
+            result.put("uploadId", uploadId);
+            result.put("videoUrl", "/api/videos/download/" + name);
+            return ResponseEntity.ok(result);
+        } catch (Exception e) {
+            return ResponseEntity.internalServerError().body(Map.of("error", String.valueOf(e.getMessage())));
+        }
+    }
+
+    private boolean isKnown(String uploadId) {
+        // Ids are generated hex strings; reject anything else to avoid path traversal
+        return uploadId.matches("[0-9a-f]{32}") && Files.exists(uploadLocation.resolve(uploadId + ".part"));
+    }
+
+    private Map<String, Object> status(String uploadId) throws java.io.IOException {
+        Map<String, Object> result = new HashMap<>();
+        result.put("uploadId", uploadId);
+        result.put("received", Files.size(uploadLocation.resolve(uploadId + ".part")));
+        return result;
+    }
+}
@@ -102,7 +102,9 @@ public class VideoController {
         Map<String, Object> result = new HashMap<>();
         result.put("downloadUrl", "/api/videos/download/" + filename);
         result.put("aiReport", status.aiReport);
-        result.put("incidents", status.incidents);
+        result.put("detectedAccidents", status.detectedAccidents);
+        result.put("detectionCount", status.detectionCount);
+        result.put("timeline", status.timeline);
         
         // Also provide original input video URL for browser playback (H.264 compatible)
         if (status.inputFilePath != null) {
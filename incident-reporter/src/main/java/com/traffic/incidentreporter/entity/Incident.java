@@ -37,4 +37,7 @@ public class Incident {
     private String location; // Could be lat/long or camera ID
 
     private boolean alertSent; // Status of WebSocket alert
+
+    @Column(unique = true)
+    private String idempotencyKey; // Client-supplied key so retried uploads don't create duplicates
 }
@@ -5,6 +5,7 @@ import org.springframework.data.jpa.repository.JpaRepository;
 import org.springframework.stereotype.Repository;
 
 import java.util.List;
+import java.util.Optional;
 
 @Repository
 public interface IncidentRepository extends JpaRepository<Incident, Long> {
@@ -17,4 +18,9 @@ public interface IncidentRepository extends JpaRepository<Incident, Long> {
     Long findMaxId();
 
     boolean existsById(Long id);
+
+    Optional<Incident> findByIdempotencyKey(String idempotencyKey);
+
+    // Keyset paging: incidents after a known id, oldest first (incremental client sync)
+    List<Incident> findByIdGreaterThanOrderByIdAsc(Long id, org.springframework.data.domain.Pageable pageable);
 }
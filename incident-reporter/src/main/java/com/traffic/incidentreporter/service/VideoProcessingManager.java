@@ -7,6 +7,11 @@ import org.springframework.stereotype.Service;
 import org.springframework.web.client.RestTemplate;
 import org.springframework.http.ResponseEntity;
 import java.io.File;
+import java.net.URI;
+import java.net.http.HttpClient;
+import java.net.http.HttpRequest;
+import java.net.http.HttpResponse;
+import java.time.Duration;
 import java.nio.file.Path;
 import java.nio.file.Paths;
 import java.time.LocalDateTime;
@@ -14,6 +19,7 @@ import java.util.HashMap;
 import java.util.Map;
 import java.util.List;
 import java.util.ArrayList;
+import java.util.Iterator;
 import java.util.concurrent.ConcurrentHashMap;
 import java.util.concurrent.ExecutorService;
 import java.util.concurrent.Executors;
@@ -23,6 +29,8 @@ public class VideoProcessingManager {
 
     private final ExecutorService executor = Executors.newFixedThreadPool(3);
     private final RestTemplate restTemplate = new RestTemplate();
+    private final HttpClient eventClient = HttpClient.newBuilder().connectTimeout(Duration.ofSeconds(5)).build();
+    private final ObjectMapper eventMapper = new ObjectMapper();
     private final GeminiService geminiService; 
     private final IncidentRepository incidentRepository; // Inject Repository
     private final String PYTHON_SERVER_URL = "http://localhost:5000";
@@ -45,7 +53,9 @@ public class VideoProcessingManager {
         public String inputFilePath; // NEW: Store input video path for browser playback
         public int progress = 0;
         public String aiReport; 
-        public Object incidents; // List of incidents from JSON
+        public Object detectedAccidents; // Confirmed accidents from JSON (label, time, snapshots, clip)
+        public Integer detectionCount; // Number of raw detections (per-frame details live in the Python event log)
+        public Object timeline; // Run-length detection segments from JSON (columnar: start/end/label/maxConf/meanConf)
         public List<String> snapshotPaths; // ADDED
         public Boolean autoReport = true; // NEW: Auto-report flag
 
@@ -174,12 +184,75 @@ public class VideoProcessingManager {
     }
 
 
+    /**
+     * Follow the Python server's Server-Sent Events stream (/events/{id}) until the job
+     * reaches a terminal state. Progress is applied as it is pushed instead of polled.
+     *
+     * @return true if the stream ran to a terminal event (the caller then reads the final
+     *         state once), false if it could not be used and the caller should poll.
+     */
+    private boolean followStatusEvents(String taskId, TaskStatus localStatus) {
+        try {
+            HttpRequest request = HttpRequest.newBuilder(URI.create(PYTHON_SERVER_URL + "/events/" + taskId))
+                    .header("Accept", "text/event-stream")
+                    .GET()
+                    .build();
+            HttpResponse<java.util.stream.Stream<String>> response =
+                    eventClient.send(request, HttpResponse.BodyHandlers.ofLines());
+            if (response.statusCode() != 200) {
+                return false;
+            }
+
+            try (java.util.stream.Stream<String> body = response.body()) {
+                String event = "message";
+                Iterator<String> lines = body.iterator();
+                while (lines.hasNext()) {
+                    String line = lines.next();
+                    if (line.startsWith("event:")) {
+                        event = line.substring(6).trim();
+                    } else if (line.startsWith("data:")) {
+                        Map<String, Object> data = eventMapper.readValue(line.substring(5).trim(), Map.class);
+                        if ("progress".equals(event) && data.get("progress") instanceof Number) {
+                            int progress = ((Number) data.get("progress")).intValue();
+                            localStatus.progress = progress;
+                            localStatus.status = Status.PROCESSING;
+                            localStatus.message = "Analyzing... " + progress + "%";
+                        } else if ("incident".equals(event)) {
+                            localStatus.message = "Accident detected, capturing evidence...";
+                        } else if ("status".equals(event)) {
+                            String remoteStatus = (String) data.get("status");
+                            if ("COMPLETED".equals(remoteStatus) || "FAILED".equals(remoteStatus) || "STOPPED".equals(remoteStatus)) {
+                                return true;
+                            }
+                        }
+                    } else if (line.isEmpty()) {
+                        event = "message";
+                    }
+                }
+            }
+            // Stream closed without a terminal event (server restarted?): let polling decide
+            return true;
+        } catch (InterruptedException e) {
+            Thread.currentThread().interrupt();
+            return false;
+        } catch (Exception e) {
+            System.err.println("Status event stream unavailable for " + taskId + ", falling back to polling: " + e.getMessage());
+            return false;
+        }
+    }
+
     private void monitorTask(String taskId, String outputPath, Boolean autoReport) {
         TaskStatus localStatus = tasks.get(taskId);
         
+        // Prefer pushed events; the loop below then reads the final state once
+        boolean streamed = followStatusEvents(taskId, localStatus);
+        
         while (true) {
             try {
-                Thread.sleep(1000); 
+                if (!streamed) {
+                    Thread.sleep(1000); 
+                }
+                streamed = false;
                 
                 ResponseEntity<Map> response = restTemplate.getForEntity(PYTHON_SERVER_URL + "/status/" + taskId, Map.class);
                 Map body = response.getBody();
@@ -208,7 +281,10 @@ public class VideoProcessingManager {
                                 ObjectMapper mapper = new ObjectMapper();
                                 Map<String, Object> metadata = mapper.readValue(metadataFile, Map.class);
                                 
-                                localStatus.incidents = metadata.get("incidents");
+                                localStatus.detectedAccidents = metadata.get("detected_accidents");
+                                Object detectionCount = metadata.get("detectionCount");
+                                localStatus.detectionCount = detectionCount instanceof Number ? ((Number) detectionCount).intValue() : null;
+                                localStatus.timeline = metadata.get("timeline");
                                 
                                 boolean hasAccident = (boolean) metadata.getOrDefault("has_accident", false);
                                 List<String> snapshotPaths = (List<String>) metadata.get("snapshot_paths");
@@ -236,6 +312,8 @@ public class VideoProcessingManager {
                                 // PREVENT DOUBLE PROCESSING: Check if Python already generated the report
                                 String existingAiReport = (String) metadata.get("aiReport");
                                 Integer existingIncidentId = (Integer) metadata.get("incidentId");
+                                // Python's report outbox is still uploading: it will create the incident itself
+                                boolean reportQueued = Boolean.TRUE.equals(metadata.get("reportQueued"));
 
                                 // Only run AI analysis if autoReport is enabled
                                 if (autoReport != null && autoReport && hasAccident) {
@@ -258,6 +336,9 @@ public class VideoProcessingManager {
                                              // Let's assume if report exists, the incident creation chain worked.
                                         }
                                         
+                                    } else if (reportQueued) {
+                                        System.out.println("Report for Job " + taskId + " still queued in Python outbox. Skipping local analysis.");
+                                        localStatus.message = "Báo cáo đang được gửi (hàng đợi)";
                                     } else {
                                         // Trigger Gemini (Fallback if Python failed to report)
                                         localStatus.message = "Đang phân tích AI (Đa khung hình)...";
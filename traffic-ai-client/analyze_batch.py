@@ -0,0 +1,178 @@
+"""
+Phân tích hàng loạt video từ dòng lệnh (chế độ Analyst, không cần PyQt / màn hình)
+
+Ví dụ:
+    python analyze_batch.py videos/ "clips/*.mp4" --workers 4 --output data/batch_output/run1
+
+Mỗi video chạy DetectionCore (loop=False) trong một tiến trình của pool; mỗi tiến trình giữ
+mô hình YOLO trong cache nên chỉ tải một lần cho mọi file nó xử lý.
+Kết quả: ảnh chụp sự cố trong <output>/snapshots/<file>/, tóm tắt summary.json và summary.csv.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.detection_core import DATA_DIR, DetectionCore
+
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v")
+DEFAULT_MODEL = os.path.join(CLIENT_DIR, "model", "medium", "mediumv1.pt")
+CSV_FIELDS = ["file", "success", "frames", "seconds", "fps", "incident_id", "snapshots", "clip_start", "clip_end", "output_path", "error"]
+
+
+def collect_videos(inputs):
+    """
+    Danh sách video (không trùng, giữ thứ tự) từ các đường dẫn: thư mục, file hoặc mẫu glob
+    """
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(os.path.join(item, name) for name in os.listdir(item))
+        elif os.path.isfile(item):
+            matches = [item]
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+        for path in matches:
+            path = os.path.abspath(path)
+            if os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS) and path not in videos:
+                videos.append(path)
+    return videos
+
+
+def analyze_file(index, video_path, options):
+    """
+    Xử lý một video trong tiến trình worker
+
+    Returns:
+        dict một dòng của bản tóm tắt
+    """
+    name = f"{index:04d}_{os.path.splitext(os.path.basename(video_path))[0]}"
+    save_path = os.path.join(options["output"], "videos", f"{name}.mp4") if options["save_video"] else None
+    if save_path:
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+
+    core = DetectionCore(
+        model_path=options["model"],
+        source=video_path,
+        save_path=save_path,
+        custom_labels=options["labels"],
+        conf_threshold=options["conf"],
+        loop=False,
+        # Thư mục ảnh riêng cho mỗi file: các tiến trình không ghi đè ảnh của nhau
+        snapshot_dir=os.path.join(options["output"], "snapshots", name)
+    )
+    row = {"file": video_path, "success": False}
+    try:
+        result = core.run()
+    except Exception as e:
+        row["error"] = str(e)
+        return row
+    if result is None:
+        row["error"] = "Cannot load model or open video"
+        return row
+
+    clip_range = result.get("clip_range")
+    row.update({
+        "success": True,
+        "frames": result["frames"],
+        "seconds": result["seconds"],
+        "fps": round(result["frames"] / result["seconds"], 2) if result["seconds"] > 0 else 0.0,
+        "incident_id": result["incident_id"] if result["snapshots"] else None,
+        "snapshots": result["snapshots"],
+        "clip_start": round(clip_range[0], 3) if clip_range else None,
+        "clip_end": round(clip_range[1], 3) if clip_range else None,
+        "output_path": result["output_path"],
+    })
+    return row
+
+
+def write_summary(rows, output_dir, started_at):
+    """Ghi summary.json (có thống kê tổng) và summary.csv (một dòng mỗi file)"""
+    total_frames = sum(r.get("frames") or 0 for r in rows)
+    wall_seconds = time.time() - started_at
+    summary = {
+        "files": len(rows),
+        "succeeded": sum(1 for r in rows if r["success"]),
+        "withIncident": sum(1 for r in rows if r.get("snapshots")),
+        "frames": total_frames,
+        "wallSeconds": round(wall_seconds, 3),
+        "fps": round(total_frames / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "results": rows,
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    with open(os.path.join(output_dir, "summary.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, "snapshots": ";".join(p for p in row.get("snapshots") or [] if p)})
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch accident analysis (Analyst mode)")
+    parser.add_argument("inputs", nargs="+", help="Video files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Output directory (default: data/batch_output/<timestamp>)")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help="YOLO model path")
+    parser.add_argument("-c", "--conf", type=float, default=0.70, help="Confidence threshold (0.0 - 1.0)")
+    parser.add_argument("-l", "--labels", default="accident, vehicle accident", help="Comma-separated target labels")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.environ.get("ANALYST_WORKERS", os.cpu_count() or 1)),
+                        help="Worker processes (default: ANALYST_WORKERS or CPU count)")
+    parser.add_argument("--save-video", action="store_true", help="Also write the annotated video of each file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    videos = collect_videos(args.inputs)
+    if not videos:
+        print("❌ No video files found.")
+        return 1
+
+    output_dir = os.path.abspath(args.output or os.path.join(DATA_DIR, "batch_output", time.strftime("%Y%m%d_%H%M%S")))
+    os.makedirs(output_dir, exist_ok=True)
+    options = {
+        "output": output_dir,
+        "model": args.model,
+        "conf": args.conf,
+        "labels": args.labels,
+        "save_video": args.save_video,
+    }
+    workers = max(1, min(args.workers, len(videos)))
+    print(f"🎬 Analyzing {len(videos)} file(s) with {workers} worker(s) -> {output_dir}")
+
+    started_at = time.time()
+    rows = [None] * len(videos)  # Giữ thứ tự đầu vào dù file nào xong trước
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(analyze_file, i, path, options): i for i, path in enumerate(videos)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:  # Tiến trình worker chết (thiếu bộ nhớ, ...)
+                row = {"file": videos[i], "success": False, "error": str(e)}
+            rows[i] = row
+            name = os.path.basename(videos[i])
+            if row["success"]:
+                status = "incident" if row["snapshots"] else "no incident"
+                print(f"[{done}/{len(videos)}] ✅ {name}: {row['frames']} frames in {row['seconds']:.1f}s "
+                      f"({row['fps']:.1f} fps), {status}")
+            else:
+                print(f"[{done}/{len(videos)}] ❌ {name}: {row.get('error')}")
+
+    summary = write_summary(rows, output_dir, started_at)
+    print(f"📊 {summary['succeeded']}/{summary['files']} succeeded, {summary['withIncident']} with incident, "
+          f"{summary['frames']} frames in {summary['wallSeconds']:.1f}s ({summary['fps']:.1f} fps overall)")
+    print(f"📝 Summary: {os.path.join(output_dir, 'summary.json')}")
+    return 0 if summary["succeeded"] == summary["files"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
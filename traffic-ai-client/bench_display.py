@@ -0,0 +1,115 @@
+"""
+Benchmark thời gian xử lý mỗi frame trên thread GUI của khung xem trực tiếp
+
+So sánh đường cũ của convert_cv_qt (cvtColor BGR->RGB, QImage RGB888, scaled(800, 600), QPixmap.fromImage)
+với đường mới (thread phát hiện scale sẵn vào bộ đệm của FrameBufferPool, GUI chỉ bọc Format_BGR888
+và QPixmap.fromImage). Thời gian scale phía thread phát hiện được in riêng.
+
+Ví dụ:
+    python bench_display.py --frames 1000 --label 996x696
+    python bench_display.py --video ../data/sample.mp4
+"""
+import argparse
+import os
+import time
+
+# Chạy được trên máy không có màn hình
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+import numpy as np
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QApplication
+
+from utils.frame_buffer_pool import FrameBufferPool, fit_size
+
+
+def load_frames(args):
+    """Frame đầu vào giống DetectionCore gửi ra: tối đa 640px chiều rộng"""
+    frames = []
+    if args.video:
+        cap = cv2.VideoCapture(args.video)
+        while len(frames) < args.frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            h, w = frame.shape[:2]
+            if w > 640:
+                frame = cv2.resize(frame, (640, int(h * 640 / w)))
+            frames.append(frame)
+        cap.release()
+    if not frames:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (360, 640, 3), dtype=np.uint8) for _ in range(min(args.frames, 64))]
+    return frames
+
+
+def old_path(frame):
+    rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    h, w, ch = rgb_image.shape
+    image = QImage(rgb_image.data, w, h, ch * w, QImage.Format.Format_RGB888)
+    return QPixmap.fromImage(image.scaled(800, 600, Qt.AspectRatioMode.KeepAspectRatio))
+
+
+def worker_scale(frame, pool, label_size):
+    """Phần việc chuyển sang thread phát hiện (giống DetectionThread._publish_frame)"""
+    h, w = frame.shape[:2]
+    target_w, target_h = fit_size(w, h, *label_size)
+    buffer = pool.acquire(target_h, target_w)
+    interpolation = cv2.INTER_AREA if target_w < w else cv2.INTER_LINEAR
+    cv2.resize(frame, (target_w, target_h), dst=buffer, interpolation=interpolation)
+    return buffer
+
+
+def new_path(buffer):
+    h, w, ch = buffer.shape
+    image = QImage(buffer.data, w, h, buffer.strides[0], QImage.Format.Format_BGR888)
+    return QPixmap.fromImage(image)
+
+
+def report(name, samples):
+    samples = np.array(samples) * 1000
+    print(f"{name:<28} mean {samples.mean():7.3f} ms   p50 {np.percentile(samples, 50):7.3f} ms   "
+          f"p95 {np.percentile(samples, 95):7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live view GUI-thread conversion benchmark")
+    parser.add_argument("--frames", type=int, default=500, help="Frames to convert per path")
+    parser.add_argument("--video", default=None, help="Use frames from this video instead of random data")
+    parser.add_argument("--label", default="996x696", help="Live view size WIDTHxHEIGHT for the new path")
+    args = parser.parse_args()
+    label_size = tuple(int(v) for v in args.label.lower().split("x"))
+
+    app = QApplication([])  # QPixmap cần một QGuiApplication
+    frames = load_frames(args)
+    pool = FrameBufferPool(size=3)
+    print(f"{args.frames} frames, input {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"label {label_size[0]}x{label_size[1]}, platform {app.platformName()}")
+
+    old_gui, new_gui, new_worker = [], [], []
+    for i in range(args.frames):
+        frame = frames[i % len(frames)]
+
+        start = time.perf_counter()
+        old_path(frame)
+        old_gui.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        buffer = worker_scale(frame, pool, label_size)
+        new_worker.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        new_path(buffer)
+        new_gui.append(time.perf_counter() - start)
+        pool.release(buffer)
+
+    report("before: GUI thread", old_gui)
+    report("after:  GUI thread", new_gui)
+    report("after:  detection thread", new_worker)
+    print(f"GUI-thread time per frame: {np.mean(old_gui) / max(np.mean(new_gui), 1e-9):.1f}x less")
+
+
+if __name__ == "__main__":
+    main()
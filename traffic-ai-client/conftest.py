@@ -0,0 +1 @@
+# pytest chạy từ thư mục traffic-ai-client: thư mục này được thêm vào sys.path nên `import utils...` dùng được trong tests/
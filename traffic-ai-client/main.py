@@ -1,3 +1,6 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Mốc đo thời gian khởi động (startup_report)
+
 import sys
 import cv2
 import numpy as np
@@ -7,16 +10,23 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QTextEdit, QComboBox, QSlider,
     QTabWidget, QGroupBox, QFileDialog, QStatusBar, QGridLayout,
-    QTableWidget, QTableWidgetItem, QHeaderView, QDialog, QSizePolicy,
-    QScrollArea, QStackedWidget, QProgressBar, QSplitter, QListWidget, QListWidgetItem
+    QTableView, QHeaderView, QDialog, QSizePolicy,
+    QScrollArea, QStackedWidget, QProgressBar, QSplitter, QListWidget, QListWidgetItem, QSpinBox
 )
 from PyQt6.QtGui import QPixmap, QImage, QFont
-from PyQt6.QtCore import pyqtSlot, Qt, QThread, QDateTime
+from PyQt6.QtCore import pyqtSlot, Qt, QThread, QDateTime, QTimer, QSortFilterProxyModel
 
-from utils.detection_thread import DetectionThread
+# ultralytics/PyTorch chỉ được import khi mô hình được tải lần đầu (model_cache, trong thread nền)
+from utils.detection_thread import DetectionThread, STOP_TIMEOUT_MS
+from utils.model_cache import get_model_cache
+from utils.lazy_import import startup_report
 from utils.api_client import APIClient
+from utils.api_executor import get_api_executor
+from utils.thumbnail_cache import get_thumbnail_cache
+from utils.incident_cache import IncidentCache, fetch_new_incidents, revalidate_incidents
+from widgets.incident_table_model import IncidentTableModel
 from PyQt6.QtWidgets import QCheckBox
-from PyQt6.QtCore import pyqtSignal, QThread
+from PyQt6.QtCore import pyqtSignal, QThread, QObject
 
 class ReportWorker(QThread):
     finished = pyqtSignal(dict)
@@ -52,15 +62,25 @@ class ReportWorker(QThread):
         except Exception as e:
             self.finished.emit({'success': False, 'report': str(e)})
 
-class ReportWorker(QThread):
+class ReportWorker(QObject):
+    """
+    Tạo báo cáo AI trong thread pool API dùng chung (get_api_executor), không chặn UI thread
+    Signal finished/progress được phát từ thread nền và nhận trên thread GUI
+    """
     finished = pyqtSignal(dict)
+    progress = pyqtSignal(int)  # Tiến độ upload video bằng chứng (phần trăm)
     
-    def __init__(self, generator, snapshots, incident_id=None, video_source=None):
+    def __init__(self, generator, snapshots, incident_id=None, video_source=None, clip_range=None):
         super().__init__()
         self.generator = generator
         self.snapshots = snapshots
         self.incident_id = incident_id
         self.video_source = video_source
+        self.clip_range = clip_range  # (start, end) giây: chỉ gửi clip quanh sự cố
+
+    def start(self):
+        """Đưa việc tạo báo cáo vào hàng đợi của thread pool API"""
+        get_api_executor().submit(self.run)
         
     def run(self):
         try:
@@ -78,13 +98,20 @@ class ReportWorker(QThread):
 
              # Nếu incident_id được truyền vào constructor, ta có thể dùng nó (tùy logic)
              # Ở đây ta gọi generator
-             result = self.generator.generate_report(p1, p2, p3, type_to_send, self.video_source)
+             result = self.generator.generate_report(
+                 p1, p2, p3, type_to_send, self.video_source,
+                 clip_range=self.clip_range,
+                 progress_callback=lambda sent, total: self.progress.emit(int(sent * 100 / total) if total else 100)
+             )
              self.finished.emit(result)
         except Exception as e:
              print(f"ReportWorker API Error: {e}")
              self.finished.emit({'success': False, 'report': str(e)})
 
 class TrafficMonitorApp(QMainWindow):
+    model_preloaded = pyqtSignal(str, object)  # (model_path, exception or None), emitted from the preload thread
+    LIVE_MODEL_PATHS = ['model/small/best.pt', 'model/medium/mediumv1.pt']  # combo_model order, as in start_detection
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("🚦 Smart Traffic Incident Reporter")
@@ -100,6 +127,7 @@ class TrafficMonitorApp(QMainWindow):
         self.is_dark_mode = True  # Theo dõi trạng thái theme (sáng/tối)
         self.api_client = APIClient()  # Client để gọi API backend
         self.thread = None  # Thread xử lý phát hiện
+        self.retired_threads = set()  # Thread đã được yêu cầu dừng, giữ tham chiếu đến khi thoát hẳn
         
         # Khởi tạo bộ sinh báo cáo AI với API client
         from utils.report_generator import ReportGenerator
@@ -107,6 +135,7 @@ class TrafficMonitorApp(QMainWindow):
         
         # Thiết lập giao diện người dùng
         self.setup_ui()
+        self.model_preloaded.connect(self.on_model_preloaded)
         
     def setup_ui(self):
         """
@@ -152,6 +181,15 @@ class TrafficMonitorApp(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Ready")
+
+        # Background API calls (incident reports, uploads, history) still in flight
+        self.lbl_pending_uploads = QLabel("")
+        self.status_bar.addPermanentWidget(self.lbl_pending_uploads)
+        get_api_executor().pending_changed.connect(self.update_pending_uploads)
+        self.update_pending_uploads(get_api_executor().pending)
+
+    def update_pending_uploads(self, count):
+        self.lbl_pending_uploads.setText(f"⬆️ {count} pending" if count else "")
         
     def setup_live_tab(self):
         layout = QHBoxLayout(self.tab_live)
@@ -178,6 +216,8 @@ class TrafficMonitorApp(QMainWindow):
         self.image_label.setText("📹 No Video Feed")
         self.image_label.setStyleSheet("background: #1a1a1a; border: 2px solid #444; border-radius: 8px;")
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        # Frames arrive at exactly the label's size; don't let the pixmap drive the layout
+        self.image_label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         self.stack_video.addWidget(self.image_label)
         
         # Trang 1: Chỗ giữ chỗ cho Trình phát video (Thêm động)
@@ -281,6 +321,7 @@ class TrafficMonitorApp(QMainWindow):
             "Medium v1 (Accurate)"
         ])
         self.combo_model.setCurrentIndex(1)
+        self.combo_model.currentIndexChanged.connect(lambda _: self.preload_model())
         model_layout.addWidget(self.combo_model)
         model_group.setLayout(model_layout)
         right_panel.addWidget(model_group)
@@ -315,6 +356,12 @@ class TrafficMonitorApp(QMainWindow):
         self.chk_live_auto_report.setToolTip("Automatically generate AI report when accident is confirmed")
         ai_layout.addWidget(self.chk_live_auto_report)
         
+        # Chỉ upload clip quanh sự cố (trước -> sau) thay vì cả video
+        self.chk_live_clip_only = QCheckBox("Upload Incident Clip Only")
+        self.chk_live_clip_only.setToolTip("Send only the clip around the incident instead of the whole video")
+        self.chk_live_clip_only.setChecked(True)
+        ai_layout.addWidget(self.chk_live_clip_only)
+        
         # Nút Báo Cáo Thủ Công
         # Cho phép người dùng tạo báo cáo bất cứ lúc nào khi có ảnh chụp
         self.btn_manual_report = QPushButton("📄 Tạo Báo Cáo Ngay")
@@ -563,6 +610,14 @@ class TrafficMonitorApp(QMainWindow):
         
         layout_detect.addWidget(self.lbl_conf_val)
         layout_detect.addWidget(self.scan_conf_slider)
+
+        # Files analyzed at once (one DetectionThread each, models come from the shared cache)
+        layout_detect.addWidget(QLabel("Parallel Files:"))
+        self.scan_workers_spin = QSpinBox()
+        self.scan_workers_spin.setRange(1, os.cpu_count() or 1)
+        self.scan_workers_spin.setValue(min(int(os.environ.get("ANALYST_WORKERS", 1)), os.cpu_count() or 1))
+        self.scan_workers_spin.setToolTip("Number of videos processed concurrently in a batch")
+        layout_detect.addWidget(self.scan_workers_spin)
         layout_right_wrapper.addWidget(grp_detect)
         
         # Report Group
@@ -572,6 +627,10 @@ class TrafficMonitorApp(QMainWindow):
         self.scan_ai_combo = QComboBox()
         self.scan_ai_combo.addItems(["Gemini Cloud", "None"])
         layout_report.addWidget(self.chk_auto_report)
+        self.chk_clip_only = QCheckBox("Upload Incident Clip Only")
+        self.chk_clip_only.setToolTip("Send only the clip around the incident instead of the whole video")
+        self.chk_clip_only.setChecked(True)
+        layout_report.addWidget(self.chk_clip_only)
         layout_report.addWidget(self.scan_ai_combo)
         
         # Manual Report Button
@@ -651,18 +710,20 @@ class TrafficMonitorApp(QMainWindow):
         
         # Refresh button
         btn_refresh = QPushButton("🔄 Refresh")
-        btn_refresh.clicked.connect(self.load_history)
+        btn_refresh.setToolTip("Reload the whole history from the backend (picks up status changes and deletions)")
+        btn_refresh.clicked.connect(self.revalidate_history)
         btn_refresh.setMaximumWidth(150)
         header_layout.addWidget(btn_refresh)
         
         header_layout.addStretch()
         layout.addLayout(header_layout)
         
-        # Table widget
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(5)
-        self.history_table.setHorizontalHeaderLabels(["ID", "Timestamp", "Type", "Location", "Report"])
-        self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        # Table view (model/view: no widget per row)
+        self.history_model = IncidentTableModel(self)
+        self.history_proxy = QSortFilterProxyModel(self)
+        self.history_proxy.setSourceModel(self.history_model)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_proxy)
         self.history_table.verticalHeader().setVisible(False) # HIDE ROW NUMBERS
         self.history_table.setAlternatingRowColors(True)
         
@@ -676,48 +737,92 @@ class TrafficMonitorApp(QMainWindow):
         self.history_table.setColumnWidth(4, 100)
         
         # Set table properties
-        self.history_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.history_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.history_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.history_table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
         self.history_table.setSortingEnabled(True)
+        self.history_table.sortByColumn(0, Qt.SortOrder.DescendingOrder)
+        # "View" cell or double-click on a row opens the detail dialog
+        self.history_table.clicked.connect(self.on_history_clicked)
+        self.history_table.doubleClicked.connect(self.open_history_row)
         
         layout.addWidget(self.history_table)
         
-        # Auto-load on tab creation
-        self.load_history()
+        # Show the on-disk cache first (read in the background), then fetch what's new:
+        # window construction never waits on the backend
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.incident_cache = IncidentCache(os.path.join(project_root, "data", "cache", "history.json"))
+        self.history_syncing = True
+        get_api_executor().submit(self.incident_cache.load, on_result=self.on_history_cache_loaded,
+                                  on_error=self.on_history_sync_failed)
+
+    def on_history_cache_loaded(self, incidents):
+        self.history_model.set_incidents(incidents)
+        if incidents:
+            self.log(f"📊 Showing {len(incidents)} cached incidents")
+        self.history_syncing = False
+        # New incidents only, unless the last full check is older than HISTORY_REVALIDATE_SECONDS
+        if self.incident_cache.needs_revalidation(float(os.environ.get("HISTORY_REVALIDATE_SECONDS", 3600))):
+            self.revalidate_history()
+        else:
+            self.load_history()
     
     def load_history(self):
-        """Load detection history from Java backend"""
+        """Fetch incidents newer than the cache from the Java backend, page by page, in the background"""
+        if self.history_syncing:
+            return
+        self.history_syncing = True
+        self.history_new_count = 0
         self.log("📊 Loading history from backend...")
-        
-        incidents = self.api_client.get_history(limit=100)
-        
-        self.history_table.setRowCount(0)  # Clear existing
-        
-        for incident in incidents:
-            row = self.history_table.rowCount()
-            self.history_table.insertRow(row)
-            
-            # ID
-            self.history_table.setItem(row, 0, QTableWidgetItem(str(incident.get('id', ''))))
-            
-            # Timestamp
-            timestamp = incident.get('timestamp', '')
-            self.history_table.setItem(row, 1, QTableWidgetItem(timestamp))
-            
-            # Type
-            incident_type = incident.get('type', 'Unknown')
-            self.history_table.setItem(row, 2, QTableWidgetItem(incident_type))
-            
-            # Location
-            location = incident.get('location', 'N/A')
-            self.history_table.setItem(row, 3, QTableWidgetItem(location))
-            
-            # View Report button
-            btn_view = QPushButton("View")
-            btn_view.clicked.connect(lambda checked, inc=incident: self.view_incident_detail(inc))
-            self.history_table.setCellWidget(row, 4, btn_view)
-        
-        self.log(f"✅ Loaded {len(incidents)} historical incidents")
+        self.fetch_history_page()
+
+    def fetch_history_page(self):
+        get_api_executor().submit(fetch_new_incidents, self.api_client, self.incident_cache,
+                                  on_result=self.on_history_page, on_error=self.on_history_sync_failed)
+
+    def on_history_page(self, result):
+        """One page arrived: show it right away, ask for the next one if the page was full"""
+        if result is None:
+            self.history_syncing = False
+            self.log("⚠️ Backend unavailable, showing cached history")
+            return
+        page, more = result
+        self.history_model.add_incidents(page)
+        self.history_new_count += len(page)
+        if more:
+            self.fetch_history_page()
+            return
+        self.history_syncing = False
+        self.log(f"✅ Loaded {self.history_model.rowCount()} historical incidents ({self.history_new_count} new)")
+
+    def revalidate_history(self):
+        """Reload every page from the backend and replace the cache (drops incidents deleted on the backend)"""
+        if self.history_syncing:
+            return
+        self.history_syncing = True
+        self.log("📊 Reloading full history from backend...")
+        get_api_executor().submit(revalidate_incidents, self.api_client, self.incident_cache,
+                                  on_result=self.on_history_revalidated, on_error=self.on_history_sync_failed)
+
+    def on_history_revalidated(self, result):
+        self.history_syncing = False
+        if result is None:
+            self.log("⚠️ Backend unavailable, showing cached history")
+            return
+        incidents, removed = result
+        self.history_model.set_incidents(incidents)
+        self.log(f"✅ Loaded {len(incidents)} historical incidents ({removed} removed)")
+
+    def on_history_sync_failed(self, error):
+        self.history_syncing = False
+        self.log(f"⚠️ History refresh failed: {error}")
+
+    def on_history_clicked(self, index):
+        if index.column() == IncidentTableModel.REPORT_COLUMN:
+            self.open_history_row(index)
+
+    def open_history_row(self, index):
+        row = self.history_proxy.mapToSource(index).row()
+        self.view_incident_detail(self.history_model.incident_at(row))
     
     def view_incident_detail(self, incident):
         """Show incident detail dialog"""
@@ -808,8 +913,18 @@ class TrafficMonitorApp(QMainWindow):
                             local_path = p
                             break
                             
-                if local_path and os.path.exists(local_path):
-                     img_lbl.setPixmap(QPixmap(local_path))
+                # 3. Not on this machine: fetch from the Python server (/data/<file>)
+                if not local_path and isinstance(path_url, str) and path_url:
+                    server_url = os.environ.get("PYTHON_SERVER_URL", "http://localhost:5000").rstrip("/")
+                    if path_url.startswith(("http://", "https://")):
+                        local_path = path_url
+                    elif path_url.startswith("/"):
+                        local_path = server_url + path_url
+                    else:
+                        local_path = f"{server_url}/data/{os.path.basename(path_url)}"
+                            
+                if local_path:
+                     self.load_thumbnail(img_lbl, local_path, 280, 180)
                 else:
                      img_lbl.setText(f"Missing File\n{os.path.basename(path_url) if isinstance(path_url, str) else 'Invalid'}")
                      img_lbl.setStyleSheet("border: 1px dashed red; color: red;")
@@ -986,6 +1101,7 @@ class TrafficMonitorApp(QMainWindow):
         conf_threshold = self.slider_conf.value() / 100.0
         conf_threshold = self.slider_conf.value() / 100.0
         self.thread = DetectionThread(model_path=model_path, source=self.source, save_path=self.output_path, conf_threshold=conf_threshold, loop=True)
+        self.sync_display_size()
         self.thread.change_pixmap_signal.connect(self.update_image)
         self.thread.detection_signal.connect(self.handle_detection)
         self.thread.snapshot_saved.connect(self.display_snapshots)  # NEW: Connect snapshot signal
@@ -1012,34 +1128,35 @@ class TrafficMonitorApp(QMainWindow):
         has_snaps = hasattr(self, 'snapshot_paths') and all(self.snapshot_paths)
         if has_snaps and self.combo_ai_model.currentIndex() > 0:
              self.log("🤖 Video finished. Generating Final AI Report...")
-             QApplication.processEvents()  # Cập nhật UI ngay
              
-             path_before, path_during, path_after = self.snapshot_paths
-             incident_type = "vehicle accident"  # Có thể dùng self.last_detection_type nếu đã lưu
-             
-             # Gọi generator với đường dẫn VIDEO
+             # Gọi generator với đường dẫn VIDEO (trong thread pool API, không chặn UI)
              video_path_to_send = self.output_path if self.output_path and os.path.exists(self.output_path) else None
              self.log(f"📤 Uploading report with video: {os.path.basename(video_path_to_send) if video_path_to_send else 'None'}")
              
-             result = self.report_generator.generate_report(
-                 path_before, path_during, path_after, incident_type, video_path=video_path_to_send
-             )
-             
-             if result['success']:
-                self.log(f"✅ Final Report Generated! ID: {result['incident_id']}")
-                self.last_report_text = result['report']
-                if hasattr(self, 'btn_view_report'): self.btn_view_report.setEnabled(True)
-                self.show_report_dialog(result['report'], [path_before, path_during, path_after])
-             else:
-                self.log(f"⚠️ Report Generation Failed: {result.get('report', 'Unknown error')}")
-                self.last_report_text = result.get('report', 'Unknown error')
-                if hasattr(self, 'btn_view_report'): self.btn_view_report.setEnabled(True)
-                self.show_report_dialog(result.get('report', 'Unknown error'), [path_before, path_during, path_after])
+             clip_range = self.thread.incident_clip_range if self.chk_live_clip_only.isChecked() else None
+             self.final_report_worker = ReportWorker(self.report_generator, list(self.snapshot_paths), None, video_path_to_send, clip_range)
+             self.final_report_worker.progress.connect(self.show_upload_progress)
+             self.final_report_worker.finished.connect(
+                 lambda result, snaps=list(self.snapshot_paths): self.on_final_report_finished(result, snaps))
+             self.final_report_worker.start()
         
         # Hiển thị video đầu ra nếu có
         if self.output_path and os.path.exists(self.output_path):
             self.log(f"🎬 Loading playback: {os.path.basename(self.output_path)}")
             self.show_video_player(self.output_path)
+
+    def on_final_report_finished(self, result, snapshots):
+        """Báo cáo cuối phiên live đã được tạo (hoặc thất bại)"""
+        if result['success']:
+            self.log(f"✅ Final Report Generated! ID: {result['incident_id']}")
+            self.last_report_text = result['report']
+            if hasattr(self, 'btn_view_report'): self.btn_view_report.setEnabled(True)
+            self.show_report_dialog(result['report'], snapshots)
+        else:
+            self.log(f"⚠️ Report Generation Failed: {result.get('report', 'Unknown error')}")
+            self.last_report_text = result.get('report', 'Unknown error')
+            if hasattr(self, 'btn_view_report'): self.btn_view_report.setEnabled(True)
+            self.show_report_dialog(result.get('report', 'Unknown error'), snapshots)
     
     def show_video_player(self, video_path):
         """
@@ -1073,11 +1190,17 @@ class TrafficMonitorApp(QMainWindow):
     
     # --- ANALYST TAB LOGIC ---
     # --- ANALYST TAB LOGIC ---
-    @pyqtSlot(int)
-    def update_analyst_progress(self, val):
-        """Update progress bar during analysis"""
-        self.analyst_progress.setValue(val)
-        self.lbl_analyst_loading.setText(f"Analyzing... {val}%")
+    def update_analyst_progress(self, index, val):
+        """Per-file progress: shown on the file's list row, the bar shows the whole batch"""
+        if index >= len(self.analyst_progress_by_file):
+            return  # Late signal from a cancelled batch
+        self.analyst_progress_by_file[index] = val
+        item = self.list_analyst_results.item(index)
+        if item is not None and self.analyst_results[index] is None:
+            item.setText(f"⏳ {os.path.basename(self.analyst_queue[index])} ({val}%)")
+        total = int(sum(self.analyst_progress_by_file) / len(self.analyst_progress_by_file))
+        self.analyst_progress.setValue(total)
+        self.lbl_analyst_loading.setText(f"Analyzing... {total}%")
 
     @pyqtSlot(str, str)
     def handle_analyst_detection(self, label, conf):
@@ -1088,9 +1211,12 @@ class TrafficMonitorApp(QMainWindow):
     def select_analyst_video(self):
         """Select multiple videos for batch analysis"""
         # 1. CLEANUP PREVIOUS RUN
-        if hasattr(self, 'analyst_thread') and self.analyst_thread and self.analyst_thread.isRunning():
-            self.analyst_thread.stop()
-            self.analyst_thread.wait()
+        running = [t for t in getattr(self, 'analyst_threads', {}).values() if t.isRunning()]
+        if running:
+            self.analyst_queue = []  # Nothing more gets started while we stop
+            for thread in running:
+                self.retire_thread(thread)
+            self.analyst_threads = {}
             self.log("⏹️ Stopped previous analysis.")
 
         # 2. SELECT FILES
@@ -1105,7 +1231,6 @@ class TrafficMonitorApp(QMainWindow):
         if file_names:
             # RESET/OVERWRITE QUEUE
             self.analyst_queue = file_names
-            self.current_batch_index = 0
             self.analyst_results = []
             
             # --- CLEAR LIST WIDGET (Don't populate yet) ---
@@ -1132,48 +1257,60 @@ class TrafficMonitorApp(QMainWindow):
             
         self.btn_analyze.setEnabled(False)
         self.btn_analyze.setText("⏳ Processing Batch...")
-        self.analyst_results = [] # Clear previous results
-        self.current_batch_index = 0
+
+        # One slot per queued file: results and list rows keep queue order
+        # no matter which file finishes first
+        self.analyst_results = [None] * len(self.analyst_queue)
+        self.analyst_progress_by_file = [0] * len(self.analyst_queue)
+        self.analyst_threads = {}  # queue index -> running DetectionThread
+        self.analyst_next_index = 0
+        self.analyst_workers = self.scan_workers_spin.value()
+
+        self.list_analyst_results.clear()
+        for path in self.analyst_queue:
+            self.list_analyst_results.addItem(QListWidgetItem(f"⏳ {os.path.basename(path)}"))
+        self.analyst_stack.setCurrentIndex(1)
         
         self.process_next_in_queue()
 
     def process_next_in_queue(self):
-        """Process the next video in the queue"""
-        if self.current_batch_index >= len(self.analyst_queue):
+        """Start queued videos until `analyst_workers` files are being processed"""
+        while len(self.analyst_threads) < self.analyst_workers and self.analyst_next_index < len(self.analyst_queue):
+            self.start_analyst_file(self.analyst_next_index)
+            self.analyst_next_index += 1
+
+        if not self.analyst_threads:
             self.on_batch_finished()
             return
-            
-        current_file = self.analyst_queue[self.current_batch_index]
-        current_file = self.analyst_queue[self.current_batch_index]
-        self.lbl_status_analyst.setText(f"Processing {self.current_batch_index + 1}/{len(self.analyst_queue)}: {os.path.basename(current_file)}")
+
+        done = sum(1 for r in self.analyst_results if r is not None)
+        running = [os.path.basename(self.analyst_queue[i]) for i in sorted(self.analyst_threads)]
+        self.lbl_status_analyst.setText(f"Processing {len(running)} file(s), {done}/{len(self.analyst_queue)} done")
         
         # Update center label text (truncated if needed)
-        f_name = os.path.basename(current_file)
+        f_name = ", ".join(running)
         if len(f_name) > 40: f_name = f_name[:37] + "..."
         self.lbl_processing_file.setText(f"Processing: {f_name}")
+
+    def start_analyst_file(self, index):
+        """Start a DetectionThread for one queued video"""
+        current_file = self.analyst_queue[index]
         
         # Get settings
         model_path = self.scan_model_combo.currentText().strip()
         conf_threshold = self.scan_conf_slider.value() / 100.0
         
-        # Clear UI for new processing
-        # Clear UI for new processing
-        if self.current_batch_index == 0:
-            self.analyst_stack.setCurrentIndex(1)
-            # if hasattr(self, 'analyst_snapshot_group'): self.analyst_snapshot_group.hide() # Optional, maybe keep visible
-
-        
         # Generate Output Path (Force Project Root)
         client_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(client_dir)
         output_dir = os.path.join(project_root, "data", "analyst_output")
         os.makedirs(output_dir, exist_ok=True)
         timestamp = QDateTime.currentDateTime().toString("yyyyMMdd_HHmmss")
-        # Unique name per file
+        # Unique name per file (index: files with the same name from different folders)
         base_name = os.path.splitext(os.path.basename(current_file))[0]
-        save_path = f"{output_dir}/analyst_{base_name}_{timestamp}.mp4"
+        save_path = f"{output_dir}/analyst_{base_name}_{timestamp}_{index}.mp4"
         
-        self.analyst_thread = DetectionThread(
+        thread = DetectionThread(
             source=current_file,
             model_path=model_path,
             conf_threshold=conf_threshold,
@@ -1181,33 +1318,41 @@ class TrafficMonitorApp(QMainWindow):
             loop=False # Analyst mode: No looping
         )
         
-        self.analyst_thread.progress_signal.connect(self.update_analyst_progress)
+        thread.progress_signal.connect(lambda val, i=index: self.update_analyst_progress(i, val))
         # We don't connect detection_signal to UI to avoid spamming
-        self.analyst_thread.process_finished_signal.connect(self.on_single_file_finished)
-        self.analyst_thread.start()
+        thread.process_finished_signal.connect(lambda data, i=index: self.on_single_file_finished(i, data))
+        # Free the slot only once run() has returned (the model is back in the cache by then)
+        thread.finished.connect(lambda i=index, t=thread: self.on_analyst_thread_exited(i, t))
+        self.analyst_threads[index] = thread
+        thread.start()
 
-    def on_single_file_finished(self, result_data):
+    def on_analyst_thread_exited(self, index, thread):
+        """A worker slot is free: start the next queued file"""
+        if self.analyst_threads.get(index) is not thread:
+            return  # Thread of a cancelled batch
+        self.analyst_threads.pop(index)
+        self.process_next_in_queue()
+
+    def on_single_file_finished(self, index, result_data):
         """Called when ONE file is done"""
-        # Store result
-        result_data['original_file'] = self.analyst_queue[self.current_batch_index]
-        self.analyst_results.append(result_data)
-        
-        # --- ADD TO LIST (Finished) ---
-        f_name = os.path.basename(self.analyst_queue[self.current_batch_index])
-        item = QListWidgetItem(f"✅ {f_name}")
-        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-        item.setCheckState(Qt.CheckState.Checked)
-        self.list_analyst_results.addItem(item)
+        # Store result in the file's own slot
+        result_data['original_file'] = self.analyst_queue[index]
+        self.analyst_results[index] = result_data
+        self.analyst_progress_by_file[index] = 100
+        
+        # --- MARK LIST ROW (Finished) ---
+        f_name = os.path.basename(self.analyst_queue[index])
+        item = self.list_analyst_results.item(index)
+        item.setText(f"✅ {f_name}")
         self.list_analyst_results.scrollToItem(item)
 
             
         # SHOW RESULT IMMEDIATELY
-        current_result_idx = len(self.analyst_results) - 1
-        self.show_batch_result(current_result_idx)
+        self.show_batch_result(index)
         
         # --- AUTO REPORT LOGIC (ANALYST MODE) ---
         if self.chk_auto_report.isChecked() and self.scan_ai_combo.currentIndex() == 0: # 0 is Gemini
-             self.log(f"🤖 Auto-generating report for {os.path.basename(self.analyst_queue[self.current_batch_index])}...")
+             self.log(f"🤖 Auto-generating report for {f_name}...")
              
              # Prepare params
              snapshots = result_data.get('snapshots', [])
@@ -1215,7 +1360,9 @@ class TrafficMonitorApp(QMainWindow):
              
              # Run Worker
              # Fix: Nếu không có snapshot, vẫn chạy worker để báo cáo "No Accident"
-             worker = ReportWorker(self.report_generator, snapshots, None, video_path)
+             clip_range = result_data.get('clip_range') if self.chk_clip_only.isChecked() else None
+             worker = ReportWorker(self.report_generator, snapshots, None, video_path, clip_range)
+             worker.progress.connect(self.show_upload_progress)
              
              # Handle completion closure to update specific result
              def handle_auto_report_done(res_report, target_vid=video_path):
@@ -1223,7 +1370,7 @@ class TrafficMonitorApp(QMainWindow):
                      self.log(f"✅ Auto-Report Complete for {os.path.basename(target_vid)}")
                      # Update result data
                      for r in self.analyst_results:
-                         if r.get('original_file') == target_vid:
+                         if r and r.get('original_file') == target_vid:
                              r['report_data'] = res_report
                              break
                      # If currently viewing this one, update UI
@@ -1239,16 +1386,12 @@ class TrafficMonitorApp(QMainWindow):
              # Keep reference to avoid GC
              if not hasattr(self, 'auto_report_workers'): self.auto_report_workers = []
              self.auto_report_workers.append(worker)
-        
-        # Move to next
-        self.current_batch_index += 1
-        self.process_next_in_queue()
 
     def on_result_list_clicked(self, item):
         """Handle click on result list item"""
         row = self.list_analyst_results.row(item)
         # Check if result exists for this row
-        if row < len(self.analyst_results):
+        if row < len(self.analyst_results) and self.analyst_results[row] is not None:
             self.show_batch_result(row)
         else:
             self.log("⚠️ This video has not been processed yet.")
@@ -1271,7 +1414,7 @@ class TrafficMonitorApp(QMainWindow):
             
     def show_batch_result(self, index):
         """Display result for a specific index in the completed batch"""
-        if index < 0 or index >= len(self.analyst_results): return
+        if index < 0 or index >= len(self.analyst_results) or self.analyst_results[index] is None: return
         
         result = self.analyst_results[index]
         output_path = result.get('output_path')
@@ -1296,9 +1439,11 @@ class TrafficMonitorApp(QMainWindow):
         
         for path, lbl in pairs:
             if path and os.path.exists(path):
-                lbl.setPixmap(QPixmap(path).scaled(280, 160, Qt.AspectRatioMode.KeepAspectRatio))
                 lbl.setProperty("file_path", path)
+                self.load_thumbnail(lbl, path, 280, 160,
+                                    is_current=lambda l=lbl, p=path: l.property("file_path") == p)
             else:
+                lbl.setProperty("file_path", None)
                 lbl.clear()
                 lbl.setText("No Image")
                 
@@ -1370,7 +1515,7 @@ class TrafficMonitorApp(QMainWindow):
         # Search in self.analyst_results
         target_res = None
         for res in self.analyst_results:
-             if res.get('original_file') == vid_path:
+             if res and res.get('original_file') == vid_path:
                  target_res = res
                  break
         
@@ -1406,6 +1551,7 @@ class TrafficMonitorApp(QMainWindow):
             # return # REMOVED to allow No Accident report
             
         current_vid = None
+        clip_range = None
         
         # Logic to find video depends on Tab
         if current_tab_idx == 1: # Analyst
@@ -1413,12 +1559,16 @@ class TrafficMonitorApp(QMainWindow):
                  original_path = self.current_batch_params.get('video_path')
                  # Look for processed path in results to send the annotated video
                  for res in self.analyst_results:
-                     if res.get('original_file') == original_path:
+                     if res and res.get('original_file') == original_path:
                          current_vid = res.get('output_path')
+                         clip_range = res.get('clip_range')
                          break
                  if not current_vid: current_vid = original_path
+            if not self.chk_clip_only.isChecked(): clip_range = None
         else: # Live
              current_vid = self.output_path # Use the recording/processing path
+             if self.chk_live_clip_only.isChecked() and getattr(self, 'thread', None):
+                 clip_range = self.thread.incident_clip_range
 
         self.log("🤖 Generating AI Report... (Please wait)")
         self.btn_analyst_report.setEnabled(False)
@@ -1429,10 +1579,15 @@ class TrafficMonitorApp(QMainWindow):
             self.combo_ai_model.setCurrentIndex(1)
         
         # Use Thread
-        self.report_worker = ReportWorker(self.report_generator, self.snapshot_paths, None, current_vid)
+        self.report_worker = ReportWorker(self.report_generator, self.snapshot_paths, None, current_vid, clip_range)
         self.report_worker.finished.connect(self.on_manual_report_finished)
+        self.report_worker.progress.connect(self.show_upload_progress)
         self.report_worker.start()
         
+    def show_upload_progress(self, percent):
+        """Hiển thị tiến độ upload video bằng chứng trên thanh trạng thái"""
+        self.status_bar.showMessage(f"📤 Uploading evidence video... {percent}%")
+
     def on_manual_report_finished(self, result):
         """Handle report completion"""
         self.btn_analyst_report.setEnabled(True)
@@ -1502,7 +1657,7 @@ class TrafficMonitorApp(QMainWindow):
                 img_lbl.setScaledContents(True)
                 img_lbl.setStyleSheet("border: 1px solid #555;")
                 if path and os.path.exists(path):
-                    img_lbl.setPixmap(QPixmap(path))
+                    self.load_thumbnail(img_lbl, path, 280, 180)
                 else:
                     img_lbl.setText("Image not found")
                 
@@ -1573,14 +1728,13 @@ class TrafficMonitorApp(QMainWindow):
         self.gallery_paths = all_paths if all_paths else [image_path]
         
         def update_view():
-            current_p = self.gallery_paths[self.current_img_idx]
+            idx = self.current_img_idx
+            current_p = self.gallery_paths[idx]
             if current_p and os.path.exists(current_p):
-                pix = QPixmap(current_p)
-                # Scale Logic
+                # Scaled to fit in the background; ignore if the user already moved to another image
                 view_w, view_h = dialog.width() - 40, dialog.height() - 100
-                if pix.width() > view_w or pix.height() > view_h:
-                    pix = pix.scaled(view_w, view_h, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                img_container.setPixmap(pix)
+                self.load_thumbnail(img_container, current_p, view_w, view_h,
+                                    is_current=lambda: self.current_img_idx == idx, persist=False)
                 dialog.setWindowTitle(f"🔍 View Image ({self.current_img_idx + 1}/{len(self.gallery_paths)})")
             else:
                 img_container.setText("Image not found")
@@ -1686,6 +1840,7 @@ class TrafficMonitorApp(QMainWindow):
         
         # Load fresh every time (Old behavior)
         self.thread = DetectionThread(model_path=model_path, source=self.source, save_path=self.output_path, conf_threshold=conf_threshold)
+        self.sync_display_size()
         self.thread.change_pixmap_signal.connect(self.update_image)
         self.thread.detection_signal.connect(self.handle_detection)
         self.thread.snapshot_saved.connect(self.display_snapshots) 
@@ -1712,7 +1867,7 @@ class TrafficMonitorApp(QMainWindow):
         # Trường hợp 2: Đã tạm dừng -> HỦY (Reset)
         else:
             self.log("❌ Cancelling detection session...")
-            self.thread.stop()
+            self.retire_thread(self.thread)  # Stops in the background, the UI resets right away
             self.thread = None
             
             # Reset UI về trạng thái ban đầu
@@ -2074,6 +2229,20 @@ class TrafficMonitorApp(QMainWindow):
     def update_image(self, cv_img):
         qt_img = self.convert_cv_qt(cv_img)
         self.image_label.setPixmap(qt_img)
+        # The frame is a pooled buffer of the sending thread: hand it back once uploaded
+        sender = self.sender()
+        if isinstance(sender, DetectionThread):
+            sender.release_display_buffer(cv_img)
+
+    def sync_display_size(self):
+        """Tell the detection thread the live view size, frames are rendered to fit it"""
+        if getattr(self, 'thread', None) is not None:
+            rect = self.image_label.contentsRect()
+            self.thread.set_display_size(rect.width(), rect.height())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.sync_display_size()
     
     @pyqtSlot(str, str, str)
     def display_snapshots(self, path_before, path_during, path_after):
@@ -2088,9 +2257,9 @@ class TrafficMonitorApp(QMainWindow):
             (path_after, self.img_after)
         ]:
             if path and os.path.exists(path):
-                pixmap = QPixmap(path)
-                label.setPixmap(pixmap)
-                label.setText("")  # Clear placeholder text
+                snapshots = list(self.snapshot_paths)
+                self.load_thumbnail(label, path, label.width(), label.height(),
+                                    is_current=lambda s=snapshots: self.snapshot_paths == s, persist=False)
             elif path is None:
                 # Still waiting for this image
                 label.setText("Waiting...")
@@ -2135,11 +2304,9 @@ class TrafficMonitorApp(QMainWindow):
         
         # Image Label
         label = QLabel()
-        pixmap = QPixmap(path)
         
-        # Scale pixmap to fit dialog initially
-        scaled_pixmap = pixmap.scaled(dialog.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-        label.setPixmap(scaled_pixmap)
+        # Scaled to fit the dialog in the background (kept in memory only, not in the disk cache)
+        self.load_thumbnail(label, path, dialog.width(), dialog.height(), persist=False)
         label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         layout.addWidget(label)
@@ -2156,29 +2323,61 @@ class TrafficMonitorApp(QMainWindow):
     def handle_detection(self, class_name, image_path):
         self.log(f"ALERT: Detected {class_name}! Sending report...")
         
-        # Send to API in a separate short-lived thread or async to avoid blocking UI
-        # For simplicity here, we call a worker method (in real app, use QThread/QRunnable)
-        response = self.api_client.send_incident(image_path, class_name)
-        
+        # Send on the shared API pool: the live view keeps running during the HTTP round-trip
+        get_api_executor().submit(self.api_client.send_incident, image_path, class_name,
+                                  on_result=self.on_incident_sent)
+
+    def on_incident_sent(self, response):
         if response:
             self.log(f"Server Response: Reported ID {response.get('id')}")
         else:
             self.log("Failed to report Incident.")
 
+    def preload_model(self):
+        """Load the selected live model in the background so Start Detection doesn't wait for it"""
+        if os.environ.get("MODEL_PRELOAD", "1") == "0":
+            return
+        idx = self.combo_model.currentIndex()
+        model_path = self.LIVE_MODEL_PATHS[idx] if 0 <= idx < len(self.LIVE_MODEL_PATHS) else self.LIVE_MODEL_PATHS[0]
+        self.status_bar.showMessage(f"⏳ Loading AI Model in background: {os.path.basename(model_path)}")
+        future = get_model_cache().preload(model_path)
+        future.add_done_callback(lambda f: self.model_preloaded.emit(model_path, f.exception()))
+
+    @pyqtSlot(str, object)
+    def on_model_preloaded(self, model_path, error):
+        if error is None:
+            self.log(f"✅ AI Model ready: {model_path}")
+            self.status_bar.showMessage("✅ AI Model ready", 3000)
+        else:
+            self.log(f"⚠️ Model preload failed ({model_path}): {error}")
+            self.status_bar.clearMessage()
+
+    def load_thumbnail(self, label, source, width, height, is_current=None, persist=True):
+        """
+        Show an image in label via the shared thumbnail cache (decoded off the GUI thread)
+        persist=False for window-sized views: kept in memory only, not written to the disk cache
+        """
+        label.setText("Loading...")
+
+        def apply(pixmap):
+            if is_current is not None and not is_current():
+                return  # Label now shows something else
+            if pixmap is None:
+                label.setText("Image not found")
+            else:
+                label.setPixmap(pixmap)
+
+        get_thumbnail_cache().request(source, width, height, apply, persist=persist)
+
     def convert_cv_qt(self, cv_img):
         """
         Chuyển đổi từ ảnh OpenCV sang QPixmap để hiển thị trong PyQt
-        OpenCV dùng BGR, PyQt cần RGB
+        Frame từ DetectionThread đã đúng kích thước khung hiển thị: QImage đọc thẳng dữ liệu BGR
+        (Format_BGR888, không đổi màu, không copy, không scale), chỉ còn bước tải lên QPixmap
         """
-        # Chuyển từ BGR sang RGB
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        # Tạo QImage từ dữ liệu numpy
-        convert_to_Qt_format = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        # Scale về kích thước phù hợp (giữ tỷ lệ)
-        p = convert_to_Qt_format.scaled(800, 600, Qt.AspectRatioMode.KeepAspectRatio)
-        return QPixmap.fromImage(p)
+        h, w, ch = cv_img.shape
+        qt_image = QImage(cv_img.data, w, h, cv_img.strides[0], QImage.Format.Format_BGR888)
+        return QPixmap.fromImage(qt_image)
 
     def closeEvent(self, event):
         """
@@ -2186,41 +2385,111 @@ class TrafficMonitorApp(QMainWindow):
         Được gọi tự động khi người dùng đóng cửa sổ
         """
         print("🚪 closeEvent triggered")
+        if self.shutdown():
+            event.accept()
+            return
+        # Thread còn đang ở giữa một bước xử lý: ẩn cửa sổ, thoát khi thread cuối cùng phát finished
+        # hoặc khi hết hạn chót (on_shutdown_deadline)
+        self.hide()
+        event.ignore()
+
+    def retire_thread(self, thread):
+        """
+        Yêu cầu thread dừng mà không chặn UI
+        Ngắt các signal cập nhật giao diện và giữ tham chiếu đến khi thread thoát hẳn
+        (QThread bị hủy khi còn chạy sẽ làm sập tiến trình)
+        """
+        for signal in (thread.change_pixmap_signal, thread.detection_signal, thread.snapshot_saved,
+                       thread.progress_signal, thread.process_finished_signal, thread.finished):
+            try:
+                signal.disconnect()
+            except TypeError:
+                pass  # Không có kết nối nào
+        thread.request_stop()
+        if thread.isRunning():
+            self.retired_threads.add(thread)
+            thread.finished.connect(lambda t=thread: self.on_retired_thread_finished(t))
+
+    def on_retired_thread_finished(self, thread):
+        self.retired_threads.discard(thread)
+        if getattr(self, '_shutting_down', False) and not self.running_threads():
+            print("✅ Detection threads stopped")
+            self.cleanup()
+            QApplication.quit()
+
+    def running_threads(self):
+        """Mọi DetectionThread còn đang chạy (live, batch analyst, đã bị hủy)"""
+        threads = [self.thread] if self.thread else []
+        threads += list(getattr(self, 'analyst_threads', {}).values())
+        threads += list(self.retired_threads)
+        return [t for t in threads if t.isRunning()]
+
+    def shutdown(self):
+        """
+        Bắt đầu thoát ứng dụng mà không chặn UI
+        Yêu cầu mọi thread dừng; thread được giữ tham chiếu (retired_threads) đến khi phát finished,
+        thread cuối cùng kết thúc thì dọn dẹp và QApplication.quit().
+        Hạn chót STOP_TIMEOUT_MS (DETECTION_STOP_TIMEOUT_MS): bước đang chạy có thể không ngắt được
+        (chờ tải model, cap.read() bị treo), hết hạn thì thoát mà không chờ (on_shutdown_deadline).
+
+        Returns:
+            True nếu không còn thread nào chạy (có thể thoát ngay)
+        """
+        if not getattr(self, '_shutting_down', False):
+            self._shutting_down = True
+            self._shutdown_deadline = time.monotonic() + STOP_TIMEOUT_MS / 1000
+            print("🛑 Starting shutdown...")
+            for thread in self.running_threads():
+                self.retire_thread(thread)
+            self.thread = None
+            self.analyst_threads = {}  # Không bắt đầu file mới trong batch
+
+        threads = self.running_threads()
+        if threads:
+            print(f"⏳ Waiting up to {STOP_TIMEOUT_MS} ms for {len(threads)} detection thread(s) to finish their current step...")
+            if not getattr(self, '_deadline_armed', False):
+                self._deadline_armed = True
+                QTimer.singleShot(STOP_TIMEOUT_MS, self.on_shutdown_deadline)
+            return False
+        self.cleanup()
+        return True
+
+    def on_shutdown_deadline(self):
+        """
+        Hết hạn chót thoát mà vẫn còn thread chạy: dọn dẹp và thoát vòng lặp sự kiện,
+        không hủy QThread đang chạy (tiến trình kết thúc bằng os._exit sau app.exec())
+        """
+        threads = self.running_threads()
+        if not threads:
+            return
+        print(f"⚠️ {len(threads)} detection thread(s) still running after {STOP_TIMEOUT_MS} ms, quitting without them")
         self.cleanup()
-        event.accept()
+        QApplication.quit()
+
+    def wait_for_threads(self):
+        """
+        Sau khi vòng lặp sự kiện đã thoát: chờ mọi thread kết thúc (DetectionThread.stop),
+        tối đa đến hạn chót của shutdown() (hoặc STOP_TIMEOUT_MS nếu quit() từ nơi khác)
 
-        import os
-        print("☠️ Force killing process...")
-        os._exit(0)  # Giết tiến trình ngay lập tức, bỏ qua mọi chờ đợi
+        Returns:
+            True nếu không còn thread nào chạy (được phép để Python hủy QThread)
+        """
+        deadline = getattr(self, '_shutdown_deadline', None) or time.monotonic() + STOP_TIMEOUT_MS / 1000
+        threads = self.running_threads()
+        for thread in threads:
+            thread.request_stop()
+        for thread in threads:
+            thread.stop(max(0, int((deadline - time.monotonic()) * 1000)))
+        return not self.running_threads()
     
     def cleanup(self):
         """
-        Phương thức dọn dẹp tập trung
-        Dừng thread, giải phóng tài nguyên OpenCV và API client
+        Phương thức dọn dẹp tập trung (gọi khi không còn thread phát hiện nào chạy)
+        Giải phóng tài nguyên OpenCV và API client
         """
-        # Ngăn chặn gọi đệ quy
-        if hasattr(self, '_cleanup_in_progress') and self._cleanup_in_progress:
+        if getattr(self, '_cleanup_done', False):
             return
-        
-        self._cleanup_in_progress = True
-        print("🛑 Starting cleanup...")
-        
-        # Dừng thread phát hiện nếu đang chạy
-        if self.thread and self.thread.isRunning():
-            print("⏸️ Stopping detection thread...")
-            self.thread.stop()
-            
-            # Đợi thread kết thúc (có timeout)
-            print("⏳ Waiting for thread to stop (max 2s)...")
-            if not self.thread.wait(2000):  # Timeout 2 giây
-                print("⚠️ Thread didn't stop, force terminating...")
-                self.thread.terminate()
-                if not self.thread.wait(1000):  # Đợi thêm 1 giây cho termination
-                    print("❌ Force quit failed!")
-                else:
-                    print("✅ Thread force-terminated")
-            else:
-                print("✅ Thread stopped gracefully")
+        self._cleanup_done = True
         
         # Giải phóng tài nguyên OpenCV
         try:
@@ -2229,7 +2498,9 @@ class TrafficMonitorApp(QMainWindow):
         except:
             pass
         
-        # Đóng các tài nguyên đã mở
+        # Đóng các tài nguyên đã mở (lời gọi API chưa bắt đầu bị hủy)
+        get_api_executor().shutdown()
+        get_thumbnail_cache().shutdown()
         if hasattr(self, 'api_client'):
             self.api_client = None
         
@@ -2237,14 +2508,12 @@ class TrafficMonitorApp(QMainWindow):
     
     def __del__(self):
         """
-        Destructor - dọn dẹp cuối cùng
-        Được gọi khi object bị hủy, là biện pháp cuối cùng
+        Destructor - biện pháp cuối cùng, không chặn: chỉ yêu cầu thread dừng
         """
         try:
-            if hasattr(self, 'thread') and self.thread and self.thread.isRunning():
+            for thread in self.running_threads():
                 print("⚠️ __del__ cleanup - thread still running!")
-                self.thread.terminate()
-                self.thread.wait()
+                thread.request_stop()
         except:
             pass
 
@@ -2253,9 +2522,13 @@ def signal_handler(signum, frame):
     Xử lý Ctrl+C một cách graceful
     Được đăng ký để xử lý tín hiệu SIGINT
     """
-    print("\n🛑 Interrupt received, forcing exit...")
-    import sys
-    sys.exit(0)
+    print("\n🛑 Interrupt received, quitting...")
+    # Đóng cửa sổ chính: closeEvent -> shutdown() dừng các thread rồi mới QApplication.quit()
+    for widget in QApplication.topLevelWidgets():
+        if isinstance(widget, TrafficMonitorApp):
+            widget.close()
+            return
+    QApplication.quit()
 
 if __name__ == "__main__":
     # Register signal handler for Ctrl+C
@@ -2266,18 +2539,22 @@ if __name__ == "__main__":
     
     window = TrafficMonitorApp()
     
-    # Cleanup before quit
-    app.aboutToQuit.connect(window.cleanup)
-    
     window.show()
+    # Window is up: report startup time, then load the AI model in the background
+    QTimer.singleShot(0, lambda: startup_report("Desktop app", STARTUP_STARTED))
+    QTimer.singleShot(0, window.preload_model)
     
     # Use exec() and ensure exit
     exit_code = app.exec()
     print(f"📤 Application exiting with code: {exit_code}")
     
-    # Force cleanup one more time
+    # Threads still running here: wait until the shutdown deadline, then exit without
+    # destroying them (destroying a running QThread aborts the process)
+    if not window.wait_for_threads():
+        print("⚠️ Detection threads did not stop in time, forcing exit")
+        window.cleanup()
+        sys.stdout.flush()
+        os._exit(exit_code)
     window.cleanup()
     
-    # Force exit
-    import sys
     sys.exit(exit_code)
@@ -1,21 +1,36 @@
-from flask import Flask, request, jsonify, send_from_directory
+import time
+STARTUP_STARTED = time.perf_counter()  # Mốc đo thời gian khởi động (startup_report)
+
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 import threading
 import uuid
 import sys
 import os
 import cv2
-import time
+import numpy as np
 import asyncio
 import json
 import logging
+import queue
 import shutil
-import requests  # Dùng để gọi API đến Java backend
 import tempfile  # Dùng cho logic thư mục tạm
 
-from ultralytics import YOLO
-from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack
-from av import VideoFrame
+# ultralytics (PyTorch), aiortc và av chỉ được import khi dùng lần đầu (lazy_import)
+from utils.lazy_import import lazy_import, startup_report
+from utils.video_source import LiveVideoSource, is_live_source
+from utils.drawing import draw_styled_box, add_timestamp
+from utils.snapshot_writer import get_snapshot_writer
+from utils.incident_outbox import IncidentOutbox
+from utils.chunked_upload import ChunkedUploader
+from utils.video_clip import extract_clip, concat_videos
+from utils.job_events import JobEventBus, TERMINAL_STATUSES, format_sse
+from utils.job_store import JobStore
+from utils.event_log import JobEventLog, read_events, write_json_atomic
+from utils.detection_timeline import DetectionTimeline
+from utils.job_checkpoint import CheckpointStore
+from utils.segment_processing import plan_segments, run_segment, merge_incidents
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait as wait_futures
 
 app = Flask(__name__)
 CORS(app)  # Cho phép CORS để frontend có thể gọi API
@@ -27,6 +42,7 @@ logger = logging.getLogger("server")
 # Cache mô hình toàn cục
 # Lưu các mô hình đã tải để tránh tải lại nhiều lần
 MODELS = {}
+MODELS_LOCK = threading.Lock()  # Chỉ một thread tải mô hình (tải trước nền và request đồng thời)
 MODEL_PATHS = {
     "small": "model/small/best.pt",
     "medium": "model/medium/mediumv1.pt"
@@ -38,6 +54,63 @@ STREAM_DATA_ROOT = os.path.join(tempfile.gettempdir(), 'traffic_ai_data')
 os.makedirs(STREAM_DATA_ROOT, exist_ok=True)
 print(f"Stream Data Root: {STREAM_DATA_ROOT}")
 
+# Ghi ảnh snapshot trong thread nền (chất lượng JPEG: biến môi trường SNAPSHOT_JPEG_QUALITY)
+snapshot_writer = get_snapshot_writer()
+
+def wait_for_snapshots(futures, timeout=30):
+    """
+    Chờ các ảnh snapshot đang được ghi nền hoàn tất
+    Dùng trước khi đọc lại file (upload lên backend, ghi metadata)
+    """
+    pending = [f for f in futures if f is not None]
+    if pending:
+        wait_futures(pending, timeout=timeout)
+
+# Outbox báo cáo sự cố: lưu trên đĩa, gửi nền đến Java Backend (có retry + idempotency key)
+BACKEND_API_URL = os.environ.get("BACKEND_API_URL", "http://localhost:8080/api")
+REPORT_OUTBOX_DIR = os.environ.get(
+    "REPORT_OUTBOX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "outbox"))
+report_outbox = IncidentOutbox(REPORT_OUTBOX_DIR, f"{BACKEND_API_URL}/incidents/report",
+                               uploader=ChunkedUploader(BACKEND_API_URL))
+
+# Checkpoint của job batch: server khởi động lại sẽ chạy tiếp từ checkpoint cuối thay vì từ frame 0
+# Tắt mặc định (CHECKPOINT_INTERVAL=0: video đầu ra được ghi thẳng thành một file như trước);
+# bật bằng CHECKPOINT_INTERVAL=<giây giữa hai checkpoint>, ví dụ 60
+CHECKPOINT_INTERVAL = float(os.environ.get("CHECKPOINT_INTERVAL", 0))
+CHECKPOINT_DIR = os.environ.get(
+    "CHECKPOINT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "checkpoints"))
+checkpoints = CheckpointStore(CHECKPOINT_DIR)
+
+# Xử lý song song theo đoạn cho video dài: chia thành N đoạn, mỗi đoạn chạy trong một tiến trình riêng
+PARALLEL_SEGMENTS = int(os.environ.get("PARALLEL_SEGMENTS", 1))  # Số đoạn mặc định (1 = tắt), ghi đè bằng "segments" của /process
+PARALLEL_MIN_SECONDS = float(os.environ.get("PARALLEL_MIN_SECONDS", 600))  # Chỉ chia video dài ít nhất (giây)
+segment_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("SEGMENT_WORKERS", os.cpu_count() or 2)),
+                                      thread_name_prefix="Segment")
+
+def read_frame_at(cap, index):
+    """Đọc frame thứ index của video (None nếu không đọc được)"""
+    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    ret, frame = cap.read()
+    return frame if ret else None
+
+# Clip bằng chứng quanh sự cố (T-4s..T+5s), cắt từ video nguồn bằng stream copy
+INCIDENT_CLIPS = os.environ.get("INCIDENT_CLIPS", "1") != "0"
+clip_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="IncidentClip")
+
+def cut_incident_clip(input_path, start_sec, end_sec, clip_path):
+    """Cắt clip trong thread nền, trả về Future(đường dẫn clip hoặc None)"""
+    return clip_executor.submit(extract_clip, input_path, max(0.0, start_sec), end_sec, clip_path)
+
+def report_with_clip(snapshot_paths, label, clip_future, video_url=None, key=None):
+    """
+    Đưa báo cáo vào outbox ngay (đã nằm trên đĩa, không mất khi server khởi động lại);
+    clip đang cắt là phần đính kèm outbox chờ trước khi gửi (clip lỗi -> chỉ gửi video_url như trước)
+    Trả về Future của kết quả báo cáo (giống report_to_backend)
+    """
+    return report_outbox.enqueue(list(snapshot_paths), label, video_url=video_url, key=key, pending_video=clip_future)
+
 def get_model(model_type="medium"):
     """
     Lấy mô hình YOLO được yêu cầu, tải nó nếu cần thiết.
@@ -48,55 +121,63 @@ def get_model(model_type="medium"):
         print(f"Warning: Unknown model type '{model_type}'. Defaulting to 'medium'.")
         model_type = "medium"
     
-    if model_type not in MODELS:
-        print(f"Loading '{model_type}' model from {MODEL_PATHS[model_type]}...")
-        MODELS[model_type] = YOLO(MODEL_PATHS[model_type])
-        print(f"Model '{model_type}' loaded successfully.")
-    
-    return MODELS[model_type]
+    with MODELS_LOCK:
+        if model_type not in MODELS:
+            YOLO = lazy_import("ultralytics").YOLO
+            print(f"Loading '{model_type}' model from {MODEL_PATHS[model_type]}...")
+            MODELS[model_type] = YOLO(MODEL_PATHS[model_type])
+            print(f"Model '{model_type}' loaded successfully.")
+        
+        return MODELS[model_type]
 
-# Khởi tạo mô hình mặc định
-get_model("medium")
+def preload():
+    """
+    Tải trước mô hình mặc định và aiortc trong thread nền
+    Server nhận request ngay; request cần mô hình trong lúc đang tải sẽ chờ MODELS_LOCK thay vì tải lần hai
+    """
+    try:
+        get_model("medium")
+        lazy_import("aiortc")
+    except Exception as e:
+        logger.error(f"Preload failed: {e}")
+
+# Khởi tạo mô hình mặc định (nền, không chặn lúc khởi động; MODEL_PRELOAD=0 để tắt)
+if os.environ.get("MODEL_PRELOAD", "1") != "0":
+    threading.Thread(target=preload, name="model-preload", daemon=True).start()
 
 # Kho lưu trữ thông tin công việc (Job Store)
-# Lưu trạng thái và kết quả của các job xử lý video
-jobs = {}
-pcs = set()  # Tập hợp các RTCPeerConnection cho WebRTC
+# Lưu trạng thái và kết quả của các job xử lý video (an toàn đa luồng, tự thu hồi job cũ)
+# JOB_STORE_DB=<file .sqlite> để giữ trạng thái qua các lần khởi động lại
+jobs = JobStore(ttl=float(os.environ.get("JOB_TTL", 3600)),
+                max_jobs=int(os.environ.get("MAX_JOBS", 1000)),
+                db_path=os.environ.get("JOB_STORE_DB"),
+                persist_interval=float(os.environ.get("JOB_PERSIST_INTERVAL", 1)))
+
+# Sự kiện job đẩy đến client qua Server-Sent Events (GET /events/<job_id>)
+event_bus = JobEventBus()
+
+# Giới hạn phiên WebRTC (có thể cấu hình qua biến môi trường)
+MAX_STREAM_PEERS = int(os.environ.get("MAX_STREAM_PEERS", 4))  # Số peer đồng thời tối đa
+STREAM_IDLE_TIMEOUT = float(os.environ.get("STREAM_IDLE_TIMEOUT", 30))  # Giây không kéo frame -> đóng phiên
+REALTIME_JOB_RETENTION = float(os.environ.get("REALTIME_JOB_RETENTION", 300))  # Giữ job realtime đã kết thúc (giây)
 
 # --- XỬ LÝ BATCH (HÀNG LOẠT) ---
 from collections import deque
-import datetime
 
-def draw_styled_box(img, x1, y1, x2, y2, label, conf, color):
-    """
-    Vẽ bounding box có style đẹp với nhãn và độ tin cậy
-    """
-    # Vẽ hình chữ nhật
-    cv2.rectangle(img, (x1, y1), (x2, y2), color, 3)
-    
-    # Vẽ nhãn có nền để dễ đọc
-    text = f"{label} {conf:.2f}"
-    font_scale = 0.8
-    thickness = 2
-    (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-    
-    # Vẽ nền cho text
-    cv2.rectangle(img, (x1, y1 - 25), (x1 + w, y1), color, -1)
-    # Vẽ text màu trắng
-    cv2.putText(img, text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
+def set_job_status(job_id, status, **fields):
+    """Cập nhật trạng thái job và đẩy sự kiện 'status' cho các client đang theo dõi (SSE)"""
+    if not jobs.update(job_id, status=status, **fields):
+        return
+    event_bus.publish(job_id, "status", dict(fields, status=status))
 
-def add_timestamp(img, seconds):
+def process_video_task(input_path, output_path, job_id, is_realtime, model_type="medium", custom_labels="accident, vehicle accident", confidence_threshold=0.70, auto_report=True, resume=None, segments=None):
     """
-    Thêm timestamp vào frame
-    Vẽ outline đen trước, sau đó vẽ text vàng để dễ đọc
+    resume: checkpoint đã lưu (CheckpointStore) -> chạy tiếp từ frame trong checkpoint
+    segments: số đoạn xử lý song song (mặc định PARALLEL_SEGMENTS)
     """
-    time_str = str(datetime.timedelta(seconds=int(seconds)))
-    cv2.putText(img, f"Time: {time_str}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 4)  # Outline đen
-    cv2.putText(img, f"Time: {time_str}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)  # Text vàng
-
-def process_video_task(input_path, output_path, job_id, is_realtime, model_type="medium", custom_labels="accident, vehicle accident", confidence_threshold=0.70, auto_report=True):
+    event_log = None
     try:
-        jobs[job_id]['status'] = 'PROCESSING'
+        set_job_status(job_id, 'PROCESSING')
         
         # Phân tích các nhãn tùy chỉnh
         target_labels = [l.strip().lower() for l in custom_labels.split(',') if l.strip()]
@@ -112,11 +193,27 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = cap.get(cv2.CAP_PROP_FPS) or 30
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        # Chia đoạn chỉ với video đủ dài; job chạy tiếp từ checkpoint luôn chạy tuần tự
+        segments = PARALLEL_SEGMENTS if segments is None else int(segments)
+        segmented = (segments > 1 and resume is None and total_frames > 0
+                     and total_frames / fps >= PARALLEL_MIN_SECONDS)
         
         # Cấu hình video đầu ra
         output_fps = fps if fps > 0 else 30.0
         fourcc = cv2.VideoWriter_fourcc(*'VP80')  # Định dạng WebM (VP8 codec)
-        out = cv2.VideoWriter(output_path, fourcc, output_fps, (width, height))
+
+        # Khi bật checkpoint, video đầu ra được ghi thành nhiều phần: mỗi checkpoint đóng phần hiện tại
+        # (VideoWriter chỉ ghi xong file khi release) để phần đó còn nguyên nếu server dừng. Nối lại khi kết thúc.
+        output_parts = list(resume['outputParts']) if resume else []  # Các phần đã đóng
+
+        def open_output_part():
+            path = f"{output_path}.part{len(output_parts)}.webm" if CHECKPOINT_INTERVAL > 0 else output_path
+            return path, cv2.VideoWriter(path, fourcc, output_fps, (width, height))
+
+        # Chế độ chia đoạn: mỗi tiến trình worker tự ghi phần video của đoạn mình
+        out_part, out = open_output_part() if not segmented else (None, None)
+        frames_in_part = 0
 
         # --- CẤU HÌNH TỐI ƯU ---
         FRAME_SKIP = 3  # Nhảy cóc 3 frame để tăng tốc độ xử lý
@@ -143,21 +240,190 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
         
         detected_accidents = []  # Danh sách các sự cố đã phát hiện
         current_incident_info = None  # Thông tin sự cố hiện tại
-        incidents = []  # Tất cả các phát hiện (bao gồm cả chưa xác nhận)
+        detection_count = 0  # Số frame có phát hiện
+        timeline = DetectionTimeline()  # Các đoạn phát hiện liên tiếp (nén theo đoạn, thay cho một mục mỗi frame)
         all_reports = []  # Lưu trữ tất cả báo cáo AI đã tạo
+        pending_reports = []  # (Future, incident_info) của các báo cáo đang nằm trong outbox
+        # Video đầu ra đã nằm trong thư mục data của backend -> chỉ gửi đường dẫn, không upload lại
+        video_url = f"/api/videos/download/{os.path.basename(output_path)}"
         
         # Tạo thư mục data nếu chưa có
         DATA_DIR = os.path.dirname(output_path)
         os.makedirs(DATA_DIR, exist_ok=True)
+
+        # Nhật ký sự kiện JSON Lines: kết quả từng phần đọc được ngay khi job đang chạy
+        # Chạy tiếp: cắt log về vị trí đã lưu trong checkpoint (sự kiện sau đó sẽ được ghi lại)
+        event_log = JobEventLog(output_path + ".events.jsonl", append=resume is not None,
+                                truncate_at=resume.get('eventLogOffset') if resume else None)
+        jobs.update(job_id, eventLog=event_log.path, partialResults=f"/results/{job_id}")
+        if resume is None:
+            event_log.append("start", input=os.path.basename(input_path), fps=fps, totalFrames=total_frames,
+                             labels=target_labels, confidenceThreshold=confidence_threshold)
+
+        def emit(event, data):
+            """Gửi sự kiện cho subscriber SSE và ghi vào event log"""
+            event_bus.publish(job_id, event, data)
+            event_log.append(event, **data)
         
         frame_count = 0  # Đếm số frame đã xử lý
+        snapshot_futures = []  # Các ảnh đang được ghi nền (chờ trước khi upload / ghi metadata)
         
         # Theo dõi phương án dự phòng (Fallback)
         # Lưu phát hiện tốt nhất nếu không có sự cố kéo dài
         best_fallback_conf = 0.0
         best_fallback_data = None  # (nhãn, frame_trước, frame_trong)
+        best_fallback_time = 0.0  # Thời điểm (giây) của phát hiện dự phòng
+        clip_start_time = 0.0  # Thời điểm bắt đầu clip bằng chứng của sự cố đang chụp
         
-        while cap.isOpened():
+        clip_futures = []  # (Future clip, mục trong detected_accidents)
+        incident_clip = None  # Future clip của sự cố đang chụp
+
+        reports_before_resume = 0  # Báo cáo đã vào outbox trước khi server dừng (outbox tự gửi tiếp)
+        saved_fallback_conf = None  # Ảnh dự phòng đã lưu ở checkpoint nào (tránh ghi lại mỗi lần)
+        last_checkpoint_at = time.time()
+
+        # --- TIẾP TỤC TỪ CHECKPOINT ---
+        if resume:
+            state = resume['state']
+            frame_count = state['frameCount']
+            current_accident_streak = state['streak']
+            snapshot_state = state['snapshotState']
+            frames_since_incident = state['framesSinceIncident']
+            snapshot_paths = state['snapshotPaths']
+            all_snapshot_paths = state['allSnapshotPaths']
+            detected_accidents = state['detectedAccidents']
+            current_incident_info = state['currentIncident']
+            detection_count = state['detectionCount']
+            timeline = DetectionTimeline.from_state(state['timeline'])
+            last_boxes = [(tuple(coords), label, conf) for coords, label, conf in state['lastBoxes']]
+            clip_start_time = state['clipStartTime']
+            best_fallback_conf = state['fallbackConf']
+            best_fallback_time = state['fallbackTime']
+            if state.get('fallback'):
+                fb = state['fallback']
+                best_fallback_data = (fb['label'], cv2.imread(fb['before']), cv2.imread(fb['during']))
+                saved_fallback_conf = best_fallback_conf
+            reports_before_resume = state['reportsEnqueued']
+
+            # Đọc lại pre-roll (không chạy AI, không ghi ra) để buffer ảnh "trước" giống lúc lưu checkpoint
+            preroll = min(frame_count, BUFFER_SIZE)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count - preroll)
+            for _ in range(preroll):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frame_buffer.append(frame)
+            event_log.append("resume", frame=frame_count, outputParts=len(output_parts))
+            print(f"[{job_id}] Resumed from checkpoint at frame {frame_count}/{total_frames}")
+        
+        # --- XỬ LÝ SONG SONG THEO ĐOẠN ---
+        if segmented:
+            # Mỗi đoạn chạy sớm hơn một khoảng pre-roll + cửa sổ xác nhận để state machine
+            # ở đầu đoạn giống như khi chạy tuần tự; sự cố trùng ở ranh giới được gộp lại sau đó
+            cooldown_frames = int(fps * (AFTER_SECONDS + 5.0))
+            plan = plan_segments(total_frames, segments, BUFFER_SIZE + CONFIRMATION_FRAMES)
+            print(f"[{job_id}] Processing {len(plan)} segments in parallel")
+            event_log.append("segments", count=len(plan))
+            cancel_segments = threading.Event()
+            segment_futures = [segment_executor.submit(run_segment, {
+                "input_path": input_path,
+                "part_path": f"{output_path}.seg{i}.webm",
+                "model_path": MODEL_PATHS.get(str(model_type).lower(), MODEL_PATHS["medium"]),
+                "warmup_start": warmup_start, "start": start, "end": end,
+                "fps": output_fps,
+                "target_labels": target_labels,
+                "confidence_threshold": confidence_threshold,
+                "frame_skip": FRAME_SKIP,
+                "confirmation_frames": CONFIRMATION_FRAMES,
+                "min_fallback_streak": MIN_FALLBACK_STREAK,
+                "cooldown_frames": cooldown_frames,
+            }, cancel_segments) for i, (warmup_start, start, end) in enumerate(plan)]
+
+            try:
+                for done, future in enumerate(as_completed(segment_futures), 1):
+                    future.result()  # Lỗi của một đoạn -> job FAILED
+                    progress = int(done / len(segment_futures) * 90)  # 10% cuối: ảnh, clip, báo cáo
+                    jobs.update(job_id, progress=progress)
+                    emit("progress", {"progress": progress})
+            except Exception:
+                # Hủy các đoạn chưa chạy, kill tiến trình con đang chạy, xóa file video từng đoạn
+                cancel_segments.set()
+                for future in segment_futures:
+                    future.cancel()
+                wait_futures(segment_futures)
+                for i in range(len(plan)):
+                    part_path = f"{output_path}.seg{i}.webm"
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                raise
+            results = [f.result() for f in segment_futures]
+
+            output_parts = [r['part_path'] for r in results]
+            for r in results:
+                timeline.extend(DetectionTimeline.from_state(r['timeline']))  # Gộp đoạn nối qua ranh giới
+                detection_count += r['detectionCount']
+            for segment in timeline.segments():
+                event_log.append("segment", **segment)
+
+            # Ảnh trước/trong/sau được đọc lại từ video nguồn theo frame xác nhận
+            for incident in merge_incidents([r['incidents'] for r in results], cooldown_frames):
+                confirm_frame = incident['frame']
+                current_incident_info = {k: incident[k] for k in ("time", "label", "confidence")}
+                emit("incident", {"status": "DETECTED", **current_incident_info})
+
+                before_index = max(0, confirm_frame - BUFFER_SIZE + 1)
+                after_index = min(total_frames - 1, confirm_frame + int(fps * AFTER_SECONDS))
+                snapshot_paths = []
+                for name, index in (("before", before_index),
+                                    ("during", max(before_index, confirm_frame - int(fps * 0.5))),
+                                    ("after", after_index)):
+                    snapshot = read_frame_at(cap, index)
+                    if snapshot is None:
+                        continue
+                    add_timestamp(snapshot, index / fps)
+                    path = os.path.join(DATA_DIR, f"{job_id}_{confirm_frame}_{name}.jpg")
+                    snapshot_futures.append(snapshot_writer.submit(snapshot, path))
+                    snapshot_paths.append(path)
+                all_snapshot_paths.extend(snapshot_paths)
+
+                incident_clip = None
+                if INCIDENT_CLIPS:
+                    clip_path = os.path.join(DATA_DIR, f"{job_id}_{confirm_frame}_clip.mp4")
+                    incident_clip = cut_incident_clip(input_path, incident['time'] - BEFORE_SECONDS, after_index / fps, clip_path)
+
+                if auto_report:
+                    wait_for_snapshots(snapshot_futures)
+                    if incident_clip is not None:
+                        report_result = report_with_clip(snapshot_paths, current_incident_info['label'], incident_clip, video_url,
+                                                         key=f"{job_id}-{confirm_frame}")
+                    else:
+                        report_result = report_to_backend(snapshot_paths, current_incident_info['label'], video_url=video_url,
+                                                          key=f"{job_id}-{confirm_frame}")
+                    pending_reports.append((report_result, current_incident_info))
+
+                detected_accidents.append({
+                    "timestamp": current_incident_info['time'],
+                    "label": current_incident_info['label'],
+                    "snapshots": list(snapshot_paths)
+                })
+                if incident_clip is not None:
+                    clip_futures.append((incident_clip, detected_accidents[-1]))
+                emit("incident", {"status": "CAPTURED", **detected_accidents[-1]})
+
+            # Phát hiện dự phòng tốt nhất của cả video (dùng bởi logic FALLBACK bên dưới)
+            fallbacks = [r['fallback'] for r in results if r['fallback']]
+            if fallbacks and not detected_accidents:
+                fb = max(fallbacks, key=lambda c: c['confidence'])
+                fb_before = read_frame_at(cap, max(0, fb['frame'] - BUFFER_SIZE + 1))
+                fb_during = read_frame_at(cap, max(0, fb['frame'] - int(fps * 1.5)))
+                last_frame = read_frame_at(cap, total_frames - 1)
+                if fb_before is not None and fb_during is not None:
+                    best_fallback_conf = fb['confidence']
+                    best_fallback_time = fb['time']
+                    best_fallback_data = (fb['label'], fb_before, fb_during)
+                    frame_buffer.append(last_frame if last_frame is not None else fb_during)
+
+        while not segmented and cap.isOpened():
             ret, frame = cap.read()  # Đọc frame từ video
             
             if not ret:
@@ -175,23 +441,36 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
                          final_after = np.zeros((height, width, 3), dtype=np.uint8)
 
                     add_timestamp(final_after, frame_count / fps)
-                    cv2.imwrite(after_path, final_after)
+                    snapshot_futures.append(snapshot_writer.submit(final_after, after_path))
                     
                     snapshot_paths.append(after_path)
                     all_snapshot_paths.append(after_path)
                     
                     # Tạo báo cáo ngay lập tức nếu bật auto_report
+                    # Clip bằng chứng T-4s..T+5s từ video nguồn (stream copy, thread nền)
+                    incident_clip = None
+                    if INCIDENT_CLIPS:
+                        clip_path = os.path.join(DATA_DIR, f"{job_id}_{frame_count}_clip.mp4")
+                        incident_clip = cut_incident_clip(input_path, clip_start_time, frame_count / fps, clip_path)
+                    
                     if auto_report and current_incident_info:
-                        report_result = report_to_backend(snapshot_paths, current_incident_info['label'], output_path)
-                        if report_result:
-                            all_reports.append(report_result)
-                            current_incident_info['aiReport'] = report_result.get('aiReport')
+                        wait_for_snapshots(snapshot_futures)
+                        if incident_clip is not None:
+                            report_result = report_with_clip(snapshot_paths, current_incident_info['label'], incident_clip, video_url,
+                                                             key=f"{job_id}-{frame_count}")
+                        else:
+                            report_result = report_to_backend(snapshot_paths, current_incident_info['label'], video_url=video_url,
+                                                              key=f"{job_id}-{frame_count}")
+                        pending_reports.append((report_result, current_incident_info))
                             
                     detected_accidents.append({
                         "timestamp": current_incident_info['time'],
                         "label": current_incident_info['label'],
                         "snapshots": list(snapshot_paths)
                     })
+                    if incident_clip is not None:
+                        clip_futures.append((incident_clip, detected_accidents[-1]))
+                    emit("incident", {"status": "CAPTURED", **detected_accidents[-1]})
 
                 break
             
@@ -255,11 +534,15 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
 
             # --- LOGIC XÁC NHẬN TAI NẠN (Persistence) ---
             if detection_found_in_this_frame:
-                incidents.append({
+                detection = {
                     "time": frame_count / fps,
                     "label": current_frame_label,
                     "confidence": current_frame_conf
-                })
+                }
+                closed_segment = timeline.add(frame_count, detection["time"], current_frame_label, current_frame_conf)
+                if closed_segment:
+                    event_log.append("segment", **closed_segment)
+                detection_count += 1
                 current_accident_streak += 1
                 
                 # --- LOGIC FALLBACK MỚI (Mini-Streak) ---
@@ -280,17 +563,19 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
                             fb_during = frame.copy()
                             
                         best_fallback_data = (current_frame_label, fb_before, fb_during)
+                        best_fallback_time = frame_count / fps
                 
                 if snapshot_state == 'SEARCHING':
                     if current_accident_streak >= CONFIRMATION_FRAMES:
                         print(f"[{job_id}] 🚨 Accident CONFIRMED (Streak: {current_accident_streak}), capturing...")
-                        current_incident_info = incidents[-1]
+                        current_incident_info = detection
+                        emit("incident", {"status": "DETECTED", **current_incident_info})
                         
                         # 1. Lưu TRƯỚC (BEFORE)
                         before_frame = frame_buffer[0].copy() if frame_buffer else frame.copy()
                         add_timestamp(before_frame, (frame_count - len(frame_buffer)) / fps if frame_buffer else frame_count/fps)
                         before_path = os.path.join(DATA_DIR, f"{job_id}_{frame_count}_before.jpg")
-                        cv2.imwrite(before_path, before_frame)
+                        snapshot_futures.append(snapshot_writer.submit(before_frame, before_path))
                         snapshot_paths = [before_path] # Reset for new incident
                         all_snapshot_paths.append(before_path)
                         
@@ -308,12 +593,13 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
 
                         add_timestamp(during_frame, frame_count / fps)
                         during_path = os.path.join(DATA_DIR, f"{job_id}_{frame_count}_during.jpg")
-                        cv2.imwrite(during_path, during_frame)
+                        snapshot_futures.append(snapshot_writer.submit(during_frame, during_path))
                         snapshot_paths.append(during_path)
                         all_snapshot_paths.append(during_path)
                         
                         snapshot_state = 'CAPTURING_AFTER'
                         frames_since_incident = 0
+                        clip_start_time = frame_count / fps - BEFORE_SECONDS
             else:
                 current_accident_streak = 0
 
@@ -325,6 +611,7 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
                 cv2.putText(annotated_frame, "CONFIRMING...", (50, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
             out.write(annotated_frame)
+            frames_in_part += 1
 
             # --- XỬ LÝ CHỤP ẢNH SAU & BÁO CÁO ---
             if snapshot_state == 'CAPTURING_AFTER':
@@ -337,24 +624,36 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
                     final_after = frame.copy()
                     add_timestamp(final_after, frame_count / fps)
                     
-                    cv2.imwrite(after_path, final_after)
+                    snapshot_futures.append(snapshot_writer.submit(final_after, after_path))
                     snapshot_paths.append(after_path)
                     all_snapshot_paths.append(after_path)
                     
                     # reports_data = [] # REMOVED local init
                     # REPORT NGAY LẬP TỨC
+                    # Clip bằng chứng T-4s..T+5s từ video nguồn (stream copy, thread nền)
+                    incident_clip = None
+                    if INCIDENT_CLIPS:
+                        clip_path = os.path.join(DATA_DIR, f"{job_id}_{frame_count}_clip.mp4")
+                        incident_clip = cut_incident_clip(input_path, clip_start_time, frame_count / fps, clip_path)
+                    
                     if auto_report and current_incident_info:
-                        report_result = report_to_backend(snapshot_paths, current_incident_info['label'], output_path)
-                        if report_result:
-                            all_reports.append(report_result)
-                            # Đính kèm vào thông tin sự cố để dự phòng
-                            current_incident_info['aiReport'] = report_result.get('aiReport')
+                        wait_for_snapshots(snapshot_futures)
+                        if incident_clip is not None:
+                            report_result = report_with_clip(snapshot_paths, current_incident_info['label'], incident_clip, video_url,
+                                                             key=f"{job_id}-{frame_count}")
+                        else:
+                            report_result = report_to_backend(snapshot_paths, current_incident_info['label'], video_url=video_url,
+                                                              key=f"{job_id}-{frame_count}")
+                        pending_reports.append((report_result, current_incident_info))
                     
                     detected_accidents.append({
                         "timestamp": current_incident_info['time'],
                         "label": current_incident_info['label'],
                         "snapshots": list(snapshot_paths)
                     })
+                    if incident_clip is not None:
+                        clip_futures.append((incident_clip, detected_accidents[-1]))
+                    emit("incident", {"status": "CAPTURED", **detected_accidents[-1]})
                     
                     snapshot_state = 'COOLDOWN'
                     frames_since_incident = 0
@@ -371,11 +670,72 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
             # Cập nhật tiến độ mỗi 30 frame
             if total_frames > 0 and frame_count % 30 == 0:
                 progress = int((frame_count / total_frames) * 100)
-                jobs[job_id]['progress'] = progress
+                jobs.update(job_id, progress=progress)
+                emit("progress", {"progress": progress})
                 print(f"[{job_id}] Progress: {progress}%")
 
+            # --- CHECKPOINT ---
+            if CHECKPOINT_INTERVAL > 0 and time.time() - last_checkpoint_at >= CHECKPOINT_INTERVAL:
+                out.release()
+                output_parts.append(out_part)
+                out_part, out = open_output_part()
+                frames_in_part = 0
+
+                # Checkpoint chỉ được tham chiếu đến ảnh đã nằm trên đĩa
+                fallback = None
+                if best_fallback_data:
+                    fb_paths = [os.path.join(DATA_DIR, f"{job_id}_fb_ckpt_{name}.jpg") for name in ("before", "during")]
+                    if saved_fallback_conf != best_fallback_conf:
+                        snapshot_futures.extend(snapshot_writer.submit(img, path)
+                                                for img, path in zip(best_fallback_data[1:], fb_paths))
+                        saved_fallback_conf = best_fallback_conf
+                    fallback = {"label": best_fallback_data[0], "before": fb_paths[0], "during": fb_paths[1]}
+                wait_for_snapshots(snapshot_futures)
+                for future, accident in clip_futures:
+                    if future.done() and future.exception() is None and future.result():
+                        accident['clip'] = future.result()
+
+                event_log.append("checkpoint", frame=frame_count)
+                checkpoints.save(job_id, {
+                    "jobId": job_id,
+                    "eventLogOffset": event_log.offset(),  # Sự kiện ghi sau vị trí này bị cắt khi chạy tiếp
+                    "createdAt": (jobs.get(job_id) or {}).get('createdAt'),
+                    "args": {"inputPath": input_path, "outputPath": output_path, "modelType": model_type,
+                             "customLabels": custom_labels, "confidenceThreshold": confidence_threshold,
+                             "autoReport": auto_report},
+                    "progress": int(frame_count / total_frames * 100) if total_frames > 0 else 0,
+                    "outputParts": output_parts,
+                    "state": {
+                        "frameCount": frame_count,
+                        "streak": current_accident_streak,
+                        "snapshotState": snapshot_state,
+                        "framesSinceIncident": frames_since_incident,
+                        "snapshotPaths": snapshot_paths,
+                        "allSnapshotPaths": all_snapshot_paths,
+                        "detectedAccidents": detected_accidents,
+                        "currentIncident": current_incident_info,
+                        "detectionCount": detection_count,
+                        "timeline": timeline.to_state(),
+                        "lastBoxes": last_boxes,
+                        "clipStartTime": clip_start_time,
+                        "fallbackConf": best_fallback_conf,
+                        "fallbackTime": best_fallback_time,
+                        "fallback": fallback,
+                        "reportsEnqueued": reports_before_resume + len(pending_reports),
+                    },
+                })
+                last_checkpoint_at = time.time()
+
         cap.release()
-        out.release()
+        if out is not None:
+            out.release()
+        if out_part != output_path:  # Video đầu ra gồm nhiều phần (checkpoint hoặc chia đoạn)
+            if out_part is not None:
+                if frames_in_part or not output_parts:
+                    output_parts.append(out_part)
+                else:
+                    os.remove(out_part)  # Phần mở sau checkpoint cuối nhưng không có frame nào
+            concat_videos(output_parts, output_path)
         
         # --- FALLBACK LOGIC FOR SHORT VIDEOS ---
         if not detected_accidents and best_fallback_data:
@@ -384,106 +744,156 @@ def process_video_task(input_path, output_path, job_id, is_realtime, model_type=
              
              # Save Fallback Images
              f_before_path = os.path.join(DATA_DIR, f"{job_id}_fb_before.jpg")
-             cv2.imwrite(f_before_path, fb_before)
+             snapshot_futures.append(snapshot_writer.submit(fb_before, f_before_path))
              
              f_during_path = os.path.join(DATA_DIR, f"{job_id}_fb_during.jpg")
-             cv2.imwrite(f_during_path, fb_during)
+             snapshot_futures.append(snapshot_writer.submit(fb_during, f_during_path))
              
              # Use last known frame as after
              f_after_path = os.path.join(DATA_DIR, f"{job_id}_fb_after.jpg")
              last_fr = frame_buffer[-1] if frame_buffer else fb_during
-             cv2.imwrite(f_after_path, last_fr)
+             snapshot_futures.append(snapshot_writer.submit(last_fr, f_after_path))
              
              fb_snapshots = [f_before_path, f_during_path, f_after_path]
              all_snapshot_paths.extend(fb_snapshots)
              
-             all_reports = [] # Use the global one if needed, but safe to just append if it exists
+             fb_clip = None
+             if INCIDENT_CLIPS:
+                  fb_clip = cut_incident_clip(input_path, best_fallback_time - BEFORE_SECONDS, best_fallback_time + AFTER_SECONDS,
+                                              os.path.join(DATA_DIR, f"{job_id}_fb_clip.mp4"))
+             
              if auto_report:
-                  report_result = report_to_backend(fb_snapshots, fb_label, output_path)
-                  if report_result: all_reports.append(report_result)
+                  wait_for_snapshots(snapshot_futures)
+                  if fb_clip is not None:
+                       pending_reports.append((report_with_clip(fb_snapshots, fb_label, fb_clip, video_url,
+                                                                key=f"{job_id}-fallback"), None))
+                  else:
+                       pending_reports.append((report_to_backend(fb_snapshots, fb_label, video_url=video_url,
+                                                                 key=f"{job_id}-fallback"), None))
                   
              detected_accidents.append({
                  "timestamp": 0, "label": fb_label, "snapshots": fb_snapshots
              })
+             if fb_clip is not None:
+                  clip_futures.append((fb_clip, detected_accidents[-1]))
+             emit("incident", {"status": "CAPTURED", "fallback": True, **detected_accidents[-1]})
         
-        # Save Metadata
+        # Mọi ảnh phải nằm trên đĩa trước khi báo COMPLETED (Java đọc chúng ngay sau đó)
+        wait_for_snapshots(snapshot_futures)
+
+        # Đường dẫn clip bằng chứng của từng sự cố (cắt cục bộ, không chờ mạng)
+        if clip_futures:
+            wait_futures([f for f, _ in clip_futures], timeout=60)
+        for future, accident in clip_futures:
+            if future.done() and future.exception() is None and future.result():
+                accident['clip'] = future.result()
+
+        # Kết quả báo cáo từ outbox: không chờ mạng, chỉ lấy các báo cáo đã gửi xong;
+        # báo cáo còn lại được ghi vào metadata/job khi outbox gửi xong (attach_report_result)
+        # Kết quả của báo cáo gửi trước khi server dừng không còn theo dõi được: outbox vẫn gửi chúng
+        reports_queued = reports_before_resume > 0
+        late_reports = []
+        for future, info in pending_reports:
+            if not future.done():
+                reports_queued = True  # Vẫn nằm trong outbox, sẽ được gửi sau
+                late_reports.append(future)
+                continue
+            if future.exception() is not None:
+                logger.error(f"[{job_id}] Report failed: {future.exception()}")
+                continue
+            report_result = future.result()
+            if report_result:
+                all_reports.append(report_result)
+                event_log.append("report", incidentId=report_result.get('id'))
+                if info is not None:
+                    # Đính kèm vào thông tin sự cố để dự phòng
+                    info['aiReport'] = report_result.get('aiReport')
+
+        if len(timeline) and not segmented:
+            event_log.append("segment", **timeline.segment(-1))  # Đoạn cuối chưa được ghi
+
+        # Save Metadata (tóm tắt gọn; các đoạn phát hiện nằm trong "timeline")
         metadata = {
             "has_accident": len(detected_accidents) > 0, 
             "snapshot_paths": all_snapshot_paths, # Send ALL snapshots
             "detected_accidents": detected_accidents,
-            "incidents": incidents,
+            "detectionCount": detection_count,
+            "timeline": timeline.to_dict(),
+            "eventLog": event_log.path,
             # NEW: Single top-level report (using the first one if multiple)
             "aiReport": all_reports[0]['aiReport'] if all_reports else None,
-            "incidentId": all_reports[0]['id'] if all_reports else None
+            "incidentId": all_reports[0]['id'] if all_reports else None,
+            # Báo cáo chưa gửi xong: outbox sẽ tạo sự cố, backend không cần tự tạo thêm
+            "reportQueued": reports_queued
         }
-        json_path = output_path + ".json" 
-        with open(json_path, 'w') as f:
-            json.dump(metadata, f, indent=4)
+        write_json_atomic(output_path + ".json", metadata)
+        event_log.append("summary", hasAccident=metadata["has_accident"], accidents=len(detected_accidents),
+                         detectionCount=detection_count, reportQueued=reports_queued)
 
-        jobs[job_id]['status'] = 'COMPLETED'
-        jobs[job_id]['progress'] = 100
+        checkpoints.remove(job_id)
+        set_job_status(job_id, 'COMPLETED', progress=100, hasAccident=len(detected_accidents) > 0)
+        for future in late_reports:
+            future.add_done_callback(lambda f: attach_report_result(job_id, output_path + ".json", event_log.path, f))
         print(f"[{job_id}] Finished.")
 
     except Exception as e:
         print(f"[{job_id}] Error: {str(e)}")
-        jobs[job_id]['status'] = 'FAILED'
-        jobs[job_id]['message'] = str(e)
+        checkpoints.remove(job_id)  # Lỗi thật sự: không chạy lại từ checkpoint
+        set_job_status(job_id, 'FAILED', message=str(e))
+        if event_log is not None:
+            event_log.append("error", message=str(e))
+    finally:
+        if event_log is not None:
+            event_log.close()
+
+
+report_results_lock = threading.Lock()
+
+def attach_report_result(job_id, metadata_path, event_log_path, future):
+    """
+    Done-callback (thread outbox) của báo cáo gửi xong sau khi job đã COMPLETED:
+    ghi aiReport/incidentId vào metadata (nếu chưa có) và job, thêm sự kiện "report" vào event log
+    """
+    if future.cancelled() or future.exception() is not None:
+        logger.error(f"[{job_id}] Report failed: {future.exception() if not future.cancelled() else 'cancelled'}")
+        return
+    report_result = future.result()
+    if not report_result:
+        return
+    with report_results_lock:
+        try:
+            with open(metadata_path, encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"[{job_id}] Cannot attach report result to {metadata_path}: {e}")
+            return
+        if metadata.get("incidentId") is None:
+            metadata["aiReport"] = report_result.get('aiReport')
+            metadata["incidentId"] = report_result.get('id')
+            write_json_atomic(metadata_path, metadata)
+            jobs.update(job_id, aiReport=metadata["aiReport"], incidentId=metadata["incidentId"])
+        event_log = JobEventLog(event_log_path, append=True)
+        event_log.append("report", incidentId=report_result.get('id'))
+        event_log.close()
+    print(f"[{job_id}] Report delivered after completion (ID: {report_result.get('id')})")
 
 
-def report_to_backend(snapshot_paths, label, video_path=None):
+def report_to_backend(snapshot_paths, label, video_path=None, video_url=None, key=None):
     """
-    Gửi 3 ảnh chụp + metadata + video (nếu có) đến Java Backend
+    Đưa báo cáo (3 ảnh chụp + metadata + video nếu có) vào outbox để gửi đến Java Backend
     
-    Endpoint: POST http://localhost:8080/api/incidents/report
-    Params: imageBefore, imageDuring, imageAfter, type, description, video
+    Endpoint: POST {BACKEND_API_URL}/incidents/report
+    Params: imageBefore, imageDuring, imageAfter, type, description, video, videoUrl, idempotencyKey
     
     Logic:
-    - Mở 3 file ảnh và gửi dưới dạng multipart/form-data
-    - Nếu có video, thêm vào files
-    - Backend sẽ xử lý và tạo báo cáo AI bằng Gemini
+    - Không gọi mạng ở đây: báo cáo được ghi xuống outbox và gửi bởi thread nền
+    - video_path: upload theo chunk (tiếp tục được) trước khi gửi báo cáo
+    - video_url: video đã có trên backend -> chỉ gửi đường dẫn thay vì upload lại cả file
+    - key: idempotency key cố định của sự cố (job batch: "<job_id>-<frame>") -> job chạy tiếp từ checkpoint
+      đưa lại cùng sự cố vào outbox không tạo báo cáo thứ hai
+    - Trả về Future resolve với kết quả từ backend (hoặc None nếu gửi thất bại hẳn)
     """
-    API_URL = "http://localhost:8080/api/incidents/report"
-    
-    try:
-        print(f"Uploading incident '{label}' to Backend...")
-        
-        # Mở các file ảnh để gửi (NẾU CÓ)
-        files = {}
-        
-        if snapshot_paths and len(snapshot_paths) >= 1 and os.path.exists(snapshot_paths[0]):
-             files['imageBefore'] = open(snapshot_paths[0], 'rb')
-        if snapshot_paths and len(snapshot_paths) >= 2 and os.path.exists(snapshot_paths[1]):
-             files['imageDuring'] = open(snapshot_paths[1], 'rb')
-        if snapshot_paths and len(snapshot_paths) >= 3 and os.path.exists(snapshot_paths[2]):
-             files['imageAfter'] = open(snapshot_paths[2], 'rb')
-        
-        # Thêm video nếu có và file tồn tại
-        if video_path and os.path.exists(video_path):
-            files['video'] = open(video_path, 'rb')
-        
-        data = {
-            'type': label,
-            'description': f"Auto-detected {label}" if label != "No Accident" else "Video analyzed: No accident detected."
-        }
-        
-        response = requests.post(API_URL, files=files, data=data)
-        
-        # Đóng tất cả file đã mở
-        for f in files.values():
-            if hasattr(f, 'close'):
-                f.close()
-            
-        if response.status_code == 200:
-            result = response.json()
-            print("✅ Successfully reported to Backend. ID:", result.get('id'))
-            return result
-        else:
-            print(f"❌ Backend Report Failed: {response.status_code} - {response.text}")
-            return None
-            
-    except Exception as e:
-        print(f"❌ Error reporting to backend: {str(e)}")
-        return None
+    return report_outbox.enqueue(snapshot_paths, label, video_path=video_path, video_url=video_url, key=key)
 
 
 # --- GLOBAL ASYNC LOOP SETUP (WEBRTC) ---
@@ -499,15 +909,28 @@ t.start()
 
 # -------------------------------
 
-class YoloVideoTrack(VideoStreamTrack):
-    def __init__(self, job_id, video_path, auto_report=False):
+class YoloVideoTrack:
+    """
+    Video track of one WebRTC stream. The aiortc VideoStreamTrack base is mixed in on
+    first use by make_video_track(), so importing this module does not import aiortc.
+    """
+    def __init__(self, job_id, video_path, auto_report=False, overlay="server", live=None):
         super().__init__()
         self.job_id = job_id
         self.auto_report = auto_report # Store flag
-        self.cap = cv2.VideoCapture(video_path)
+        # Overlay mode: 'server' = burn boxes into frames, 'client' = raw frames + data channel metadata
+        self.overlay = overlay
+        # RTCDataChannels by label (client overlay only): "detections" = unreliable per-frame records,
+        # "events" = reliable incident/report records
+        self.channels = {}
+        # Live sources (rtsp/http cameras, webcam index) use a threaded reader with reconnect and never loop.
+        # live=True forces a local file through the same reader (paced at file FPS) as a camera stand-in.
+        self.is_live = is_live_source(video_path) if live is None else live
+        self.cap = LiveVideoSource(video_path) if self.is_live else cv2.VideoCapture(video_path)
         if not self.cap.isOpened():
              logger.error(f"Cannot open video: {video_path}")
         self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self._last_output = None  # Last sent VideoFrame, repeated while a live source reconnects
         self.model = get_model("medium") # Default to medium for stream
         self.frame_count = 0
         self.skip_frames = 5 # Aggressive skip for CPU
@@ -525,6 +948,7 @@ class YoloVideoTrack(VideoStreamTrack):
         self.current_accident_streak = 0
         self.CONFIRMATION_FRAMES = int(self.fps * 0.5)
         self.snapshot_paths = []
+        self.snapshot_futures = []  # Background writes for the current incident's snapshots
         self.current_incident_info = None
         
         # Accumulators for Frontend
@@ -536,38 +960,145 @@ class YoloVideoTrack(VideoStreamTrack):
         # Use Global Temp Root to avoid Live Server hot-reload
         self.DATA_DIR = STREAM_DATA_ROOT
         self._stopped = False  # Flag to signal recv() to stop
+        # Guards self.cap between stop() (event loop) and a read running in the executor:
+        # if stop() happens mid-read, the reader releases the capture when its read returns
+        self._cap_lock = threading.Lock()
+        self._reading = False
+        self.last_activity = time.time()  # Updated on every recv(); used by the session reaper
+        # Reused per-frame buffers (output path): annotation canvas + I420 output plane
+        self._work_buf = None
+        self._yuv_buf = None
         # self.DATA_DIR = os.path.join(os.getcwd(), 'data')
         # os.makedirs(self.DATA_DIR, exist_ok=True)
 
+    def attach_channel(self, channel):
+        """Attach one of the browser's data channels ('detections' or 'events') used for client-side overlay."""
+        self.channels[channel.label] = channel
+        print(f"[Stream {self.job_id}] Data channel '{channel.label}' attached (overlay={self.overlay})")
+
+    def send_event(self, payload):
+        """
+        Send a compact JSON record over the data channel.
+        Per-frame records ('f') go over the unreliable 'detections' channel; incident/report
+        records go over the reliable 'events' channel (or 'detections' for clients without one).
+        Silently skipped when no channel is attached or it is not open yet.
+        Incident/report records are also pushed to SSE subscribers of the job.
+        """
+        channel = self.channels.get("detections")
+        if payload.get("t") != "f":
+            event_bus.publish(self.job_id, payload["t"], payload)
+            channel = self.channels.get("events", channel)
+        if channel is None or channel.readyState != "open":
+            return
+        try:
+            channel.send(json.dumps(payload, separators=(",", ":")))
+        except Exception as e:
+            logger.warning(f"[Stream {self.job_id}] Data channel send failed: {e}")
+
+    def _to_video_frame(self, img, pts, time_base):
+        """
+        Build the outgoing VideoFrame directly in yuv420p (the encoder's native format).
+        A single cv2 BGR->I420 conversion into a reused buffer replaces the old
+        BGR->RGB cvtColor + rgb24 frame that aiortc had to reformat again before encoding.
+        """
+        h, w = img.shape[:2]
+        if h % 2 or w % 2:
+            # I420 needs even dimensions; let the encoder reformat this (rare) case
+            video_frame = lazy_import("av").VideoFrame.from_ndarray(img, format="bgr24")
+        else:
+            if self._yuv_buf is None or self._yuv_buf.shape != (h * 3 // 2, w):
+                self._yuv_buf = np.empty((h * 3 // 2, w), dtype=np.uint8)
+            cv2.cvtColor(img, cv2.COLOR_BGR2YUV_I420, dst=self._yuv_buf)
+            video_frame = lazy_import("av").VideoFrame.from_ndarray(self._yuv_buf, format="yuv420p")
+        video_frame.pts = pts
+        video_frame.time_base = time_base
+        return video_frame
+
+    async def _publish_incident(self, futures, snapshot_paths, incident_info):
+        """Wait for the background snapshot writes, then expose the incident to clients and report it."""
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True)
+
+        # Report / Update
+        if self.auto_report:
+             print(f"[Stream {self.job_id}] Snapshot complete. Reporting...")
+        
+        # Update Global Metadata for Frontend Polling
+        jobs.update(self.job_id,
+                    snapshot_paths=list(self.all_snapshot_paths), # ALL images
+                    snapshot_urls=list(self.all_snapshot_urls), # URLs for Frontend
+                    detected_accidents=self.detected_accidents, # Structured Data
+                    has_accident=True)
+        self.send_event({"t": "incident", "status": "CAPTURED",
+                         "label": incident_info['label'],
+                         "snapshot_urls": self.all_snapshot_urls})
+        
+        # Conditional Auto Report
+        if self.auto_report:
+             report_result = await asyncio.wrap_future(report_to_backend(snapshot_paths, incident_info['label']))
+             if report_result and self.job_id in jobs:
+                 # UPDATE GLOBAL JOB STATUS WITH AI REPORT
+                 jobs.update(self.job_id, aiReport=report_result.get('aiReport'), incidentId=report_result.get('id'))
+                 print(f"[Stream {self.job_id}] AI Report Captured (ID: {report_result.get('id')})")
+                 self.send_event({"t": "report", "incidentId": report_result.get('id'),
+                                  "aiReport": report_result.get('aiReport'),
+                                  "snapshot_urls": self.all_snapshot_urls})
+        else:
+             print(f"[Stream {self.job_id}] Auto-report disabled. Skipping.")
 
     async def recv(self):
-        # Check if stream was stopped
+        # Check if stream was stopped (MediaStreamError is aiortc's end-of-track signal)
         if self._stopped:
-            return None
+            raise lazy_import("aiortc.mediastreams").MediaStreamError
+        self.last_activity = time.time()
         
         pts, time_base = await self.next_timestamp()
-        ret, frame = self.cap.read()
-        if not ret:
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            ret, frame = self.cap.read()
-            if not ret: return
+        if self.is_live:
+            # Waiting for the next camera frame must not block the event loop
+            ret, frame, opened = await asyncio.get_running_loop().run_in_executor(None, self._read_frame)
+            if self._stopped:
+                raise lazy_import("aiortc.mediastreams").MediaStreamError
+            if not ret:
+                if not opened:
+                    # Reader gave up after bounded reconnect attempts: end the stream
+                    print(f"[Stream {self.job_id}] Live source lost. Ending stream.")
+                    set_job_status(self.job_id, 'FAILED', message='Live source disconnected')
+                    raise lazy_import("aiortc.mediastreams").MediaStreamError
+                # Still reconnecting: hold the last picture instead of feeding duplicates to the detector
+                if self._last_output is None:
+                    self._last_output = self._to_video_frame(np.zeros((360, 640, 3), dtype=np.uint8), pts, time_base)
+                self._last_output.pts = pts
+                self._last_output.time_base = time_base
+                return self._last_output
+        else:
+            ret, frame, _ = self._read_frame()
+            if not ret and not self._stopped:
+                self._rewind()
+                ret, frame, _ = self._read_frame()
+            if not ret:
+                # Unreadable even from the start (or stopped): end the track instead of returning None
+                if not self._stopped:
+                    print(f"[Stream {self.job_id}] Video cannot be read. Ending stream.")
+                    set_job_status(self.job_id, 'FAILED', message='Video could not be read')
+                raise lazy_import("aiortc.mediastreams").MediaStreamError
         
         # --- OPTIMIZATION: RESIZE FRAME ---
         # Reduce resolution for stream performance (e.g. max width 640)
         h, w = frame.shape[:2]
         if w > 640:
             scale = 640 / w
-            new_w, new_h = 640, int(h * scale)
+            new_w, new_h = 640, int(h * scale) & ~1  # Even height keeps the yuv420p fast path
             frame = cv2.resize(frame, (new_w, new_h))
         
         self.frame_count += 1
-        self.frame_buffer.append(frame.copy())
+        # cap.read()/resize return a fresh array and `frame` is never drawn on, so no copy is needed
+        self.frame_buffer.append(frame)
         
         detection_found = False
         current_data = None
         
         # Optimization: Skip frames
-        if self.frame_count % self.skip_frames == 0:
+        boxes_updated = self.frame_count % self.skip_frames == 0
+        if boxes_updated:
             results = self.model.track(frame, persist=True, imgsz=640, verbose=False, tracker="bytetrack.yaml")
             self.last_boxes = []
             if results:
@@ -605,7 +1136,7 @@ class YoloVideoTrack(VideoStreamTrack):
                        before_frame = self.frame_buffer[0].copy() if self.frame_buffer else frame.copy()
                        add_timestamp(before_frame, (self.frame_count - len(self.frame_buffer)) / self.fps if self.frame_buffer else self.frame_count/self.fps)
                        before_path = os.path.join(self.DATA_DIR, f"{self.job_id}_{self.frame_count}_before.jpg")
-                       cv2.imwrite(before_path, before_frame)
+                       self.snapshot_futures = [snapshot_writer.submit(before_frame, before_path)]
                        self.snapshot_paths = [before_path]
                        self.all_snapshot_paths.append(before_path)
                        self.all_snapshot_urls.append(f"/data/{os.path.basename(before_path)}")
@@ -623,7 +1154,7 @@ class YoloVideoTrack(VideoStreamTrack):
 
                        add_timestamp(during_frame, self.frame_count / self.fps)
                        during_path = os.path.join(self.DATA_DIR, f"{self.job_id}_{self.frame_count}_during.jpg")
-                       cv2.imwrite(during_path, during_frame)
+                       self.snapshot_futures.append(snapshot_writer.submit(during_frame, during_path))
                        self.snapshot_paths.append(during_path)
                        self.all_snapshot_paths.append(during_path)
                        self.all_snapshot_urls.append(f"/data/{os.path.basename(during_path)}")
@@ -632,10 +1163,10 @@ class YoloVideoTrack(VideoStreamTrack):
                        self.frames_since_incident = 0
                        
                        # Update Global Job Status for Frontend
-                       if self.job_id in jobs:
-                            jobs[self.job_id]['status'] = 'DETECTED' 
-                            # jobs[self.job_id].setdefault('incidents', []).append(self.current_incident_info)
-                            # We update via 'detected_accidents' in AFTER block to be complete.
+                       # We update via 'detected_accidents' in AFTER block to be complete.
+                       jobs.update(self.job_id, status='DETECTED')
+                       self.send_event({"t": "incident", "status": "DETECTED", "label": label,
+                                        "ts": round(self.current_incident_info['time'], 2)})
 
         else:
              self.current_accident_streak = 0
@@ -648,7 +1179,7 @@ class YoloVideoTrack(VideoStreamTrack):
                   after_frame = frame.copy()
                   add_timestamp(after_frame, self.frame_count / self.fps)
                   after_path = os.path.join(self.DATA_DIR, f"{self.job_id}_{self.frame_count}_after.jpg")
-                  cv2.imwrite(after_path, after_frame)
+                  self.snapshot_futures.append(snapshot_writer.submit(after_frame, after_path))
                   self.snapshot_paths.append(after_path)
                   self.all_snapshot_paths.append(after_path)
                   self.all_snapshot_urls.append(f"/data/{os.path.basename(after_path)}")
@@ -660,27 +1191,9 @@ class YoloVideoTrack(VideoStreamTrack):
                         "snapshots": list(self.snapshot_paths)
                   })
 
-                  # Report / Update
-                  if self.auto_report:
-                       print(f"[Stream {self.job_id}] Snapshot complete. Reporting...")
-                  
-                  # Update Global Metadata for Frontend Polling
-                  if self.job_id in jobs:
-                       jobs[self.job_id]['snapshot_paths'] = list(self.all_snapshot_paths) # ALL images
-                       jobs[self.job_id]['snapshot_urls'] = list(self.all_snapshot_urls) # URLs for Frontend
-                       jobs[self.job_id]['detected_accidents'] = self.detected_accidents # Structured Data
-                       jobs[self.job_id]['has_accident'] = True
-                  
-                  # Conditional Auto Report
-                  if self.auto_report:
-                       report_result = report_to_backend(self.snapshot_paths, self.current_incident_info['label'])
-                       if report_result and self.job_id in jobs:
-                           # UPDATE GLOBAL JOB STATUS WITH AI REPORT
-                           jobs[self.job_id]['aiReport'] = report_result.get('aiReport')
-                           jobs[self.job_id]['incidentId'] = report_result.get('id')
-                           print(f"[Stream {self.job_id}] AI Report Captured (ID: {report_result.get('id')})")
-                  else:
-                       print(f"[Stream {self.job_id}] Auto-report disabled. Skipping.")
+                  # Publish once the JPEGs are on disk, without holding up this frame
+                  asyncio.ensure_future(self._publish_incident(
+                       list(self.snapshot_futures), list(self.snapshot_paths), dict(self.current_incident_info)))
                   
                   self.snapshot_state = 'COOLDOWN'
                   self.frames_since_incident = 0
@@ -690,8 +1203,24 @@ class YoloVideoTrack(VideoStreamTrack):
              if self.frames_since_incident >= (self.fps * 5.0):
                   self.snapshot_state = 'SEARCHING'
 
-        # Draw cached boxes
-        annotated_frame = frame.copy()
+        # Client overlay: ship raw frame, let the browser draw from the data channel record
+        if self.overlay == "client":
+            h, w = frame.shape[:2]
+            record = {"t": "f", "n": self.frame_count, "ts": round(self.frame_count / self.fps, 2), "w": w, "h": h}
+            if boxes_updated:
+                # Boxes only change on inference frames; the browser keeps the last set in between
+                record["b"] = [[x1, y1, x2, y2, label, round(conf, 2)] for ((x1, y1, x2, y2), label, conf) in self.last_boxes]
+            if self.current_accident_streak > 0 and self.snapshot_state == 'SEARCHING':
+                record["c"] = round(min(self.current_accident_streak / self.CONFIRMATION_FRAMES, 1.0), 2)
+            self.send_event(record)
+            self._last_output = self._to_video_frame(frame, pts, time_base)
+            return self._last_output
+
+        # Draw cached boxes onto the reused working buffer (buffered frames must stay clean)
+        if self._work_buf is None or self._work_buf.shape != frame.shape:
+            self._work_buf = np.empty_like(frame)
+        np.copyto(self._work_buf, frame)
+        annotated_frame = self._work_buf
         add_timestamp(annotated_frame, self.frame_count / self.fps)
         
         # Visual Debug Bar
@@ -706,20 +1235,168 @@ class YoloVideoTrack(VideoStreamTrack):
             # Filter labels if needed, or use all
             color = (0, 0, 255) if "accident" in label.lower() else (0, 255, 0)
             draw_styled_box(annotated_frame, x1, y1, x2, y2, label, conf, color)
-        frame_rgb = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
         
-        video_frame = VideoFrame.from_ndarray(frame_rgb, format="rgb24")
-        video_frame.pts = pts
-        video_frame.time_base = time_base
-        return video_frame
+        self._last_output = self._to_video_frame(annotated_frame, pts, time_base)
+        return self._last_output
+
+    def _read_frame(self):
+        """
+        Read one frame; safe to run in the executor while stop() runs on the event loop.
+        Returns (ret, frame, source still open); ret is False once the track is stopped.
+        """
+        with self._cap_lock:
+            cap = self.cap
+            if cap is None:
+                return False, None, False
+            self._reading = True
+        try:
+            ret, frame = cap.read()
+            opened = cap.isOpened()
+        finally:
+            with self._cap_lock:
+                self._reading = False
+                stopped = self.cap is None
+            if stopped:
+                cap.release()  # stop() ran during the read and left the release to us
+        return ret, frame, opened
+
+    def _rewind(self):
+        with self._cap_lock:
+            if self.cap is not None:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
     def stop(self):
+        if self._stopped:
+            return
         self._stopped = True  # Signal recv() to stop
         print(f"[Stream {self.job_id}] Stop signal received.")
-        if self.cap: self.cap.release()
+        # Release handles deterministically instead of waiting for GC
+        # (a read in progress releases the capture itself when it returns)
+        with self._cap_lock:
+            cap, self.cap = self.cap, None
+            reading = self._reading
+        if cap is not None and not reading:
+            cap.release()
+        self.model = None  # Drop reference to the shared model
+        self.frame_buffer.clear()
+        self._work_buf = None
+        self._yuv_buf = None
+        self._last_output = None
+        self.channels = {}
         super().stop()
 
 
+_video_track_class = None
+
+def make_video_track(*args, **kwargs):
+    """Create a YoloVideoTrack (aiortc is imported with the first WebRTC session)"""
+    global _video_track_class
+    if _video_track_class is None:
+        VideoStreamTrack = lazy_import("aiortc").VideoStreamTrack
+        _video_track_class = type("YoloVideoTrack", (YoloVideoTrack, VideoStreamTrack), {})
+    return _video_track_class(*args, **kwargs)
+
+
+class StreamSessionManager:
+    """
+    Owns every WebRTC peer session (RTCPeerConnection + YoloVideoTrack).
+    All methods run on the global asyncio loop.
+
+    - Caps concurrent peers (MAX_STREAM_PEERS)
+    - Closes sessions that stop pulling frames for STREAM_IDLE_TIMEOUT seconds
+    - Evicts finished realtime job entries after REALTIME_JOB_RETENTION seconds
+    - drain() refuses new sessions and closes all open ones (used by /shutdown)
+    """
+
+    REAP_INTERVAL = 5.0  # Seconds between reaper passes
+
+    def __init__(self, max_peers, idle_timeout, job_retention):
+        self.max_peers = max_peers
+        self.idle_timeout = idle_timeout
+        self.job_retention = job_retention
+        self.sessions = {}  # job_id -> (pc, track)
+        self.accepting = True
+        self._reaper = None
+
+    def start(self):
+        """Start the periodic reaper task (call from the loop thread)."""
+        if self._reaper is None:
+            self._reaper = asyncio.ensure_future(self._reap_forever())
+
+    def open(self, job_id, pc):
+        """Register a new peer; raises if draining, at capacity, or the job already streams."""
+        if not self.accepting:
+            raise RuntimeError("Server is shutting down")
+        if job_id in self.sessions:
+            raise RuntimeError(f"Job {job_id} already has an active stream")
+        if len(self.sessions) >= self.max_peers:
+            raise RuntimeError(f"Too many concurrent streams (max {self.max_peers})")
+        self.sessions[job_id] = (pc, None)
+
+    def attach_track(self, job_id, track):
+        pc, _ = self.sessions[job_id]
+        self.sessions[job_id] = (pc, track)
+
+    async def close(self, job_id, reason="closed"):
+        """Stop the track, close the peer and mark the job finished. Safe to call twice."""
+        session = self.sessions.pop(job_id, None)
+        if session is None:
+            return
+        pc, track = session
+        print(f"[Session {job_id}] Closing ({reason})")
+        if track:
+            track.stop()
+        await pc.close()
+
+        job = jobs.get(job_id)
+        if job is not None:
+            jobs.update(job_id, endedAt=time.time())
+            if job.get('status') != 'FAILED':
+                set_job_status(job_id, 'STOPPED')
+
+    async def drain(self):
+        """Refuse new sessions and close every open one. Returns the number closed."""
+        self.accepting = False
+        job_ids = list(self.sessions)
+        for job_id in job_ids:
+            await self.close(job_id, reason="shutdown")
+        return len(job_ids)
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(self.REAP_INTERVAL)
+            try:
+                await self._reap()
+            except Exception as e:
+                logger.error(f"Session reaper error: {e}")
+
+    async def _reap(self):
+        now = time.time()
+        # 1. Idle peers (client vanished without a clean close, or never connected)
+        for job_id, (pc, track) in list(self.sessions.items()):
+            last = track.last_activity if track else jobs.get(job_id, {}).get('createdAt', now)
+            if now - last > self.idle_timeout:
+                await self.close(job_id, reason=f"idle > {self.idle_timeout:.0f}s")
+
+        # 2. Realtime job entries that ended (or were never streamed) long enough ago
+        for job_id, job in list(jobs.items()):
+            if job.get('type') != 'REALTIME' or job_id in self.sessions:
+                continue
+            finished_at = job.get('endedAt') or job.get('createdAt', now)
+            if now - finished_at > self.job_retention:
+                jobs.remove(job_id)
+                print(f"[Session {job_id}] Realtime job evicted")
+
+        # 3. Any finished job past the store's TTL
+        evicted = jobs.evict_expired(now)
+        if evicted:
+            print(f"Job store: evicted {len(evicted)} finished job(s)")
+
+
+sessions = StreamSessionManager(MAX_STREAM_PEERS, STREAM_IDLE_TIMEOUT, REALTIME_JOB_RETENTION)
+loop.call_soon_threadsafe(sessions.start)
+
+
 @app.route('/process', methods=['POST'])
 def process_video():
     data = request.json
@@ -747,18 +1424,23 @@ def process_video():
     if not input_path:
         return jsonify({"error": "Missing inputPath"}), 400
 
+    if not sessions.accepting:
+        return jsonify({"error": "Server is shutting down"}), 503
+
     job_id = str(uuid.uuid4())
     
     if is_realtime:
         # REALTIME JOB
-        jobs[job_id] = {
-            "id": job_id,
+        jobs.create(job_id, {
             "inputPath": input_path,
             "type": "REALTIME",
             "status": "READY",
+            "createdAt": time.time(),  # Dùng để thu hồi job không bao giờ được stream
             "modelType": model_type,
-            "autoReport": auto_report # Store flag
-        }
+            "autoReport": auto_report, # Store flag
+            # None = auto-detect from inputPath (rtsp/http URL or webcam index); True forces a file to act as a camera
+            "live": True if data.get('live') else None
+        })
     else:
         # BATCH JOB
         if not output_path:
@@ -766,23 +1448,64 @@ def process_video():
              # But Java should send it.
              return jsonify({"error": "Missing outputPath for batch mode"}), 400
 
-        jobs[job_id] = {
-            "id": job_id,
+        jobs.create(job_id, {
             "type": "BATCH",
             "status": "QUEUED",
             "progress": 0,
             "modelType": model_type,
             "customLabels": custom_labels,
             "confidenceThreshold": confidence_threshold
-        }
+        })
         
         # Start Thread
-        worker = threading.Thread(target=process_video_task, args=(input_path, output_path, job_id, False, model_type, custom_labels, confidence_threshold, auto_report))
+        # segments: chia video dài thành N đoạn xử lý song song (mặc định PARALLEL_SEGMENTS)
+        worker = threading.Thread(target=process_video_task, args=(input_path, output_path, job_id, False, model_type, custom_labels, confidence_threshold, auto_report),
+                                  kwargs={"segments": data.get('segments')})
         worker.daemon = True
         worker.start()
 
     return jsonify({"jobId": job_id, "status": "READY" if is_realtime else "QUEUED"})
 
+def resume_batch_jobs():
+    """Chạy tiếp các job batch còn checkpoint trên đĩa (server bị dừng khi job đang chạy)"""
+    for checkpoint in checkpoints.load_all():
+        job_id = checkpoint['jobId']
+        args = checkpoint['args']
+        if not os.path.exists(args['inputPath']):
+            print(f"[{job_id}] Input {args['inputPath']} is gone, dropping checkpoint")
+            checkpoints.remove(job_id)
+            continue
+        job = {
+            "type": "BATCH",
+            "status": "QUEUED",
+            "progress": checkpoint.get('progress', 0),
+            "modelType": args['modelType'],
+            "customLabels": args['customLabels'],
+            "confidenceThreshold": args['confidenceThreshold'],
+            "resumedFromFrame": checkpoint['state']['frameCount']
+        }
+        if checkpoint.get('createdAt'):
+            job['createdAt'] = checkpoint['createdAt']
+        jobs.create(job_id, job)
+        worker = threading.Thread(target=process_video_task,
+                                  args=(args['inputPath'], args['outputPath'], job_id, False, args['modelType'],
+                                        args['customLabels'], args['confidenceThreshold'], args['autoReport']),
+                                  kwargs={"resume": checkpoint})
+        worker.daemon = True
+        worker.start()
+        print(f"[{job_id}] Resuming batch job from frame {job['resumedFromFrame']}")
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    Danh sách job theo trang (mới nhất trước)
+    Query: offset (0), limit (50, tối đa 200), status, type (BATCH/REALTIME)
+    """
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(200, max(1, request.args.get('limit', 50, type=int)))
+    total, items = jobs.page(offset, limit, status=request.args.get('status'), job_type=request.args.get('type'))
+    return jsonify({"total": total, "offset": offset, "limit": limit, "jobs": items})
+
 @app.route('/status/<job_id>', methods=['GET'])
 def get_status(job_id):
     job = jobs.get(job_id)
@@ -790,38 +1513,95 @@ def get_status(job_id):
         return jsonify({"error": "Job not found"}), 404
     return jsonify(job)
 
+@app.route('/results/<job_id>', methods=['GET'])
+def get_partial_results(job_id):
+    """
+    Kết quả từng phần của job batch (đọc từ event log JSON Lines, có thể gọi khi job đang chạy)
+    Query: offset = vị trí byte trả về ở lần gọi trước (đọc tiếp phần mới), limit (tối đa 5000 sự kiện)
+    """
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if not job.get('eventLog'):
+        return jsonify({"error": "No results yet"}), 404
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(5000, max(1, request.args.get('limit', 1000, type=int)))
+    events, next_offset = read_events(job['eventLog'], offset, limit)
+    return jsonify({
+        "status": job.get('status'),
+        "events": events,
+        "nextOffset": next_offset,
+        "complete": job.get('status') in TERMINAL_STATUSES and len(events) < limit
+    })
+
+@app.route('/events/<job_id>', methods=['GET'])
+def job_events(job_id):
+    """
+    Server-Sent Events: đẩy trạng thái job ngay khi thay đổi thay vì để client poll /status
+    Sự kiện: status (trạng thái hiện tại gửi ngay khi kết nối, sau đó mỗi lần đổi),
+    progress, incident, report. Stream tự đóng khi job kết thúc (COMPLETED/FAILED/STOPPED).
+    """
+    if job_id not in jobs:
+        return jsonify({"error": "Job not found"}), 404
+    q = event_bus.subscribe(job_id)
+
+    def stream():
+        try:
+            snapshot = jobs.get(job_id, {})
+            yield format_sse("status", snapshot)
+            if snapshot.get('status') in TERMINAL_STATUSES:
+                return
+            while True:
+                try:
+                    event, data = q.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"  # Giữ kết nối qua proxy
+                    continue
+                yield format_sse(event, data)
+                if event == "status" and data.get('status') in TERMINAL_STATUSES:
+                    return
+        finally:
+            event_bus.unsubscribe(job_id, q)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Logic to run inside the global loop (WebRTC Offer)
 async def run_offer(params):
     # ... [Same as before] ...
-    offer_sdp = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
+    aiortc = lazy_import("aiortc")
+    offer_sdp = aiortc.RTCSessionDescription(sdp=params["sdp"], type=params["type"])
     job_id = params.get("jobId")
     job = jobs.get(job_id)
     if not job: raise Exception("Job not found")
         
-    pc = RTCPeerConnection()
-    pcs.add(pc)
+    overlay = params.get("overlay", "server")  # 'client' = raw video + detections over data channel
+    video_track = None
+
+    pc = aiortc.RTCPeerConnection()
+    try:
+        sessions.open(job_id, pc)
+    except RuntimeError:
+        await pc.close()
+        raise
+
+    @pc.on("datachannel")
+    def on_datachannel(channel):
+        if video_track:
+            video_track.attach_channel(channel)
 
     @pc.on("connectionstatechange")
     async def on_connectionstatechange():
         print(f"Connection state is {pc.connectionState}")
         if pc.connectionState in ["failed", "closed", "disconnected"]:
             print("Client disconnected, cleaning up...")
-            await pc.close()
-            pcs.discard(pc)
-            
-            # Explicitly stop tracks and update job status
-            for sender in pc.getSenders():
-                if sender.track:
-                    sender.track.stop()
-            
-            if job_id in jobs:
-                jobs[job_id]['status'] = 'STOPPED'
-                print(f"Job {job_id} stopped.")
+            await sessions.close(job_id, reason=pc.connectionState)
 
-    if os.path.exists(job["inputPath"]):
+    if job.get("live") or is_live_source(job["inputPath"]) or os.path.exists(job["inputPath"]):
         # Pass auto_report from job config
-        video_track = YoloVideoTrack(job_id, job["inputPath"], job.get("autoReport", False))
+        video_track = make_video_track(job_id, job["inputPath"], job.get("autoReport", False), overlay=overlay, live=job.get("live"))
         pc.addTrack(video_track)
+        sessions.attach_track(job_id, video_track)
     else:
         print(f"ERROR: File not found {job['inputPath']}")
 
@@ -838,13 +1618,34 @@ def offer():
         future = asyncio.run_coroutine_threadsafe(run_offer(params), loop)
         result = future.result(timeout=10)
         return jsonify(result)
+    except RuntimeError as e:
+        # Capacity / draining: tell the client to retry later
+        logger.warning(f"Offer rejected: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logger.error(f"Offer failed: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/shutdown', methods=['POST'])
+def shutdown():
+    """
+    Drain the server: refuse new jobs/streams, close every WebRTC session
+    (releasing captures) and drop cached models. Batch jobs already running
+    are left to finish; their count is returned so callers can wait on them.
+    """
+    future = asyncio.run_coroutine_threadsafe(sessions.drain(), loop)
+    closed = future.result(timeout=10)
+    MODELS.clear()
+    pending = [j['id'] for j in jobs.values() if j.get('type') == 'BATCH' and j.get('status') in ('QUEUED', 'PROCESSING')]
+    pending_reports = report_outbox.pending_count()
+    print(f"Shutdown drain: closed {closed} stream(s), {len(pending)} batch job(s) still running, {pending_reports} report(s) in outbox")
+    return jsonify({"closedStreams": closed, "pendingBatchJobs": pending, "pendingReports": pending_reports})
+
 @app.route('/data/<path:filename>')
 def serve_data(filename):
     return send_from_directory(STREAM_DATA_ROOT, filename)
 
 if __name__ == '__main__':
+    resume_batch_jobs()
+    startup_report("Server", STARTUP_STARTED)
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
@@ -1,14 +1,22 @@
-import requests
 import os
 
+from utils.http_session import get_http_session, get_timeout
+from utils.chunked_upload import ChunkedUploader
+from utils.video_clip import extract_clip
+
 class APIClient:
     """
     Client để giao tiếp với Java Backend API
     Xử lý việc gửi báo cáo sự cố và lấy lịch sử phát hiện
     """
-    def __init__(self, base_url="http://localhost:8080/api"):
-        """Khởi tạo client với URL cơ sở của backend"""
+    def __init__(self, base_url="http://localhost:8080/api", session=None):
+        """
+        Khởi tạo client với URL cơ sở của backend
+        Mặc định dùng Session chung (connection pool) để các request dùng lại kết nối
+        """
         self.base_url = base_url
+        self.session = session or get_http_session()
+        self.uploader = ChunkedUploader(base_url, session=self.session)
 
     def send_incident(self, image_path, incident_type, location="Camera-01"):
         """
@@ -24,7 +32,7 @@ class APIClient:
                     'type': incident_type,
                     'location': location
                 }
-                response = requests.post(endpoint, files=files, data=data)
+                response = self.session.post(endpoint, files=files, data=data, timeout=get_timeout("incident"))
                 
                 if response.status_code == 200:
                     return response.json()
@@ -35,14 +43,46 @@ class APIClient:
             print(f"API Error: {e}")
             return None
     
-    def send_full_report(self, before_path, during_path, after_path, incident_type, video_path=None):
+    def upload_video(self, video_path, clip_range=None, progress_callback=None):
+        """
+        Upload video bằng chứng theo từng chunk (có thể tiếp tục khi bị ngắt)
+
+        Args:
+            video_path: File video
+            clip_range: (start_sec, end_sec) -> chỉ upload clip quanh sự cố thay vì cả video
+            progress_callback: Hàm (sent_bytes, total_bytes)
+
+        Returns:
+            videoUrl trên backend, hoặc None nếu thất bại
+        """
+        path = video_path
+        if clip_range:
+            path = extract_clip(video_path, *clip_range) or video_path
+            if path != video_path:
+                print(f"✂️ Trimmed evidence clip {clip_range[0]:.1f}s-{clip_range[1]:.1f}s: {os.path.basename(path)}")
+        try:
+            return self.uploader.upload(path, progress_callback=progress_callback)
+        except Exception as e:
+            print(f"API Error uploading video: {e}")
+            return None
+        finally:
+            if path != video_path and os.path.exists(path):
+                os.remove(path)
+
+    def send_full_report(self, before_path, during_path, after_path, incident_type, video_path=None, clip_range=None, progress_callback=None):
         """
         Gửi báo cáo đầy đủ với 3 ảnh chụp (trước, trong, sau) đến backend để tạo báo cáo AI
-        Có thể kèm video nếu có
+        Có thể kèm video nếu có: video được upload trước theo từng chunk (upload_video),
+        báo cáo chỉ mang theo videoUrl. clip_range=(start, end) để chỉ gửi clip quanh sự cố.
         """
         url = f"{self.base_url}/incidents/report"
         
         try:
+            # Upload video trước (theo chunk), báo cáo chỉ gửi đường dẫn
+            video_url = None
+            if video_path and os.path.exists(video_path):
+                video_url = self.upload_video(video_path, clip_range, progress_callback)
+
             # Chuẩn bị dữ liệu multipart form
             files = {}
             
@@ -53,17 +93,15 @@ class APIClient:
             if after_path and os.path.exists(after_path):
                 files['imageAfter'] = open(after_path, 'rb')
             
-            # Thêm video nếu có và file tồn tại
-            if video_path and os.path.exists(video_path):
-                files['video'] = open(video_path, 'rb')
-            
             data = {
                 'type': incident_type,
                 'description': f'Auto-detected {incident_type}' if incident_type != 'No Accident' else 'Video analyzed: No accident detected.'
             }
+            if video_url:
+                data['videoUrl'] = video_url
             
-            # Tăng timeout cho việc upload video (có thể lớn)
-            response = requests.post(url, files=files, data=data, timeout=60)
+            # Timeout dài cho việc upload video (có thể lớn)
+            response = self.session.post(url, files=files, data=data, timeout=get_timeout("report"))
             
             # Đóng tất cả file đã mở
             for f in files.values():
@@ -84,23 +122,24 @@ class APIClient:
             print(f"API Error: {e}")
             return None
     
-    def get_history(self, limit=50):
+    def get_incident_page(self, after_id=0, limit=100):
         """
-        Lấy lịch sử phát hiện từ backend
-        Giới hạn số lượng kết quả trả về
+        Lấy một trang sự cố có id > after_id (sắp theo id tăng dần), phân trang phía server
+        Trang ngắn hơn limit nghĩa là đã lấy hết
+
+        Returns:
+            Danh sách sự cố, hoặc None nếu lỗi (để phân biệt với "không có sự cố mới")
         """
-        url = f"{self.base_url}/incidents"
+        url = f"{self.base_url}/incidents/page"
         
         try:
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, params={"afterId": after_id, "limit": limit},
+                                        timeout=get_timeout("history"))
             if response.status_code == 200:
-                incidents = response.json()
-                print(f"✅ Fetched {len(incidents)} incidents from history")
-                # Giới hạn số lượng kết quả trả về
-                return incidents[:limit]
+                return response.json()
             else:
                 print(f"❌ Failed to fetch history: {response.status_code}")
-                return []
+                return None
         except Exception as e:
             print(f"API Error fetching history: {e}")
-            return []
+            return None
@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+
+class ApiExecutor(QObject):
+    """
+    Thread pool dùng chung cho mọi lời gọi API (HTTP) của desktop app
+    Thread GUI không bao giờ chờ mạng: submit() trả về ngay, kết quả được gọi lại trên thread GUI
+    qua signal (on_result / on_error).
+
+    Phải được tạo trên thread GUI (sau QApplication).
+    """
+    pending_changed = pyqtSignal(int)  # Số lời gọi đang chờ hoặc đang chạy
+    _completed = pyqtSignal(object, object, object)  # (future, on_result, on_error), phát từ thread nền
+
+    def __init__(self, max_workers=None, parent=None):
+        """
+        Args:
+            max_workers: Số lời gọi chạy song song (mặc định API_WORKERS hoặc 4)
+        """
+        super().__init__(parent)
+        if max_workers is None:
+            max_workers = int(os.environ.get("API_WORKERS", 4))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api")
+        self._pending = 0  # Chỉ đọc/ghi trên thread GUI
+        # Signal phát từ thread của pool -> slot chạy trên thread GUI (queued connection)
+        self._completed.connect(self._deliver)
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, fn, *args, on_result=None, on_error=None, **kwargs):
+        """
+        Chạy fn(*args, **kwargs) trong thread nền
+
+        Args:
+            on_result: Gọi trên thread GUI với giá trị trả về của fn
+            on_error: Gọi trên thread GUI với exception nếu fn lỗi (mặc định chỉ in lỗi)
+
+        Returns:
+            Future của lời gọi
+        """
+        self._pending += 1
+        self.pending_changed.emit(self._pending)
+        future = self._pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self._completed.emit(f, on_result, on_error))
+        return future
+
+    @pyqtSlot(object, object, object)
+    def _deliver(self, future, on_result, on_error):
+        self._pending -= 1
+        self.pending_changed.emit(self._pending)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            else:
+                print(f"❌ API call failed: {error}")
+        elif on_result is not None:
+            on_result(future.result())
+
+    def shutdown(self):
+        """Hủy các lời gọi chưa bắt đầu, không chờ lời gọi đang chạy (đã có timeout HTTP)"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_default_executor = None
+
+
+def get_api_executor():
+    """Lấy ApiExecutor dùng chung cho cả ứng dụng (tạo khi dùng lần đầu, trên thread GUI)"""
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ApiExecutor()
+    return _default_executor
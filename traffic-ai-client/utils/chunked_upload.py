@@ -0,0 +1,117 @@
+import os
+import time
+
+from utils.http_session import get_http_session, get_timeout
+
+
+class UploadError(Exception):
+    """Upload thất bại sau khi đã thử lại đủ số lần"""
+
+
+class ChunkedUploader:
+    """
+    Upload file lớn (video bằng chứng) theo từng chunk lên Java Backend, có thể tiếp tục khi bị ngắt
+
+    Giao thức (xem UploadController.java):
+    - POST /uploads (fileName)            -> uploadId
+    - PUT  /uploads/<id>?offset=N (bytes) -> số byte đã nhận
+    - GET  /uploads/<id>                  -> số byte đã nhận (để tiếp tục)
+    - POST /uploads/<id>/complete         -> videoUrl (dùng cho trường videoUrl của báo cáo)
+
+    Chỉ một chunk nằm trong bộ nhớ tại một thời điểm, thay vì đọc cả file vào request multipart.
+    """
+
+    def __init__(self, base_url="http://localhost:8080/api", session=None, chunk_size=None, max_retries=5, backoff_base=1.0):
+        """
+        Args:
+            base_url: URL cơ sở của backend
+            session: requests.Session (mặc định: Session chung có connection pool)
+            chunk_size: Kích thước mỗi chunk (byte), mặc định UPLOAD_CHUNK_SIZE hoặc 4MB
+            max_retries: Số lần thử lại liên tiếp khi một chunk thất bại
+            backoff_base: Thời gian chờ ban đầu giữa các lần thử (giây), nhân đôi mỗi lần
+        """
+        self.base_url = base_url
+        self.session = session or get_http_session()
+        self.chunk_size = int(chunk_size or os.environ.get("UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    def upload(self, path, progress_callback=None, upload_id=None, on_created=None):
+        """
+        Upload một file, tiếp tục từ upload_id nếu có
+
+        Args:
+            path: File cần upload
+            progress_callback: Hàm (sent_bytes, total_bytes) được gọi sau mỗi chunk
+            upload_id: ID của lần upload dở dang trước đó (để tiếp tục)
+            on_created: Hàm (upload_id) được gọi khi tạo upload mới (để lưu lại, tiếp tục sau)
+
+        Returns:
+            videoUrl của file trên backend
+
+        Raises:
+            UploadError nếu thất bại sau max_retries lần thử liên tiếp
+        """
+        total = os.path.getsize(path)
+        offset = self._resume_offset(upload_id) if upload_id else None
+        if offset is None:
+            upload_id, offset = self._create(os.path.basename(path))
+            if on_created:
+                on_created(upload_id)
+
+        failures = 0
+        with open(path, 'rb') as f:
+            while offset < total:
+                f.seek(offset)
+                chunk = f.read(self.chunk_size)
+                try:
+                    response = self.session.put(f"{self.base_url}/uploads/{upload_id}", params={'offset': offset},
+                                                data=chunk, headers={'Content-Type': 'application/octet-stream'},
+                                                timeout=get_timeout("upload"))
+                    if response.status_code in (200, 409):
+                        # 409: backend đã có dữ liệu khác offset -> tiếp tục từ vị trí backend báo
+                        offset = int(response.json()['received'])
+                        failures = 0
+                        if progress_callback:
+                            progress_callback(offset, total)
+                        continue
+                    if response.status_code == 404:
+                        raise UploadError(f"Upload {upload_id} no longer exists on backend")
+                    print(f"⚠️ Chunk upload failed: {response.status_code}")
+                except UploadError:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Chunk upload error: {e}")
+
+                failures += 1
+                if failures > self.max_retries:
+                    raise UploadError(f"Giving up on {os.path.basename(path)} at {offset}/{total} bytes")
+                time.sleep(self.backoff_base * (2 ** (failures - 1)))
+                # Hỏi lại backend đã nhận bao nhiêu (chunk có thể đã tới nhưng mất phản hồi)
+                offset = self._resume_offset(upload_id)
+                if offset is None:
+                    raise UploadError(f"Upload {upload_id} no longer exists on backend")
+
+        response = self.session.post(f"{self.base_url}/uploads/{upload_id}/complete", timeout=get_timeout("upload"))
+        if response.status_code != 200:
+            raise UploadError(f"Completing upload failed: {response.status_code}")
+        return response.json()['videoUrl']
+
+    def _create(self, file_name):
+        response = self.session.post(f"{self.base_url}/uploads", data={'fileName': file_name},
+                                     timeout=get_timeout("upload"))
+        if response.status_code != 200:
+            raise UploadError(f"Creating upload failed: {response.status_code}")
+        result = response.json()
+        return result['uploadId'], int(result['received'])
+
+    def _resume_offset(self, upload_id):
+        """Số byte backend đã nhận cho upload_id, None nếu upload không còn tồn tại"""
+        try:
+            response = self.session.get(f"{self.base_url}/uploads/{upload_id}", timeout=get_timeout("upload"))
+        except Exception as e:
+            print(f"⚠️ Upload status error: {e}")
+            return 0  # Chưa rõ: gửi lại từ 0, backend sẽ trả 409 kèm vị trí đúng
+        if response.status_code != 200:
+            return None
+        return int(response.json()['received'])
@@ -0,0 +1,576 @@
+import cv2
+import time
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, wait as wait_futures
+import numpy as np
+from utils.snapshot_writer import get_snapshot_writer, when_written
+from utils.model_cache import get_model_cache
+
+# Thiết lập thư mục gốc để lưu dữ liệu
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+if not os.path.exists(DATA_DIR):
+    os.makedirs(DATA_DIR)
+
+_sequence_lock = threading.Lock()
+_last_sequence_id = 0
+
+def next_sequence_id():
+    """
+    ID chuỗi ảnh (timestamp theo giây), tăng dần và không trùng trong tiến trình
+    Nhiều DetectionThread chạy song song có thể phát hiện trong cùng một giây -> tên file không đè nhau
+    """
+    global _last_sequence_id
+    with _sequence_lock:
+        _last_sequence_id = max(int(time.time()), _last_sequence_id + 1)
+        return _last_sequence_id
+
+class DetectionCore:
+    """
+    Logic phát hiện sự cố bằng YOLO, không phụ thuộc PyQt
+    Dùng chung cho DetectionThread (desktop app) và analyze_batch.py (chạy dòng lệnh, không cần màn hình)
+
+    Kết quả được báo qua các callback (None = bỏ qua):
+        on_frame(annotated_frame), on_detection(label, image_path),
+        on_snapshots(before, during, after), on_progress(percent), on_finished(result)
+    """
+
+    def __init__(self, model_path='best.pt', source=0, save_path=None, custom_labels="accident, vehicle accident", conf_threshold=0.70, loop=True,
+                 snapshot_dir=None, on_frame=None, on_detection=None, on_snapshots=None, on_progress=None, on_finished=None):
+        """
+        Khởi tạo bộ phát hiện
+        
+        Args:
+            model_path: Đường dẫn đến file mô hình YOLO
+            source: Nguồn video (0 = webcam, hoặc đường dẫn file)
+            save_path: Đường dẫn lưu video đã xử lý (None = không lưu)
+            custom_labels: Các nhãn cần phát hiện, phân cách bởi dấu phẩy
+            conf_threshold: Ngưỡng độ tin cậy (0.0 - 1.0)
+            loop: Có lặp lại video không (True = lặp, False = chạy một lần)
+            snapshot_dir: Thư mục lưu ảnh chụp (None = thư mục data)
+        """
+        self.model_path = model_path
+        self.source = source
+        self.save_path = save_path
+        self.custom_labels = custom_labels
+        self.conf_threshold = conf_threshold
+        self.loop = loop  # Điều khiển hành vi lặp lại
+        self.snapshot_dir = snapshot_dir or DATA_DIR
+        self.on_frame = on_frame
+        self.on_detection = on_detection
+        self.on_snapshots = on_snapshots
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.model = None
+        self.paused = False
+        self._stop_requested = False
+        self._state = threading.Condition()  # Bảo vệ paused/_stop_requested, đánh thức vòng lặp đang tạm dừng
+        self.out = None
+        self.snapshot_writer = get_snapshot_writer()  # Ghi ảnh trong thread nền
+        self._pending_writes = {}  # filepath -> Future của lần ghi ảnh
+        self._pending_emits = []  # Future hoàn thành sau khi callback của _emit_after_write đã chạy
+        self.incident_clip_range = None  # (start, end) giây của sự cố cuối cùng, để cắt clip bằng chứng
+
+    @property
+    def running(self):
+        return not self._stop_requested
+
+    def pause(self):
+        """
+        Chuyển đổi giữa tạm dừng và tiếp tục
+        Trả về trạng thái mới (True = đang tạm dừng)
+        """
+        with self._state:
+            self.paused = not self.paused
+            self._state.notify_all()
+            return self.paused
+
+    def _wait_if_paused(self):
+        """
+        Chặn vòng lặp khi đang tạm dừng (không tốn CPU) cho đến khi tiếp tục hoặc bị dừng
+
+        Returns:
+            True nếu được chạy tiếp, False nếu đã có yêu cầu dừng
+        """
+        with self._state:
+            while self.paused and not self._stop_requested:
+                self._state.wait()
+            return not self._stop_requested
+
+    def run(self):
+        """
+        Chạy phát hiện đến hết video (hoặc đến khi bị dừng)
+        Mượn mô hình YOLO từ cache dùng chung (chỉ tải lần đầu), trả lại khi xử lý xong
+
+        Returns:
+            dict kết quả (giống on_finished) hoặc None nếu không tải được mô hình / không mở được video
+        """
+        # 1. Lấy mô hình YOLO (tracker đã được reset cho file mới)
+        try:
+            self.model = get_model_cache().acquire(self.model_path)
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            return None
+        try:
+            if self._stop_requested:  # Bị dừng trong lúc tải mô hình
+                return None
+            return self._detect()
+        finally:
+            get_model_cache().release(self.model)
+            self.model = None
+
+    def _detect(self):
+        """
+        Xử lý video frame-by-frame, phát hiện sự cố và chụp ảnh
+        """
+        # Phân tích các nhãn cần phát hiện từ chuỗi custom_labels
+        target_labels = [l.strip().lower() for l in self.custom_labels.split(',') if l.strip()]
+
+        # 2. Mở nguồn video (webcam hoặc file)
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            print("Cannot open video source")
+            return None
+
+        # --- CẤU HÌNH THỜI GIAN ĐỘNG ---
+        # Lấy thông tin FPS và tổng số frame của video
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Nếu không có FPS hoặc FPS = 0, dùng giá trị mặc định
+        if video_fps == 0 or np.isnan(video_fps): 
+            video_fps = 30  # Giá trị dự phòng
+        
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        
+        # --- Tính toán kích thước resize trước ---
+        # Giảm kích thước frame lớn để tăng tốc độ xử lý
+        target_width = width
+        target_height = height
+        if width > 640:
+            scale = 640 / width
+            target_width = 640
+            target_height = int(height * scale)
+
+        # Thiết lập Video Writer để lưu video đã xử lý
+        if self.save_path:
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            self.out = cv2.VideoWriter(self.save_path, fourcc, video_fps, (target_width, target_height))
+        
+        # Cấu hình thời gian chụp ảnh (khớp với server.py)
+        BEFORE_SECONDS = 4.0  # Chụp ảnh "trước" cách 4 giây
+        AFTER_SECONDS = 5.0   # Chụp ảnh "sau" cách 5 giây
+        
+        # Tính toán kích thước buffer và số frame cần thiết
+        BUFFER_SIZE = int(video_fps * BEFORE_SECONDS)  # Buffer chứa 4 giây frame
+        AFTER_FRAMES_REQUIRED = int(video_fps * AFTER_SECONDS)  # Số frame cần đợi để chụp "sau"
+        
+        SKIP_FRAMES = 3  # Xử lý mỗi frame thứ 3 để tăng tốc (khớp với server)
+        
+        # Fallback cần ít nhất 4 frame liên tiếp (~0.13s) để không bắt nhầm nhiễu
+        MIN_FALLBACK_STREAK = 4
+
+        
+        # Buffer lưu trữ các frame gần đây (dùng deque để tự động xóa frame cũ)
+        frame_buffer = deque(maxlen=BUFFER_SIZE)
+        
+        # Các biến trạng thái
+        snapshot_state = "IDLE"  # Trạng thái: IDLE, WAITING_FOR_AFTER
+        frames_since_incident = 0  # Số frame đã trôi qua kể từ khi phát hiện sự cố
+        current_incident_label = ""  # Nhãn của sự cố hiện tại
+        current_sequence_id = 0  # ID của chuỗi ảnh chụp hiện tại
+        last_alert_time = 0  # Thời gian cảnh báo cuối cùng
+        alert_cooldown = 30  # Thời gian chờ giữa các cảnh báo (giây)
+        current_accident_streak = 0  # Đếm số frame liên tiếp phát hiện sự cố
+        
+        # Theo dõi dự phòng (fallback) - lưu phát hiện tốt nhất nếu không có sự cố kéo dài
+        best_fallback_conf = 0.0  # Độ tin cậy tốt nhất
+        best_fallback_data = None  # (label, frame_before, frame_during)
+        best_fallback_time = 0.0  # Thời điểm (giây) của phát hiện dự phòng
+        
+        frame_count = 0  # Đếm số frame đã xử lý
+        last_boxes = []  # Lưu kết quả detection của frame trước để tái sử dụng
+        
+        # Logic chống nhấp nháy (Anti-Flicker)
+        # Cho phép một số frame không phát hiện mà không reset streak
+        missing_frame_tolerance_count = 0
+        MAX_MISSING_FRAMES = 5  # Cho phép 5 frame (khoảng 0.15s) không phát hiện
+        
+        # Lưu frame khi sự cố bắt đầu
+        potential_incident_frame = None
+        
+        # Theo dõi sự cố cuối cùng để tạo báo cáo cuối
+        final_snapshots = []
+        final_incident_id = None
+
+        print(f"Video Info: FPS={video_fps}, Buffer Size={BUFFER_SIZE}, After Frames={AFTER_FRAMES_REQUIRED}")
+
+        # 3. VÒNG LẶP CHÍNH
+        # Yêu cầu dừng được kiểm tra giữa các bước (trước khi đọc frame, trước khi chạy AI):
+        # dừng chậm nhất sau một lần đọc frame hoặc một lần suy luận
+        started_at = time.time()
+        while cap.isOpened():
+            # --- LOGIC TẠM DỪNG ---
+            if not self._wait_if_paused():
+                break
+                
+            # --- LOGIC LẶP LẠI & ĐỌC FRAME ---
+            ret, frame = cap.read()
+            
+            # Tự động lặp lại nếu video kết thúc VÀ chế độ lặp BẬT
+            if not ret:
+                if self.loop:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    ret, frame = cap.read()
+                    if not ret: break 
+                else:
+                    # Chế độ không lặp: Chỉ dừng lại
+                    print("End of video stream (No Loop).")
+                    break
+            
+            # --- TỐI ƯU HÓA (Resize để tăng tốc) ---
+            # Giảm kích thước frame lớn xuống tối đa 640px chiều rộng để cải thiện FPS
+            h, w = frame.shape[:2]
+            if w > 640:
+                scale = 640 / w
+                new_w, new_h = 640, int(h * scale)
+                frame = cv2.resize(frame, (new_w, new_h))
+
+            last_valid_frame = frame.copy()  # Lưu frame hợp lệ cuối cùng
+            frame_buffer.append(frame.copy())  # Thêm vào buffer
+            frame_count += 1
+            annotated_frame = frame.copy()  # Frame để vẽ annotation
+            
+            # Báo tiến độ (việc lặp làm phức tạp, nhưng có thể wrap)
+            if total_frames > 0:
+                # Wrap tiến độ 0-100% mỗi lần lặp
+                current_loop_frame = frame_count % total_frames
+                progress = int((current_loop_frame / total_frames) * 100)
+                self._notify(self.on_progress, progress)
+
+            if self._stop_requested:
+                break
+
+            # --- A. PHÁT HIỆN ---
+            # Logic bỏ qua frame (Server dùng % 3)
+            if frame_count % 3 == 0:
+                # Chạy YOLO để phát hiện và theo dõi đối tượng
+                results = self.model.track(frame, persist=True, verbose=False, conf=self.conf_threshold)
+
+                
+                last_boxes = []  # Reset danh sách box để lưu kết quả mới
+                
+                current_time = time.time()
+                is_incident_now = False
+                detected_label = ""
+                detected_conf = 0.0
+
+                # Duyệt qua tất cả kết quả phát hiện để tìm label tốt nhất trong frame này
+                for result in results:
+                    for box in result.boxes:
+                        x1, y1, x2, y2 = map(int, box.xyxy[0])  # Tọa độ bounding box
+                        cls_id = int(box.cls[0])  # ID lớp
+                        label = self.model.names[cls_id]  # Tên lớp
+                        conf = float(box.conf[0])  # Độ tin cậy
+                        
+                        last_boxes.append((x1, y1, x2, y2, label, conf))
+                        
+                        # Kiểm tra xem label có trong danh sách cần phát hiện không
+                        if label.lower() in target_labels:
+                            # Ưu tiên label có độ tin cậy cao nhất trong frame hiện tại
+                            if conf > detected_conf:
+                                detected_label = label
+                                detected_conf = conf
+
+                # --- LOGIC XÁC NHẬN (Kiểm tra độ bền vững) ---
+                # Cần phát hiện liên tiếp trong một khoảng thời gian để xác nhận sự cố
+                ACCIDENT_DURATION_THRESHOLD = 0.5  # Cần 0.5 giây để xác thực
+                CONFIRMATION_FRAMES = int(video_fps * ACCIDENT_DURATION_THRESHOLD)
+                
+                if detected_label:
+                    # Có phát hiện sự cố trong frame này
+                    current_accident_streak += 1  # Tăng streak
+                    missing_frame_tolerance_count = 0  # Reset tolerance khi phát hiện
+                    
+                    # --- LOGIC FALLBACK MỚI (Mini-Streak) ---
+                    # Chỉ cập nhật Fallback khi Streak đã đạt ngưỡng tối thiểu
+                    # Điều này loại bỏ hoàn toàn các pha nhấp nháy 1-3 frame
+                    if current_accident_streak >= MIN_FALLBACK_STREAK:
+                        if detected_conf > best_fallback_conf:
+                            best_fallback_conf = detected_conf
+                            
+                            # Logic tua ngược để lấy ảnh cho fallback
+                            fb_before = frame_buffer[0].copy() if frame_buffer else frame.copy()
+                            
+                            # Tua ngược khoảng 0.5s cho frame During của fallback
+                            fb_rewind = int(video_fps * 0.5)
+                            if len(frame_buffer) > fb_rewind:
+                                fb_during = frame_buffer[-fb_rewind].copy()
+                            else:
+                                fb_during = frame.copy()
+                                
+                            best_fallback_data = (detected_label, fb_before, fb_during)
+                            best_fallback_time = frame_count / video_fps
+                    
+                    # Chụp khoảnh khắc chính xác khi sự cố BẮT ĐẦU (Streak == 1)
+                    if current_accident_streak == 1:
+                        # BÙ ĐẮP CHO ĐỘ TRỄ CỦA AI
+                        # AI phát hiện mất vài frame, người dùng cảm thấy nó "muộn"
+                        # Lấy frame từ ~0.3 giây TRƯỚC từ buffer để lấy "Khoảnh khắc va chạm"
+                        rewind_frames = int(video_fps * 0.3)  # Tua ngược 0.3 giây
+                        if len(frame_buffer) > rewind_frames:
+                            potential_incident_frame = frame_buffer[-rewind_frames].copy()
+                        elif frame_buffer:
+                            potential_incident_frame = frame_buffer[0].copy()
+                        else:
+                            potential_incident_frame = frame.copy()
+                        
+                else:
+                    # KHÔNG có phát hiện trong frame này
+                    # CHỐNG NHẤP NHÁY: Không reset ngay lập tức
+                    if current_accident_streak > 0 and missing_frame_tolerance_count < MAX_MISSING_FRAMES:
+                        missing_frame_tolerance_count += 1
+                        # Duy trì streak (không tăng, không reset)
+                    else:
+                        # Reset streak nếu đã vượt quá tolerance
+                        current_accident_streak = 0
+                        potential_incident_frame = None
+                        missing_frame_tolerance_count = 0
+
+                # --- KÍCH HOẠT SỰ KIỆN ---
+                # Điều kiện để bắt đầu chụp ảnh:
+                # 1. Đang ở trạng thái IDLE (chưa chụp)
+                # 2. Đã qua thời gian cooldown giữa các cảnh báo
+                # 3. Streak đã đạt ngưỡng xác nhận
+                if snapshot_state == "IDLE" and \
+                   (current_time - last_alert_time > alert_cooldown) and \
+                   current_accident_streak >= CONFIRMATION_FRAMES:
+                    
+                    is_incident_now = True
+                    
+                    # Logic tua ngược để lấy frame "During" tốt hơn
+                    SECONDS_TO_REWIND = 1.0  # Tua ngược 1 giây
+                    frames_back = int(video_fps * SECONDS_TO_REWIND)
+                    
+                    # Lấy frame từ buffer (ưu tiên frame cũ hơn để bắt khoảnh khắc va chạm)
+                    if len(frame_buffer) > frames_back:
+                        snap_frame = frame_buffer[-frames_back].copy()  # Lấy ảnh từ 1 giây trước
+                        print(f"📸 Captured frame from {SECONDS_TO_REWIND}s ago!")
+                    elif frame_buffer:
+                        snap_frame = frame_buffer[0].copy()  # Lấy ảnh cũ nhất có thể
+                    else:
+                        snap_frame = frame.copy()  # Bất đắc dĩ mới lấy ảnh hiện tại
+
+                    # Cập nhật các biến trạng thái
+                    last_alert_time = current_time
+                    current_sequence_id = next_sequence_id()  # ID duy nhất cho chuỗi ảnh này
+                    final_incident_id = current_sequence_id
+                    current_incident_label = detected_label
+                    frames_since_incident = 0
+                    # Clip bằng chứng: từ ảnh "trước" (đầu buffer) đến ảnh "sau"
+                    self.incident_clip_range = (max(0.0, (frame_count - len(frame_buffer)) / video_fps),
+                                                (frame_count + AFTER_FRAMES_REQUIRED) / video_fps)
+
+                    # --- LƯU ẢNH ---
+                    if self.loop:
+                         # Chế độ Live: Lưu Before và During ngay
+                         # 1. Before: Lấy từ đầu buffer (frame cũ nhất)
+                         frame_before = frame_buffer[0] if frame_buffer else frame
+                         path_before = self.save_image(frame_before, current_sequence_id, detected_label, "1_before")
+
+                         # 2. During: Lưu frame đã tua ngược (khoảnh khắc va chạm)
+                         path_during = self.save_image(snap_frame, current_sequence_id, detected_label, "2_during")
+                        
+                         current_snapshot_paths = [path_before, path_during, None]
+                         final_snapshots = current_snapshot_paths
+                        
+                         # Báo để UI cập nhật
+                         self._emit_after_write(self.on_snapshots, *current_snapshot_paths)
+                        
+                         snapshot_state = "WAITING_FOR_AFTER"  # Chuyển sang chờ ảnh "After"
+                        
+                    else:
+                        # Chế độ Analyst (không lặp)
+                        snapshot_state = "WAITING_FOR_AFTER"
+                        
+                        # 1. Before: Lấy ảnh cũ nhất trong buffer (cách đây 4s)
+                        frame_before = frame_buffer[0] if frame_buffer else frame
+                        path_before = self.save_image(frame_before, current_sequence_id, detected_label, "1_before")
+                        
+                        # 2. During: Lấy frame đã tua ngược
+                        path_during = self.save_image(snap_frame, current_sequence_id, detected_label, "2_during")
+                        
+                        current_snapshot_paths = [path_before, path_during, None]
+                        final_snapshots = current_snapshot_paths 
+                        
+                        # Báo phát hiện
+                        self._emit_after_write(self.on_detection, detected_label, path_during)
+
+            # --- B. VẼ BOXES & TIMESTAMP ---
+            # Thêm timestamp vào frame (theo style của server)
+            time_str = str(time.strftime("%H:%M:%S", time.gmtime(frame_count / video_fps)))
+            # Vẽ outline đen trước, sau đó vẽ text vàng để dễ đọc
+            cv2.putText(annotated_frame, f"Time: {time_str}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 4)
+            cv2.putText(annotated_frame, f"Time: {time_str}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+
+            # Vẽ các bounding box và nhãn
+            for (x1, y1, x2, y2, label, conf) in last_boxes:
+                # Màu đỏ cho sự cố, màu xanh cho đối tượng khác
+                color = (0, 0, 255) if label.lower() in target_labels else (0, 255, 0)
+                # Vẽ hình chữ nhật
+                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+                
+                # Vẽ nhãn với nền
+                text = f"{label} {conf:.2f}"
+                (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+                cv2.rectangle(annotated_frame, (x1, y1 - 20), (x1 + w, y1), color, -1)
+                cv2.putText(annotated_frame, text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+            
+            # --- THANH DEBUG ---
+            # Hiển thị thanh tiến độ xác nhận khi đang xác nhận sự cố
+            if current_accident_streak > 0 and snapshot_state == "IDLE":
+                bar_width = min(int((current_accident_streak / CONFIRMATION_FRAMES) * 100), 100)
+                cv2.rectangle(annotated_frame, (10, 10), (10 + bar_width, 20), (0, 0, 255), -1)
+
+            # --- C. CẬP NHẬT STATE MACHINE ---
+            # Xử lý logic chờ chụp ảnh "After"
+            if snapshot_state == "WAITING_FOR_AFTER":
+                frames_since_incident += 1
+                if frames_since_incident >= AFTER_FRAMES_REQUIRED:
+                    # 3. Lưu ảnh AFTER (sau khi đã đợi đủ số frame)
+                    path_after = self.save_image(frame, current_sequence_id, current_incident_label, "3_after")
+                    print("Sequence capture complete.")
+                    
+                    if 'current_snapshot_paths' in locals():
+                        current_snapshot_paths[2] = path_after
+                        self._emit_after_write(self.on_snapshots, *current_snapshot_paths)
+                        final_snapshots = current_snapshot_paths 
+
+                    snapshot_state = "IDLE"  # Quay về trạng thái chờ
+
+            # --- D. ĐẦU RA ---
+            # Phát frame đã vẽ để UI hiển thị
+            self._notify(self.on_frame, annotated_frame)
+            # Ghi vào video nếu có
+            if self.out:
+                self.out.write(annotated_frame)
+
+        # Dọn dẹp
+        print("Stopping detection thread...")
+        elapsed = time.time() - started_at
+        cap.release()
+        if self.out:
+            self.out.release()
+            
+        # BẮT BUỘC HOÀN THÀNH SNAPSHOT NẾU ĐANG CHỜ
+        # Nếu video kết thúc trước khi chụp được ảnh "After"
+        if snapshot_state == "WAITING_FOR_AFTER" and 'current_snapshot_paths' in locals():
+            print("Video ended before 'After' frame. Saving last frame as 'After'.")
+            frame_after = last_valid_frame if last_valid_frame is not None else frame
+            if frame_after is not None:
+                path_after = self.save_image(frame_after, current_sequence_id, current_incident_label, "3_after")
+                current_snapshot_paths[2] = path_after
+                final_snapshots = current_snapshot_paths
+        
+        # --- LOGIC DỰ PHÒNG MỚI ---
+        # Nếu không có snapshot nào được tạo, nhưng có phát hiện gì đó
+        # Dùng dữ liệu dự phòng tốt nhất để tạo snapshot
+        # (Bỏ qua khi bị hủy: kết thúc nhanh, không tạo cảnh báo cho phiên đã hủy)
+        cancelled = self._stop_requested
+        if not cancelled and not final_snapshots and best_fallback_data is not None:
+            print(f"⚠️ No prolonged incident confirmed. Using FALLBACK snapshot (Best Conf: {best_fallback_conf:.2f})")
+            fb_label, fb_before, fb_during = best_fallback_data
+            fb_seq_id = next_sequence_id()
+            
+            p1 = self.save_image(fb_before, fb_seq_id, fb_label, "1_before")
+            p2 = self.save_image(fb_during, fb_seq_id, fb_label, "2_during")
+            # Dùng frame cuối làm 'After'
+            last_frame = last_valid_frame if last_valid_frame is not None else fb_during
+            p3 = self.save_image(last_frame, fb_seq_id, fb_label, "3_after")
+            
+            final_snapshots = [p1, p2, p3]
+            final_incident_id = fb_seq_id
+            self.incident_clip_range = (max(0.0, best_fallback_time - BEFORE_SECONDS), best_fallback_time + AFTER_SECONDS)
+            
+            # Báo để UI cập nhật
+            self._emit_after_write(self.on_detection, fb_label, p2)
+
+        # Chờ mọi ảnh được ghi xong và mọi on_snapshots/on_detection đã được gọi trước khi báo hoàn thành
+        # (bên nhận sẽ upload chúng; callback chạy sau Future ghi ảnh nên phải chờ riêng)
+        wait_futures(list(self._pending_writes.values()) + self._pending_emits)
+        self._pending_writes.clear()
+        self._pending_emits.clear()
+        
+        # Báo hoàn thành (cho chế độ analyst)
+        result = {
+            'success': True,
+            'output_path': self.save_path,
+            'snapshots': final_snapshots,
+            'clip_range': self.incident_clip_range,
+            'incident_id': str(final_incident_id) if final_incident_id else str(int(time.time())),
+            'frames': frame_count,  # Số frame đã xử lý và thời gian vòng lặp (để tính tốc độ)
+            'seconds': round(elapsed, 3),
+            'cancelled': cancelled
+        }
+        if not cancelled:
+            self._notify(self.on_finished, result)
+        return result
+            
+    def stop(self):
+        """
+        Gửi tín hiệu dừng vòng lặp xử lý (không chờ), đánh thức vòng lặp nếu đang tạm dừng
+        Phiên bị dừng không gọi on_finished
+        """
+        with self._state:
+            self._stop_requested = True
+            self._state.notify_all()
+
+    def save_image(self, frame, seq_id, label, suffix):
+        """
+        Lưu ảnh vào thư mục data
+        
+        Args:
+            frame: Frame cần lưu
+            seq_id: ID của chuỗi ảnh
+            label: Nhãn của sự cố
+            suffix: Hậu tố (1_before, 2_during, 3_after)
+        
+        Returns:
+            Đường dẫn file đã lưu
+        """
+        if not os.path.exists(self.snapshot_dir):
+            os.makedirs(self.snapshot_dir)
+        
+        filename = f"{seq_id}_{label}_{suffix}.jpg"
+        filepath = os.path.join(self.snapshot_dir, filename)
+        # Ghi nền: trả về đường dẫn ngay, file sẽ tồn tại khi Future hoàn thành
+        self._pending_writes[filepath] = self.snapshot_writer.submit(frame, filepath)
+        return filepath
+
+    def _emit_after_write(self, callback, *args):
+        """
+        Gọi callback khi các ảnh được nhắc đến trong args đã ghi xong
+        Tránh để UI mở một file ảnh chưa tồn tại
+        Future trong _pending_emits hoàn thành khi callback đã chạy xong (để chờ trước on_finished)
+        """
+        if callback is None:
+            return
+        futures = [self._pending_writes.get(a) for a in args if isinstance(a, str)]
+        emitted = Future()
+
+        def _emit():
+            try:
+                callback(*args)
+            finally:
+                emitted.set_result(None)
+
+        self._pending_emits.append(emitted)
+        when_written(futures, _emit)
+
+    @staticmethod
+    def _notify(callback, *args):
+        if callback is not None:
+            callback(*args)
\ No newline at end of file
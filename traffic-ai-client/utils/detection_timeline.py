@@ -0,0 +1,150 @@
+from array import array
+
+
+class DetectionTimeline:
+    """
+    Dòng thời gian phát hiện nén theo đoạn (run-length)
+    Các frame liên tiếp có cùng nhãn được gộp thành một đoạn (start, end, label, max/mean conf)
+    thay vì một dict cho mỗi frame: cảnh tai nạn 10 phút chỉ còn vài đoạn.
+
+    Dữ liệu lưu trong các mảng song song (array), nhãn lưu một lần trong bảng `labels`.
+    """
+
+    def __init__(self, max_gap=0):
+        """
+        Args:
+            max_gap: Số frame trống tối đa giữa hai phát hiện vẫn được coi là cùng một đoạn
+        """
+        self.max_gap = max_gap
+        self.labels = []          # Bảng nhãn, các đoạn tham chiếu bằng chỉ số
+        self._label_index = {}
+        self.start_frame = array('l')
+        self.end_frame = array('l')
+        self.start_time = array('d')
+        self.end_time = array('d')
+        self.label = array('H')
+        self.max_conf = array('f')
+        self._conf_sum = array('d')
+        self._count = array('l')
+
+    def __len__(self):
+        return len(self.label)
+
+    def add(self, frame, time, label, conf):
+        """
+        Thêm một frame có phát hiện
+
+        Returns:
+            Đoạn vừa kết thúc (dict) nếu frame này mở đoạn mới, ngược lại None
+        """
+        idx = self._label_index.get(label)
+        if idx is None:
+            idx = self._label_index[label] = len(self.labels)
+            self.labels.append(label)
+
+        if self.label and self.label[-1] == idx and frame - self.end_frame[-1] <= self.max_gap + 1:
+            self.end_frame[-1] = frame
+            self.end_time[-1] = time
+            self._conf_sum[-1] += conf
+            self._count[-1] += 1
+            if conf > self.max_conf[-1]:
+                self.max_conf[-1] = conf
+            return None
+
+        closed = self.segment(-1) if self.label else None
+        self.start_frame.append(frame)
+        self.end_frame.append(frame)
+        self.start_time.append(time)
+        self.end_time.append(time)
+        self.label.append(idx)
+        self.max_conf.append(conf)
+        self._conf_sum.append(conf)
+        self._count.append(1)
+        return closed
+
+    def extend(self, other):
+        """
+        Nối dòng thời gian của đoạn video tiếp theo (xử lý song song theo đoạn)
+        Đoạn đầu của `other` được gộp vào đoạn cuối nếu liền mạch qua ranh giới.
+        """
+        for i in range(len(other)):
+            label = other.labels[other.label[i]]
+            idx = self._label_index.get(label)
+            if (i == 0 and idx is not None and self.label and self.label[-1] == idx
+                    and other.start_frame[0] - self.end_frame[-1] <= self.max_gap + 1):
+                self.end_frame[-1] = other.end_frame[0]
+                self.end_time[-1] = other.end_time[0]
+                self._conf_sum[-1] += other._conf_sum[0]
+                self._count[-1] += other._count[0]
+                self.max_conf[-1] = max(self.max_conf[-1], other.max_conf[0])
+                continue
+            if idx is None:
+                idx = self._label_index[label] = len(self.labels)
+                self.labels.append(label)
+            self.start_frame.append(other.start_frame[i])
+            self.end_frame.append(other.end_frame[i])
+            self.start_time.append(other.start_time[i])
+            self.end_time.append(other.end_time[i])
+            self.label.append(idx)
+            self.max_conf.append(other.max_conf[i])
+            self._conf_sum.append(other._conf_sum[i])
+            self._count.append(other._count[i])
+
+    def segment(self, i):
+        """Đoạn thứ i dưới dạng dict"""
+        return {
+            "start": round(self.start_time[i], 3),
+            "end": round(self.end_time[i], 3),
+            "label": self.labels[self.label[i]],
+            "maxConf": round(self.max_conf[i], 3),
+            "meanConf": round(self._conf_sum[i] / self._count[i], 3),
+            "frames": self._count[i],
+        }
+
+    def segments(self):
+        return [self.segment(i) for i in range(len(self))]
+
+    def to_state(self):
+        """Trạng thái đầy đủ (kể cả số frame, tổng conf) để lưu checkpoint và khôi phục chính xác"""
+        return {
+            "maxGap": self.max_gap,
+            "labels": list(self.labels),
+            "startFrame": list(self.start_frame),
+            "endFrame": list(self.end_frame),
+            "startTime": list(self.start_time),
+            "endTime": list(self.end_time),
+            "label": list(self.label),
+            "maxConf": list(self.max_conf),
+            "confSum": list(self._conf_sum),
+            "count": list(self._count),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        timeline = cls(state.get("maxGap", 0))
+        timeline.labels = list(state["labels"])
+        timeline._label_index = {label: i for i, label in enumerate(timeline.labels)}
+        timeline.start_frame.extend(state["startFrame"])
+        timeline.end_frame.extend(state["endFrame"])
+        timeline.start_time.extend(state["startTime"])
+        timeline.end_time.extend(state["endTime"])
+        timeline.label.extend(state["label"])
+        timeline.max_conf.extend(state["maxConf"])
+        timeline._conf_sum.extend(state["confSum"])
+        timeline._count.extend(state["count"])
+        return timeline
+
+    def to_dict(self):
+        """
+        Dạng cột gọn để ghi JSON: mỗi trường là một danh sách, `label` là chỉ số trong `labels`
+        """
+        n = len(self)
+        return {
+            "labels": list(self.labels),
+            "start": [round(t, 3) for t in self.start_time],
+            "end": [round(t, 3) for t in self.end_time],
+            "label": list(self.label),
+            "maxConf": [round(c, 3) for c in self.max_conf],
+            "meanConf": [round(self._conf_sum[i] / self._count[i], 3) for i in range(n)],
+            "frames": list(self._count),
+        }
@@ -0,0 +1,31 @@
+import cv2
+import datetime
+
+
+def draw_styled_box(img, x1, y1, x2, y2, label, conf, color):
+    """
+    Vẽ bounding box có style đẹp với nhãn và độ tin cậy
+    """
+    # Vẽ hình chữ nhật
+    cv2.rectangle(img, (x1, y1), (x2, y2), color, 3)
+    
+    # Vẽ nhãn có nền để dễ đọc
+    text = f"{label} {conf:.2f}"
+    font_scale = 0.8
+    thickness = 2
+    (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    
+    # Vẽ nền cho text
+    cv2.rectangle(img, (x1, y1 - 25), (x1 + w, y1), color, -1)
+    # Vẽ text màu trắng
+    cv2.putText(img, text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
+
+
+def add_timestamp(img, seconds):
+    """
+    Thêm timestamp vào frame
+    Vẽ outline đen trước, sau đó vẽ text vàng để dễ đọc
+    """
+    time_str = str(datetime.timedelta(seconds=int(seconds)))
+    cv2.putText(img, f"Time: {time_str}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 4)  # Outline đen
+    cv2.putText(img, f"Time: {time_str}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)  # Text vàng
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+import time
+
+
+class JobEventLog:
+    """
+    Nhật ký sự kiện của job dạng JSON Lines (mỗi dòng một object), chỉ ghi nối tiếp
+    Kết quả xuất hiện trên đĩa ngay khi job đang chạy thay vì chỉ có ở cuối job,
+    và không cần giữ toàn bộ danh sách phát hiện trong bộ nhớ.
+
+    Mỗi dòng: {"t": <unix time>, "event": <loại>, ...dữ liệu}
+    """
+
+    def __init__(self, path, append=False, truncate_at=None):
+        """
+        Args:
+            path: File .jsonl (ghi đè nếu đã tồn tại)
+            append: Ghi tiếp vào file cũ (job được tiếp tục từ checkpoint)
+            truncate_at: Khi append: cắt file về vị trí byte này trước (offset() lúc lưu checkpoint),
+                bỏ các sự kiện ghi sau checkpoint để job chạy lại không ghi chúng hai lần
+        """
+        self.path = path
+        if append and truncate_at is not None and os.path.exists(path):
+            with open(path, 'r+b') as f:
+                f.truncate(truncate_at)
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def append(self, event, **data):
+        line = json.dumps({"t": round(time.time(), 3), "event": event, **data},
+                          default=str, separators=(',', ':'))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()  # Mỗi dòng ghi xong là đọc được ngay qua /results
+
+    def offset(self):
+        """Kích thước file hiện tại (byte) = vị trí sau sự kiện cuối cùng đã ghi"""
+        with self._lock:
+            return self._file.tell() if self._file is not None else os.path.getsize(self.path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_events(path, offset=0, max_events=1000):
+    """
+    Đọc các sự kiện đã ghi từ vị trí byte `offset` (để client đọc tiếp phần mới)
+    Dòng cuối chưa ghi xong (không có '\\n') được bỏ qua, lần đọc sau sẽ lấy lại.
+    Log bị cắt về checkpoint khi job chạy tiếp: offset cũ không còn ở đầu một dòng thì được dời
+    tới đầu dòng kế tiếp (hoặc cuối file) thay vì đọc dòng dở.
+
+    Returns:
+        (danh sách sự kiện, offset cho lần đọc tiếp theo)
+    """
+    events = []
+    if not os.path.exists(path):
+        return events, offset
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        if offset > size:
+            offset = size
+        if offset > 0:
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                skipped = f.readline()  # Phần còn lại của dòng đang dở
+                if not skipped.endswith(b"\n"):
+                    return events, offset  # Chưa có dòng kế tiếp hoàn chỉnh
+                offset += len(skipped)
+        f.seek(offset)
+        while len(events) < max_events:
+            line = f.readline()
+            if not line or not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            events.append(json.loads(line))
+    return events, offset
+
+
+def write_json_atomic(path, data):
+    """Ghi JSON gọn (không indent) qua file tạm rồi đổi tên: người đọc không bao giờ thấy file dở"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, default=str, separators=(',', ':'))
+    os.replace(tmp_path, path)
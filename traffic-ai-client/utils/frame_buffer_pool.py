@@ -0,0 +1,60 @@
+import threading
+
+import numpy as np
+
+
+class FrameBufferPool:
+    """
+    Bộ đệm frame cấp phát sẵn cho khung xem trực tiếp (không cấp phát mảng mới mỗi frame)
+
+    - Thread phát hiện acquire() một bộ đệm, resize frame thẳng vào đó rồi gửi sang UI
+    - Thread GUI release() sau khi đã tải lên QPixmap -> bộ đệm được dùng lại
+    - Hết bộ đệm rảnh (GUI chưa kịp hiển thị) thì acquire() trả về None: frame đó bị bỏ,
+      không bao giờ ghi đè bộ đệm UI đang đọc
+    - Đổi kích thước (cửa sổ resize) thì bộ đệm cũ bị bỏ khi được trả lại
+    """
+
+    def __init__(self, size=3):
+        """
+        Args:
+            size: Số bộ đệm tối đa đang lưu hành (đang chờ hoặc đang được UI hiển thị)
+        """
+        self.size = size
+        self._shape = None
+        self._free = []
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, height, width, channels=3):
+        """
+        Lấy một bộ đệm uint8 (height, width, channels), liên tục trong bộ nhớ
+
+        Returns:
+            numpy array hoặc None nếu mọi bộ đệm đều đang được dùng
+        """
+        shape = (height, width, channels)
+        with self._lock:
+            if shape != self._shape:
+                self._shape = shape
+                self._free = []
+            if self._free:
+                buffer = self._free.pop()
+            elif self._in_use < self.size:
+                buffer = np.empty(shape, dtype=np.uint8)
+            else:
+                return None
+            self._in_use += 1
+            return buffer
+
+    def release(self, buffer):
+        """Trả bộ đệm về pool (bộ đệm có kích thước cũ bị bỏ đi)"""
+        with self._lock:
+            self._in_use = max(0, self._in_use - 1)
+            if buffer.shape == self._shape and len(self._free) < self.size:
+                self._free.append(buffer)
+
+
+def fit_size(width, height, max_width, max_height):
+    """Kích thước (rộng, cao) lớn nhất vừa khung max_width x max_height mà vẫn giữ tỷ lệ"""
+    scale = min(max_width / width, max_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
@@ -0,0 +1,58 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Timeout (connect, read) theo từng loại endpoint của Java Backend (giây)
+# Upload báo cáo chờ lâu vì backend gọi Gemini trước khi trả lời
+DEFAULT_TIMEOUTS = {
+    "incident": (5, 30),    # POST /incidents (1 ảnh)
+    "report": (5, 120),     # POST /incidents/report (3 ảnh + video)
+    "history": (5, 10),     # GET /incidents
+    "upload": (5, 60),      # /uploads (mỗi chunk video)
+    "snapshot": (5, 10),    # GET ảnh snapshot (thumbnail) từ Python server
+}
+
+
+def get_timeout(endpoint):
+    """
+    Lấy timeout cho một loại endpoint
+    Có thể ghi đè bằng biến môi trường, ví dụ HTTP_TIMEOUT_REPORT=180 (read timeout)
+    """
+    connect, read = DEFAULT_TIMEOUTS.get(endpoint, (5, 30))
+    override = os.environ.get(f"HTTP_TIMEOUT_{endpoint.upper()}")
+    if override:
+        read = float(override)
+    return (connect, read)
+
+
+def create_session(pool_size=None):
+    """
+    Tạo requests.Session có connection pool (keep-alive)
+    Các request liên tiếp đến backend dùng lại kết nối TCP thay vì mở mới
+
+    Args:
+        pool_size: Số kết nối tối đa giữ trong pool (mặc định: HTTP_POOL_SIZE hoặc 10)
+    """
+    if pool_size is None:
+        pool_size = int(os.environ.get("HTTP_POOL_SIZE", 10))
+    session = requests.Session()
+    # pool_block=False: vượt quá pool thì vẫn mở kết nối tạm, không chặn caller
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_shared_session = None
+_shared_lock = threading.Lock()
+
+
+def get_http_session():
+    """Lấy Session dùng chung cho cả tiến trình (tạo khi dùng lần đầu)"""
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
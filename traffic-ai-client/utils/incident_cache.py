@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+
+from utils.event_log import write_json_atomic
+
+
+class IncidentCache:
+    """
+    Cache trên đĩa của lịch sử sự cố (metadata từ backend) cho tab History của desktop app
+
+    - Mở ứng dụng hiển thị ngay dữ liệu đã cache, không chờ backend
+    - Làm mới tăng dần: chỉ hỏi backend các sự cố có id > last_id (GET /incidents/page)
+    - Kiểm tra lại toàn bộ (replace): tải lại mọi trang từ id 0, cập nhật trạng thái đã đổi và bỏ
+      các sự cố backend không còn trả về; validated_at ghi lại lần kiểm tra gần nhất
+    - Ghi nguyên tử (file tạm + os.replace), an toàn khi gọi từ thread nền
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._incidents = {}  # id -> incident
+        self.validated_at = 0.0  # Thời điểm (time.time()) của lần kiểm tra lại toàn bộ gần nhất
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        """Id lớn nhất đã có trong cache (0 nếu rỗng)"""
+        with self._lock:
+            return max(self._incidents, default=0)
+
+    def load(self):
+        """
+        Đọc cache từ đĩa (file hỏng hoặc chưa có -> cache rỗng)
+
+        Returns:
+            Danh sách sự cố, mới nhất trước
+        """
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable history cache {self.path}: {e}")
+            data = {}
+        incidents = data.get("incidents", [])
+        with self._lock:
+            self._incidents = {int(i["id"]): i for i in incidents if i.get("id") is not None}
+            self.validated_at = float(data.get("validatedAt", 0))
+        return self.incidents()
+
+    def needs_revalidation(self, max_age):
+        """True nếu lần kiểm tra lại toàn bộ gần nhất đã quá max_age giây (hoặc chưa từng có)"""
+        return time.time() - self.validated_at > max_age
+
+    def incidents(self):
+        """Tất cả sự cố trong cache, mới nhất (id lớn nhất) trước"""
+        with self._lock:
+            return [self._incidents[k] for k in sorted(self._incidents, reverse=True)]
+
+    def merge(self, incidents):
+        """Thêm/cập nhật các sự cố vừa tải về và ghi cache xuống đĩa"""
+        with self._lock:
+            for incident in incidents:
+                if incident.get("id") is not None:
+                    self._incidents[int(incident["id"])] = incident
+            self._write()
+
+    def replace(self, incidents):
+        """
+        Thay toàn bộ cache bằng danh sách đầy đủ từ backend (sự cố đã bị xóa trên backend bị bỏ)
+
+        Returns:
+            Số sự cố bị bỏ khỏi cache
+        """
+        with self._lock:
+            fresh = {int(i["id"]): i for i in incidents if i.get("id") is not None}
+            removed = len(self._incidents.keys() - fresh.keys())
+            self._incidents = fresh
+            self.validated_at = time.time()
+            self._write()
+        return removed
+
+    def _write(self):
+        # Gọi khi đang giữ self._lock
+        snapshot = [self._incidents[k] for k in sorted(self._incidents)]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_json_atomic(self.path, {"validatedAt": self.validated_at, "incidents": snapshot})
+
+
+def fetch_new_incidents(api_client, cache, limit=100):
+    """
+    Tải một trang sự cố mới (id > cache.last_id) và lưu vào cache; chạy trong thread nền
+
+    Returns:
+        (danh sách sự cố mới, còn trang tiếp theo hay không), hoặc None nếu backend lỗi
+    """
+    page = api_client.get_incident_page(after_id=cache.last_id, limit=limit)
+    if page is None:
+        return None
+    if page:
+        cache.merge(page)
+    return page, len(page) >= limit
+
+
+def revalidate_incidents(api_client, cache, limit=100):
+    """
+    Tải lại toàn bộ lịch sử từ id 0 (theo trang) và thay cache; chạy trong thread nền
+    Trạng thái đã đổi trên backend được cập nhật, sự cố đã bị xóa được bỏ khỏi cache
+
+    Returns:
+        (mọi sự cố mới nhất trước, số sự cố bị bỏ), hoặc None nếu backend lỗi (cache giữ nguyên)
+    """
+    incidents = []
+    after_id = 0
+    while True:
+        page = api_client.get_incident_page(after_id=after_id, limit=limit)
+        if page is None:
+            return None
+        incidents.extend(page)
+        if len(page) < limit:
+            break
+        after_id = max(int(i["id"]) for i in page)
+    removed = cache.replace(incidents)
+    return cache.incidents(), removed
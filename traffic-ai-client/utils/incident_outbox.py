@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from utils.http_session import get_http_session, get_timeout
+
+
+class IncidentOutbox:
+    """
+    Hàng đợi gửi báo cáo sự cố (outbox) lưu trên đĩa, gửi bởi một thread nền
+
+    - enqueue() chỉ ghi một file JSON nhỏ rồi trả về ngay một Future
+      -> vòng lặp phát hiện không bao giờ chờ mạng
+    - Mỗi báo cáo có một idempotency key (gửi kèm header Idempotency-Key),
+      backend dựa vào đó để không tạo trùng sự cố khi gửi lại
+    - Lỗi mạng / 5xx / 408 / 429: thử lại với backoff tăng dần
+    - Lỗi 4xx khác hoặc hết số lần thử: chuyển file sang thư mục failed/
+    - Báo cáo còn trong outbox khi tiến trình dừng sẽ được gửi lại ở lần chạy sau
+    - Video (nếu có) được upload theo chunk trước; uploadId lưu trong entry nên lần thử sau
+      tiếp tục từ phần đã gửi thay vì upload lại từ đầu
+    - Clip đang được cắt (pending_video): báo cáo vẫn được ghi xuống đĩa ngay, chỉ chờ clip trước khi gửi;
+      tiến trình dừng khi clip chưa xong thì lần chạy sau gửi báo cáo không kèm clip
+    """
+
+    RETRYABLE_STATUS = (408, 429)
+
+    def __init__(self, directory, url, timeout=None, max_attempts=8, backoff_base=2.0, backoff_max=300.0, session=None, uploader=None):
+        """
+        Args:
+            directory: Thư mục lưu các báo cáo chờ gửi
+            url: Endpoint nhận báo cáo (POST multipart)
+            timeout: (connect, read) timeout cho mỗi lần gửi (mặc định: timeout endpoint "report")
+            max_attempts: Số lần gửi tối đa trước khi bỏ cuộc
+            backoff_base: Thời gian chờ sau lần thất bại đầu tiên (giây), nhân đôi mỗi lần
+            backoff_max: Thời gian chờ tối đa giữa hai lần thử (giây)
+            session: requests.Session dùng để gửi (mặc định: Session chung có connection pool)
+            uploader: ChunkedUploader để upload video theo chunk trước khi gửi báo cáo
+                      (None = đính kèm video vào request multipart như cũ)
+        """
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, "failed")
+        os.makedirs(self.failed_directory, exist_ok=True)
+        self.url = url
+        self.timeout = timeout or get_timeout("report")
+        self.session = session or get_http_session()
+        self.uploader = uploader
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._entries = {}  # id -> entry (bản sao trong bộ nhớ của file JSON)
+        self._futures = {}  # id -> Future (chỉ có với báo cáo tạo trong tiến trình này)
+        self._cond = threading.Condition()
+        self._load()
+
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="IncidentOutbox")
+        self._thread.start()
+
+    def enqueue(self, snapshot_paths, label, description=None, video_path=None, video_url=None, key=None,
+                pending_video=None):
+        """
+        Đưa một báo cáo vào outbox
+
+        Args:
+            snapshot_paths: Danh sách ảnh [trước, trong, sau] (phải đã nằm trên đĩa)
+            label: Loại sự cố
+            description: Mô tả (mặc định "Auto-detected <label>")
+            video_path: File video cần upload kèm (nếu có)
+            video_url: Đường dẫn video backend đã phục vụ được (tránh upload lại file)
+            key: Idempotency key cố định (ví dụ "<job_id>-<frame>"); cùng key đang chờ trong outbox
+                 thì không thêm lần nữa, đã gửi rồi thì backend bỏ qua bản trùng (mặc định: key ngẫu nhiên)
+            pending_video: Future(đường dẫn clip hoặc None) của clip đang cắt; báo cáo chờ clip rồi mới gửi
+                 (clip lỗi/None -> gửi với video_url)
+
+        Returns:
+            Future resolve với kết quả JSON từ backend, hoặc None nếu bỏ cuộc
+        """
+        if description is None:
+            description = f"Auto-detected {label}" if label != "No Accident" else "Video analyzed: No accident detected."
+        entry = {
+            "id": key or uuid.uuid4().hex,  # Cũng là idempotency key
+            "label": label,
+            "description": description,
+            "snapshots": list(snapshot_paths or []),
+            "video_path": video_path,
+            "video_url": video_url,
+            "attempts": 0,
+            "created": time.time(),
+            "next_attempt": 0,
+            "video_pending": pending_video is not None,
+        }
+        with self._cond:
+            if entry["id"] in self._entries:
+                # Cùng sự cố được đưa vào lại (job chạy tiếp từ checkpoint xử lý lại các frame sau checkpoint)
+                return self._futures.setdefault(entry["id"], Future())
+            future = Future()
+            self._save(entry)
+            self._entries[entry["id"]] = entry
+            self._futures[entry["id"]] = future
+            self._cond.notify_all()
+        if pending_video is not None:
+            pending_video.add_done_callback(lambda f: self._attach_video(entry["id"], f))
+        return future
+
+    def _attach_video(self, entry_id, clip_future):
+        """Clip đã cắt xong (hoặc lỗi): gắn vào báo cáo đang chờ và cho phép gửi"""
+        clip = None
+        if not clip_future.cancelled():
+            if clip_future.exception() is not None:
+                print(f"⚠️ Outbox: incident clip failed, reporting without it: {clip_future.exception()}")
+            else:
+                clip = clip_future.result()
+        with self._cond:
+            entry = self._entries.get(entry_id)
+            if entry is None or not entry.get("video_pending"):
+                return
+            if clip:
+                entry["video_path"] = clip
+                entry["video_url"] = None  # Upload clip thay vì chỉ gửi đường dẫn video gốc
+            entry["video_pending"] = False
+            self._save(entry)
+            self._cond.notify_all()
+
+    def pending_count(self):
+        """Số báo cáo chưa gửi được"""
+        with self._cond:
+            return len(self._entries)
+
+    # --- Lưu trữ ---
+
+    def _path(self, entry_id):
+        return os.path.join(self.directory, f"{entry_id}.json")
+
+    def _save(self, entry):
+        """Ghi nguyên tử (file tạm + os.replace)"""
+        path = self._path(entry["id"])
+        with open(path + ".part", "w") as f:
+            json.dump(entry, f)
+        os.replace(path + ".part", path)
+
+    def _load(self):
+        """Nạp lại các báo cáo chưa gửi từ lần chạy trước"""
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    entry = json.load(f)
+                entry["next_attempt"] = 0
+                if entry.get("video_pending"):
+                    entry["video_pending"] = False  # Clip bị bỏ dở khi tiến trình dừng: gửi không kèm clip
+                self._entries[entry["id"]] = entry
+            except Exception as e:
+                print(f"⚠️ Outbox: skipping unreadable entry {name}: {e}")
+        if self._entries:
+            print(f"Outbox: {len(self._entries)} pending report(s) from previous run")
+
+    def _finish(self, entry, result):
+        """Xóa báo cáo khỏi outbox và resolve Future"""
+        with self._cond:
+            self._entries.pop(entry["id"], None)
+            future = self._futures.pop(entry["id"], None)
+        if result is None:
+            try:
+                os.replace(self._path(entry["id"]), os.path.join(self.failed_directory, f"{entry['id']}.json"))
+            except OSError:
+                pass
+        else:
+            try:
+                os.remove(self._path(entry["id"]))
+            except OSError:
+                pass
+        if future is not None:
+            future.set_result(result)
+
+    # --- Gửi ---
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                now = time.time()
+                ready = [e for e in self._entries.values() if not e.get("video_pending")]  # Chưa có clip: chờ
+                due = [e for e in ready if e["next_attempt"] <= now]
+                if not due:
+                    wake = min((e["next_attempt"] for e in ready), default=now + 60)
+                    self._cond.wait(max(0.1, wake - now))
+                    continue
+                entry = min(due, key=lambda e: e["created"])  # Cũ nhất trước
+            self._attempt(entry)
+
+    def _attempt(self, entry):
+        entry["attempts"] += 1
+        try:
+            print(f"Uploading incident '{entry['label']}' to Backend (attempt {entry['attempts']})...")
+            response = self._post(entry)
+            if response.status_code in (200, 201):
+                result = response.json()
+                print("✅ Successfully reported to Backend. ID:", result.get('id'))
+                self._finish(entry, result)
+                return
+            if 400 <= response.status_code < 500 and response.status_code not in self.RETRYABLE_STATUS:
+                print(f"❌ Backend rejected report {entry['id']}: {response.status_code} - {response.text}")
+                self._finish(entry, None)
+                return
+            print(f"⚠️ Backend Report Failed: {response.status_code}")
+        except Exception as e:
+            print(f"⚠️ Error reporting to backend: {str(e)}")
+
+        if entry["attempts"] >= self.max_attempts:
+            print(f"❌ Giving up on report {entry['id']} after {entry['attempts']} attempts")
+            self._finish(entry, None)
+            return
+        delay = min(self.backoff_base * (2 ** (entry["attempts"] - 1)), self.backoff_max)
+        entry["next_attempt"] = time.time() + delay
+        with self._cond:
+            self._save(entry)
+
+    def _upload_video(self, entry):
+        """Upload video theo chunk (tiếp tục nếu đã có uploadId), lưu videoUrl vào entry"""
+        def remember(upload_id):
+            entry["upload_id"] = upload_id
+            with self._cond:
+                self._save(entry)
+
+        entry["video_url"] = self.uploader.upload(entry["video_path"], upload_id=entry.get("upload_id"), on_created=remember)
+        with self._cond:
+            self._save(entry)
+
+    def _post(self, entry):
+        """Gửi một báo cáo dạng multipart/form-data"""
+        has_video = entry.get("video_path") and os.path.exists(entry["video_path"])
+        if has_video and self.uploader is not None and not entry.get("video_url"):
+            self._upload_video(entry)  # UploadError -> lần thử này thất bại, sẽ thử lại sau
+
+        files = {}
+        try:
+            for field, path in zip(("imageBefore", "imageDuring", "imageAfter"), entry["snapshots"]):
+                if path and os.path.exists(path):
+                    files[field] = open(path, 'rb')
+            if has_video and self.uploader is None:
+                files['video'] = open(entry["video_path"], 'rb')
+
+            data = {
+                'type': entry["label"],
+                'description': entry["description"],
+                'idempotencyKey': entry["id"],
+            }
+            if entry.get("video_url"):
+                data['videoUrl'] = entry["video_url"]
+            return self.session.post(self.url, files=files, data=data,
+                                 headers={'Idempotency-Key': entry["id"]}, timeout=self.timeout)
+        finally:
+            for f in files.values():
+                f.close()
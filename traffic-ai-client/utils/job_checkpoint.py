@@ -0,0 +1,43 @@
+import json
+import os
+
+from utils.event_log import write_json_atomic
+
+
+class CheckpointStore:
+    """
+    Lưu checkpoint của job batch trên đĩa, mỗi job một file <job_id>.json
+
+    Checkpoint gồm tham số của job (để chạy lại sau khi khởi động lại server) và trạng thái
+    xử lý tại frame đã lưu: vị trí frame, state machine xác nhận tai nạn, ảnh đã chụp,
+    các phần video đầu ra đã đóng. Ghi qua file tạm nên không bao giờ bị đọc dở.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def save(self, job_id, data):
+        write_json_atomic(self.path_for(job_id), data)
+
+    def remove(self, job_id):
+        try:
+            os.remove(self.path_for(job_id))
+        except FileNotFoundError:
+            pass
+
+    def load_all(self):
+        """Tất cả checkpoint còn trên đĩa (job chưa kết thúc khi server dừng)"""
+        checkpoints = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    checkpoints.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping unreadable checkpoint {name}: {e}")
+        return checkpoints
@@ -0,0 +1,55 @@
+import json
+import queue
+import threading
+
+# Trạng thái kết thúc: stream SSE tự đóng sau khi gửi sự kiện này
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "STOPPED")
+
+
+class JobEventBus:
+    """
+    Phát sự kiện của job (tiến độ, phát hiện, hoàn thành) đến các subscriber
+    Mỗi subscriber (một kết nối SSE) có một hàng đợi riêng, giới hạn kích thước:
+    subscriber chậm chỉ mất sự kiện cũ nhất, không làm chậm thread xử lý video.
+    """
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subscribers = {}  # job_id -> set(queue.Queue)
+        self._lock = threading.Lock()
+
+    def subscribe(self, job_id):
+        """Đăng ký nhận sự kiện của một job, trả về hàng đợi (event, data)"""
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, job_id, q):
+        with self._lock:
+            subs = self._subscribers.get(job_id)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subscribers[job_id]
+
+    def publish(self, job_id, event, data):
+        """Gửi sự kiện cho mọi subscriber của job (không bao giờ chặn)"""
+        with self._lock:
+            subs = list(self._subscribers.get(job_id, ()))
+        for q in subs:
+            while True:
+                try:
+                    q.put_nowait((event, data))
+                    break
+                except queue.Full:
+                    # Bỏ sự kiện cũ nhất để nhường chỗ (sự kiện mới quan trọng hơn)
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+def format_sse(event, data):
+    """Định dạng một sự kiện Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
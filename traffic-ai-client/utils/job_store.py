@@ -0,0 +1,225 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+
+# Trạng thái kết thúc: job ở trạng thái này có thể bị thu hồi sau TTL
+FINISHED_STATUSES = ("COMPLETED", "FAILED", "STOPPED")
+
+
+class JobStore:
+    """
+    Kho lưu trạng thái job an toàn đa luồng (thread xử lý video, event loop WebRTC, Flask)
+
+    - Mọi thay đổi đi qua update() dưới một lock; get() trả về bản sao
+      -> không ai đọc được một job đang sửa dở
+    - Job đã kết thúc bị thu hồi sau `ttl` giây; tổng số job giới hạn bởi `max_jobs`
+      (bỏ job kết thúc cũ nhất trước) -> bộ nhớ không tăng mãi khi chạy 24/7
+    - db_path: lưu song song vào SQLite để trạng thái còn sau khi khởi động lại;
+      job đang chạy dở lúc tắt server được đánh dấu FAILED khi nạp lại
+    - Ghi SQLite nằm ngoài lock của kho (lock riêng _db_lock): commit không chặn người đọc/ghi job.
+      Tạo job và đổi trạng thái được ghi ngay; các cập nhật khác (tiến độ...) ghi tối đa
+      một lần mỗi `persist_interval` giây cho mỗi job, phần còn lại được thread nền ghi gộp
+    """
+
+    def __init__(self, ttl=3600, max_jobs=1000, db_path=None, persist_interval=1.0):
+        """
+        Args:
+            ttl: Thời gian giữ job đã kết thúc (giây)
+            max_jobs: Số job tối đa giữ trong kho
+            db_path: Đường dẫn file SQLite (None = chỉ lưu trong bộ nhớ)
+            persist_interval: Khoảng cách tối thiểu (giây) giữa hai lần ghi cập nhật không đổi trạng thái của một job
+        """
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.persist_interval = persist_interval
+        self._jobs = {}
+        self._lock = threading.RLock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._versions = {}  # job_id -> số lần thay đổi (chỉ dùng dưới _lock)
+        self._last_persist = {}  # job_id -> thời điểm ghi gần nhất (dưới _lock)
+        self._dirty = {}  # job_id -> (version, row) chờ thread nền ghi (dưới _lock)
+        self._written = {}  # job_id -> version đã ghi xuống SQLite (dưới _db_lock)
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT, created_at REAL, updated_at REAL, data TEXT)")
+            self._db.commit()
+            self._load()
+            self._flush_event = threading.Event()
+            threading.Thread(target=self._flush_loop, name="JobStoreFlush", daemon=True).start()
+
+    # --- Truy cập ---
+
+    def create(self, job_id, job):
+        """Thêm job mới (ghi đè nếu trùng id)"""
+        now = time.time()
+        job = dict(job, id=job_id)
+        job.setdefault('createdAt', now)
+        job['updatedAt'] = now
+        with self._lock:
+            self._jobs[job_id] = job
+            pending = self._snapshot(job, urgent=True)
+            self._enforce_limit()
+        self._write(pending)
+        return copy.deepcopy(job)
+
+    def get(self, job_id, default=None):
+        """Bản sao của job (sửa bản sao không ảnh hưởng kho), hoặc default"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else default
+
+    def update(self, job_id, **fields):
+        """
+        Cập nhật nguyên tử các trường của job
+        Trả về False nếu job không tồn tại (đã bị thu hồi)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            old_status = job.get('status')
+            job.update(copy.deepcopy(fields))
+            job['updatedAt'] = time.time()
+            if job.get('status') in FINISHED_STATUSES:
+                job.setdefault('endedAt', job['updatedAt'])
+            pending = self._snapshot(job, urgent=job.get('status') != old_status)
+        self._write(pending)
+        return True
+
+    def remove(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._dirty.pop(job_id, None)
+            self._last_persist.pop(job_id, None)
+            version = self._versions.get(job_id, 0)
+        if self._db is not None:
+            with self._db_lock:
+                # Bản ghi cũ hơn đang chờ ghi (version <= version hiện tại) sẽ bị bỏ qua
+                self._written[job_id] = max(self._written.get(job_id, 0), version)
+                self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                self._db.commit()
+
+    def __contains__(self, job_id):
+        with self._lock:
+            return job_id in self._jobs
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def items(self):
+        """Danh sách (id, bản sao job) tại thời điểm gọi"""
+        with self._lock:
+            return [(job_id, copy.deepcopy(job)) for job_id, job in self._jobs.items()]
+
+    def values(self):
+        return [job for _, job in self.items()]
+
+    def page(self, offset=0, limit=50, status=None, job_type=None):
+        """
+        Liệt kê job theo trang, mới nhất trước
+
+        Returns:
+            (tổng số job khớp bộ lọc, danh sách job của trang)
+        """
+        with self._lock:
+            matched = [j for j in self._jobs.values()
+                       if (status is None or j.get('status') == status)
+                       and (job_type is None or j.get('type') == job_type)]
+            matched.sort(key=lambda j: j.get('createdAt', 0), reverse=True)
+            return len(matched), copy.deepcopy(matched[offset:offset + limit])
+
+    # --- Thu hồi ---
+
+    def evict_expired(self, now=None):
+        """Xóa các job đã kết thúc quá ttl giây, trả về danh sách id đã xóa"""
+        now = now or time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.get('status') in FINISHED_STATUSES
+                       and now - job.get('endedAt', job.get('updatedAt', now)) > self.ttl]
+            for job_id in expired:
+                self.remove(job_id)
+        return expired
+
+    def _enforce_limit(self):
+        """Vượt max_jobs: bỏ các job đã kết thúc cũ nhất (job đang chạy không bao giờ bị bỏ)"""
+        overflow = len(self._jobs) - self.max_jobs
+        if overflow <= 0:
+            return
+        finished = sorted((j for j in self._jobs.values() if j.get('status') in FINISHED_STATUSES),
+                          key=lambda j: j.get('endedAt', j.get('updatedAt', 0)))
+        for job in finished[:overflow]:
+            self.remove(job['id'])
+
+    # --- SQLite ---
+
+    def _snapshot(self, job, urgent):
+        """
+        Gọi dưới _lock: chụp bản ghi SQLite của job
+        Trả về danh sách cần ghi ngay (urgent hoặc đã quá persist_interval), nếu không thì để thread nền ghi
+        """
+        if self._db is None:
+            return []
+        job_id = job['id']
+        version = self._versions.get(job_id, 0) + 1
+        self._versions[job_id] = version
+        row = (job_id, job.get('status'), job.get('createdAt'), job.get('updatedAt'), json.dumps(job, default=str))
+        now = time.time()
+        if urgent or now - self._last_persist.get(job_id, 0) >= self.persist_interval:
+            self._dirty.pop(job_id, None)
+            self._last_persist[job_id] = now
+            return [(version, row)]
+        self._dirty[job_id] = (version, row)
+        return []
+
+    def _write(self, pending):
+        """Ghi các bản ghi (version, row) trong một transaction, bỏ bản cũ hơn bản đã ghi (ngoài _lock)"""
+        if not pending or self._db is None:
+            return
+        with self._db_lock:
+            rows = [row for version, row in pending if version > self._written.get(row[0], 0)]
+            if not rows:
+                return
+            self._db.executemany(
+                "INSERT OR REPLACE INTO jobs (id, status, created_at, updated_at, data) VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+            for version, row in pending:
+                self._written[row[0]] = max(self._written.get(row[0], 0), version)
+
+    def _flush_loop(self):
+        """Thread nền: mỗi persist_interval giây ghi gộp các cập nhật đang chờ"""
+        while not self._flush_event.wait(self.persist_interval):
+            self.flush()
+
+    def flush(self):
+        """Ghi ngay mọi cập nhật đang chờ xuống SQLite"""
+        with self._lock:
+            pending = list(self._dirty.values())
+            self._dirty.clear()
+            now = time.time()
+            for _, row in pending:
+                self._last_persist[row[0]] = now
+        self._write(pending)
+
+    def _load(self):
+        """Nạp job từ SQLite; job chưa kết thúc lúc tắt server không thể tiếp tục -> FAILED"""
+        rows = self._db.execute("SELECT data FROM jobs").fetchall()
+        interrupted = 0
+        for (data,) in rows:
+            job = json.loads(data)
+            if job.get('status') not in FINISHED_STATUSES:
+                job['status'] = 'FAILED'
+                job['message'] = 'Interrupted by server restart'
+                job['endedAt'] = time.time()
+                self._write(self._snapshot(job, urgent=True))
+                interrupted += 1
+            self._jobs[job['id']] = job
+        if rows:
+            print(f"Job store: restored {len(rows)} job(s) ({interrupted} interrupted)")
+        self.evict_expired()
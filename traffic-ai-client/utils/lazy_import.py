@@ -0,0 +1,64 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Module nặng chỉ nên được import khi dùng lần đầu (qua lazy_import), không phải lúc khởi động
+HEAVY_MODULES = ("torch", "ultralytics", "aiortc", "av")
+
+_import_times = {}  # tên module -> số giây của lần import đầu tiên qua lazy_import
+_lock = threading.Lock()
+
+
+def lazy_import(name):
+    """
+    Import module khi dùng lần đầu (thay cho import ở đầu file) và ghi lại thời gian import
+
+    Module đã được import thì trả về ngay (dùng được trong vòng lặp xử lý frame).
+    An toàn khi gọi đồng thời từ nhiều thread (khóa import của Python).
+    """
+    if name in sys.modules:
+        return importlib.import_module(name)
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - start
+    with _lock:
+        first = name not in _import_times
+        if first:
+            _import_times[name] = elapsed
+    if first:
+        print(f"📦 Imported {name} in {elapsed * 1000:.0f} ms")
+    return module
+
+
+def import_times():
+    """Thời gian import (giây) của các module đã tải qua lazy_import, chậm nhất trước"""
+    with _lock:
+        return sorted(_import_times.items(), key=lambda item: item[1], reverse=True)
+
+
+def startup_report(name, started_at, budget_ms=None):
+    """
+    In thời gian khởi động so với ngân sách và các module nặng đã bị import trong lúc khởi động
+
+    Args:
+        name: Tên ứng dụng hiển thị trong báo cáo
+        started_at: Mốc time.perf_counter() ở đầu tiến trình
+        budget_ms: Ngân sách (mặc định STARTUP_BUDGET_MS hoặc 1000)
+
+    Returns:
+        Thời gian khởi động (ms)
+    """
+    if budget_ms is None:
+        budget_ms = float(os.environ.get("STARTUP_BUDGET_MS", 1000))
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    status = "✅" if elapsed_ms <= budget_ms else "⚠️ over budget"
+    print(f"⏱️ {name} ready in {elapsed_ms:.0f} ms (budget {budget_ms:.0f} ms) {status}")
+
+    loaded = [module for module in HEAVY_MODULES if module in sys.modules]
+    if loaded:
+        print(f"⚠️ Heavy modules imported during startup: {', '.join(loaded)}")
+    for module, seconds in import_times():
+        print(f"   📦 {module}: {seconds * 1000:.0f} ms")
+    return elapsed_ms
@@ -0,0 +1,139 @@
+import os
+import threading
+from concurrent.futures import Future
+
+from utils.lazy_import import lazy_import
+
+
+class ModelCache:
+    """
+    Cache mô hình YOLO dùng chung cho mọi DetectionThread trong tiến trình
+
+    - Khóa theo (đường dẫn tuyệt đối, mtime): thay file .pt thì lần lấy sau tự tải lại
+    - acquire() cho mượn một instance đang rảnh (chỉ tải mới khi tất cả đều đang được dùng),
+      release() trả lại -> batch nhiều file chỉ tải trọng số một lần
+    - Tracker (ByteTrack, persist=True) được reset mỗi lần cho mượn: ID đối tượng của file trước
+      không lẫn sang file sau
+    - preload() tải trước trong thread nền (ultralytics/PyTorch cũng chỉ được import lúc này);
+      acquire() trong lúc đang tải trước sẽ chờ và dùng luôn instance đó thay vì tải lần hai
+    """
+
+    def __init__(self):
+        self._idle = {}   # (path, mtime) -> [model]
+        self._keys = {}   # id(model) -> (path, mtime) của instance đang cho mượn
+        self._loading = {}  # (path, mtime) -> Future của lần preload() chưa có ai nhận
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_path):
+        path = os.path.abspath(model_path)
+        return path, os.path.getmtime(path)
+
+    def acquire(self, model_path):
+        key = self._key(model_path)
+        with self._lock:
+            # File đã đổi: bỏ các instance của phiên bản cũ
+            for stale in [k for k in self._idle if k[0] == key[0] and k != key]:
+                del self._idle[stale]
+            idle = self._idle.get(key)
+            model = idle.pop() if idle else None
+            pending = self._loading.pop(key, None) if model is None else None
+
+        if pending is not None:
+            try:
+                model = pending.result()
+            except Exception:
+                model = None  # Tải trước lỗi: thử tải lại bên dưới (báo lỗi cho người gọi)
+
+        if model is None:
+            model = _load_model(key[0])
+        else:
+            reset_tracker(model)
+
+        with self._lock:
+            self._keys[id(model)] = key
+        return model
+
+    def preload(self, model_path):
+        """
+        Tải trước một instance trong thread nền (không chặn) để lần acquire() đầu tiên không phải chờ
+
+        Returns:
+            Future (kết quả là instance, hoặc exception nếu tải lỗi)
+        """
+        future = Future()
+        try:
+            key = self._key(model_path)
+        except OSError as e:
+            future.set_exception(e)
+            return future
+        with self._lock:
+            if key in self._loading:
+                return self._loading[key]
+            idle = self._idle.get(key)
+            if idle:
+                future.set_result(idle[-1])
+                return future
+            self._loading[key] = future
+
+        def load():
+            try:
+                model = _load_model(key[0])
+            except Exception as e:
+                with self._lock:
+                    if self._loading.get(key) is future:
+                        del self._loading[key]
+                future.set_exception(e)
+                return
+            with self._lock:
+                # Chưa có acquire() nào nhận instance này -> cất vào danh sách rảnh
+                if self._loading.get(key) is future:
+                    del self._loading[key]
+                    self._idle.setdefault(key, []).append(model)
+            future.set_result(model)
+
+        threading.Thread(target=load, name="model-preload", daemon=True).start()
+        return future
+
+    def release(self, model):
+        """Trả instance về cache (bỏ đi nếu file mô hình đã thay đổi trong lúc dùng)"""
+        with self._lock:
+            key = self._keys.pop(id(model), None)
+            if key is None:
+                return
+            try:
+                current = self._key(key[0])
+            except OSError:
+                return
+            if current == key:
+                self._idle.setdefault(key, []).append(model)
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+
+
+def _load_model(path):
+    YOLO = lazy_import("ultralytics").YOLO
+    print(f"Loading model from {path}...")
+    return YOLO(path)
+
+
+def reset_tracker(model):
+    """Xóa trạng thái tracker của lần track() trước (nếu có)"""
+    predictor = getattr(model, "predictor", None)
+    for tracker in getattr(predictor, "trackers", None) or []:
+        tracker.reset()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_model_cache():
+    """Lấy ModelCache dùng chung cho cả tiến trình (tạo khi dùng lần đầu)"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ModelCache()
+        return _default_cache
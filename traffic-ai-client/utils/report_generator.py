@@ -17,10 +17,12 @@ class ReportGenerator:
         self.api_client = api_client
         print("✅ Report Generator initialized (Java Backend mode)")
     
-    def generate_report(self, before_path: str, during_path: str, after_path: str, incident_type: str, video_path: str = None) -> dict:
+    def generate_report(self, before_path: str, during_path: str, after_path: str, incident_type: str, video_path: str = None,
+                        clip_range: Optional[tuple] = None, progress_callback=None) -> dict:
         """
         Gửi 3 ảnh đến Java backend để tạo báo cáo AI
-        Có thể kèm video nếu có
+        Có thể kèm video nếu có (clip_range=(start, end) giây để chỉ gửi clip quanh sự cố,
+        progress_callback(sent_bytes, total_bytes) để theo dõi tiến độ upload video)
         
         Logic:
         - Nếu không có API client, trả về báo cáo fallback
@@ -38,7 +40,8 @@ class ReportGenerator:
         
         # Gọi Java API với 3 ảnh + video (nếu có)
         result = self.api_client.send_full_report(
-            before_path, during_path, after_path, incident_type, video_path
+            before_path, during_path, after_path, incident_type, video_path,
+            clip_range=clip_range, progress_callback=progress_callback
         )
         
         if result:
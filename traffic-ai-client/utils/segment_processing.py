@@ -0,0 +1,195 @@
+import json
+import math
+import os
+import subprocess
+import sys
+
+import cv2
+
+from utils.detection_timeline import DetectionTimeline
+from utils.drawing import add_timestamp, draw_styled_box
+
+# Xử lý song song một video dài theo đoạn thời gian: mỗi đoạn chạy trong một tiến trình Python riêng
+# (python -m utils.segment_processing task.json result.json). Tiến trình con chỉ import module này,
+# không import server.py (server.py tải model, mở event loop WebRTC và outbox ngay khi import).
+# Thư mục traffic-ai-client: cwd của tiến trình con để import được package utils
+CLIENT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def plan_segments(total_frames, count, overlap_frames):
+    """
+    Chia video thành `count` đoạn liên tiếp
+
+    Mỗi đoạn bắt đầu chạy sớm hơn `overlap_frames` frame (khởi động state machine xác nhận,
+    giống như đoạn trước vẫn đang chạy) nhưng chỉ "sở hữu" frame từ start đến end.
+
+    Returns:
+        [(warmup_start, start, end)], end không tính
+    """
+    size = math.ceil(total_frames / count)
+    plan = []
+    for start in range(0, total_frames, size):
+        end = min(total_frames, start + size)
+        plan.append((max(0, start - overlap_frames), start, end))
+    return plan
+
+
+def analyze_segment(task):
+    """
+    Xử lý một đoạn video trong tiến trình worker (chạy AI, vẽ box, ghi phần video đầu ra)
+
+    Args:
+        task: dict gồm input_path, part_path, model_path, warmup_start, start, end, fps,
+              target_labels, confidence_threshold, frame_skip, confirmation_frames,
+              min_fallback_streak, cooldown_frames
+
+    Returns:
+        dict: incidents (frame, time, label, confidence lúc xác nhận), timeline (to_state),
+              fallback (phát hiện dự phòng tốt nhất hoặc None), detectionCount, part_path
+    """
+    from ultralytics import YOLO  # Chỉ tải trong tiến trình worker
+    model = YOLO(task['model_path'])
+    fps = task['fps']
+    start, end = task['start'], task['end']
+    target_labels = task['target_labels']
+    confidence_threshold = task['confidence_threshold']
+
+    cap = cv2.VideoCapture(task['input_path'])
+    cap.set(cv2.CAP_PROP_POS_FRAMES, task['warmup_start'])
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    out = cv2.VideoWriter(task['part_path'], cv2.VideoWriter_fourcc(*'VP80'), fps, (width, height))
+
+    timeline = DetectionTimeline()
+    incidents = []
+    fallback = None
+    detection_count = 0
+    last_boxes = []
+    streak = 0
+    cooldown = 0  # Số frame còn lại của CAPTURING_AFTER + COOLDOWN sau một sự cố đã xác nhận
+
+    try:
+        for frame_index in range(task['warmup_start'], end):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            owned = frame_index >= start
+            found = False
+            best_label, best_conf = "", 0.0
+
+            if frame_index % task['frame_skip'] == 0:
+                results = model.track(frame, persist=True, imgsz=640, verbose=False, tracker="bytetrack.yaml")
+                last_boxes = []
+                for result in results or []:
+                    for box in result.boxes:
+                        label = model.names[int(box.cls[0])]
+                        last_boxes.append((tuple(map(int, box.xyxy[0])), label, float(box.conf[0])))
+            for coords, label, conf in last_boxes:
+                if label.lower() in target_labels and conf > confidence_threshold and conf > best_conf:
+                    found, best_label, best_conf = True, label, conf
+
+            if found:
+                streak += 1
+                if owned:
+                    timeline.add(frame_index, frame_index / fps, best_label, best_conf)
+                    detection_count += 1
+                    if streak >= task['min_fallback_streak'] and (fallback is None or best_conf > fallback['confidence']):
+                        fallback = {"frame": frame_index, "time": frame_index / fps,
+                                    "label": best_label, "confidence": best_conf}
+                if cooldown == 0 and streak >= task['confirmation_frames']:
+                    if owned:
+                        incidents.append({"frame": frame_index, "time": frame_index / fps,
+                                          "label": best_label, "confidence": best_conf})
+                    cooldown = task['cooldown_frames']
+            else:
+                streak = 0
+
+            if cooldown > 0:
+                cooldown -= 1
+                if cooldown == 0:
+                    streak = 0
+
+            if not owned:
+                continue
+            annotated = frame.copy()
+            add_timestamp(annotated, frame_index / fps)
+            for (x1, y1, x2, y2), label, conf in last_boxes:
+                color = (0, 0, 255) if label.lower() in target_labels else (0, 255, 0)
+                draw_styled_box(annotated, x1, y1, x2, y2, label, conf, color)
+            if streak > 0 and cooldown == 0:
+                bar_width = min(int((streak / task['confirmation_frames']) * 200), 200)
+                cv2.rectangle(annotated, (50, 50), (50 + 200, 70), (255, 255, 255), 2)
+                cv2.rectangle(annotated, (50, 50), (50 + bar_width, 70), (0, 0, 255), -1)
+                cv2.putText(annotated, "CONFIRMING...", (50, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            out.write(annotated)
+    finally:
+        cap.release()
+        out.release()
+
+    return {
+        "part_path": task['part_path'],
+        "incidents": incidents,
+        "timeline": timeline.to_state(),
+        "fallback": fallback,
+        "detectionCount": detection_count,
+    }
+
+
+def merge_incidents(segment_incidents, cooldown_frames):
+    """
+    Gộp sự cố của các đoạn (theo thứ tự đoạn) và bỏ trùng ở ranh giới
+
+    Đoạn sau không biết đoạn trước vừa xác nhận sự cố ở sát ranh giới nên có thể xác nhận lại
+    cùng vụ đó: sự cố nằm trong khoảng cooldown của sự cố đã giữ bị bỏ, giống như khi chạy tuần tự.
+    """
+    merged = []
+    for incidents in segment_incidents:
+        for incident in incidents:
+            if merged and incident['frame'] - merged[-1]['frame'] < cooldown_frames:
+                continue
+            merged.append(incident)
+    return merged
+
+
+def run_segment(task, cancel_event=None):
+    """
+    Chạy analyze_segment trong một tiến trình con và chờ kết quả (gọi từ thread pool của server)
+
+    Args:
+        task: Tham số của đoạn (xem analyze_segment)
+        cancel_event: threading.Event; khi được set (đoạn khác thất bại) tiến trình con bị kill
+
+    Raises:
+        RuntimeError nếu tiến trình con thất bại hoặc bị hủy
+    """
+    task_path = task['part_path'] + ".task.json"
+    result_path = task['part_path'] + ".result.json"
+    with open(task_path, 'w', encoding='utf-8') as f:
+        json.dump(task, f)
+    try:
+        proc = subprocess.Popen([sys.executable, "-m", "utils.segment_processing", task_path, result_path],
+                                cwd=CLIENT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        while True:
+            try:
+                _, stderr = proc.communicate(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_event is not None and cancel_event.is_set():
+                    proc.kill()
+                    proc.communicate()
+                    raise RuntimeError(f"Segment {task['start']}-{task['end']} cancelled")
+        if proc.returncode != 0:
+            raise RuntimeError(f"Segment {task['start']}-{task['end']} failed: {stderr.strip()[-500:]}")
+        with open(result_path, encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        for path in (task_path, result_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    with open(sys.argv[1], encoding='utf-8') as f:
+        segment_result = analyze_segment(json.load(f))
+    with open(sys.argv[2], 'w', encoding='utf-8') as f:
+        json.dump(segment_result, f)
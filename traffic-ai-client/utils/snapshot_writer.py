@@ -0,0 +1,112 @@
+import cv2
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class SnapshotWriter:
+    """
+    Ghi ảnh snapshot (JPEG) trong thread nền để I/O ổ đĩa không làm chậm vòng lặp phát hiện
+
+    - submit() trả về ngay một Future, Future được resolve với đường dẫn khi file đã ghi xong
+    - Mã hóa JPEG với chất lượng cấu hình được
+    - Ghi nguyên tử: ghi ra file tạm rồi os.replace(), không bao giờ có file ghi dở
+    - Một worker duy nhất -> các ảnh được ghi đúng thứ tự đã submit
+
+    Lưu ý: frame truyền vào không được sửa sau khi submit (truyền bản copy nếu cần).
+    """
+
+    def __init__(self, quality=95, max_queue=128):
+        """
+        Args:
+            quality: Chất lượng JPEG (0-100)
+            max_queue: Số ảnh chờ tối đa; khi đầy submit() sẽ chờ (backpressure)
+        """
+        self.quality = int(quality)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="SnapshotWriter")
+        self._thread.start()
+
+    def submit(self, frame, path, quality=None):
+        """
+        Đưa một frame vào hàng đợi ghi
+
+        Returns:
+            Future resolve với `path` khi ghi xong (hoặc exception nếu lỗi)
+        """
+        future = Future()
+        self._queue.put((frame, path, self.quality if quality is None else int(quality), future))
+        return future
+
+    def flush(self):
+        """Chờ đến khi mọi ảnh đã submit được ghi xong"""
+        self._queue.join()
+
+    def _worker(self):
+        while True:
+            frame, path, quality, future = self._queue.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    self._write(frame, path, quality)
+                    future.set_result(path)
+            except Exception as e:
+                print(f"❌ Snapshot write failed ({path}): {e}")
+                future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _write(frame, path, quality):
+        """Mã hóa JPEG và ghi nguyên tử (file tạm + os.replace)"""
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise IOError("JPEG encoding failed")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(buf)
+        os.replace(tmp_path, path)
+
+
+def when_written(futures, callback):
+    """
+    Gọi callback() (trong thread ghi) khi tất cả futures đã hoàn thành
+    Gọi ngay lập tức nếu danh sách rỗng
+    """
+    futures = [f for f in futures if f is not None]
+    if not futures:
+        callback()
+        return
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _done(_):
+        with lock:
+            remaining[0] -= 1
+            fire = remaining[0] == 0
+        if fire:
+            callback()
+
+    for f in futures:
+        f.add_done_callback(_done)
+
+
+_default_writer = None
+_default_lock = threading.Lock()
+
+
+def get_snapshot_writer(quality=None):
+    """
+    Lấy SnapshotWriter dùng chung cho cả tiến trình (tạo khi dùng lần đầu)
+    Chất lượng mặc định lấy từ biến môi trường SNAPSHOT_JPEG_QUALITY (95)
+    """
+    global _default_writer
+    with _default_lock:
+        if _default_writer is None:
+            if quality is None:
+                quality = int(os.environ.get("SNAPSHOT_JPEG_QUALITY", 95))
+            _default_writer = SnapshotWriter(quality=quality)
+        return _default_writer
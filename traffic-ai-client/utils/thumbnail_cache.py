@@ -0,0 +1,198 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, Qt, pyqtSignal, pyqtSlot
+from PyQt6.QtGui import QImage, QPixmap
+
+from utils.http_session import get_http_session, get_timeout
+
+
+class ThumbnailCache(QObject):
+    """
+    Ảnh thu nhỏ cho các gallery snapshot của desktop app
+
+    - LRU trong bộ nhớ (QPixmap), cache ảnh đã scale trên đĩa (JPEG) nên mở lại dialog không phải
+      giải mã ảnh gốc hay tải lại ảnh từ server
+    - Chỉ lưu xuống đĩa ảnh cỡ thumbnail (cạnh dài <= max_persist_side); thư mục cache giới hạn
+      max_disk_bytes, vượt thì xóa file lâu không dùng nhất (theo mtime, được cập nhật mỗi lần đọc)
+    - Giải mã + scale bằng QImage trong thread pool nền; widget nhận QPixmap qua callback (trên thread GUI)
+      khi ảnh sẵn sàng, nên gallery hiện ngay và ảnh xuất hiện dần
+    - Nguồn: đường dẫn file cục bộ hoặc URL http(s) (ví dụ /data/<file> của Python server)
+
+    Phải được tạo trên thread GUI (sau QApplication).
+    """
+    _loaded = pyqtSignal(str, object)  # (key, QImage hoặc None), phát từ thread nền
+
+    def __init__(self, cache_dir, max_items=256, max_workers=None, quality=85,
+                 max_disk_bytes=None, max_persist_side=None):
+        """
+        Args:
+            cache_dir: Thư mục lưu thumbnail trên đĩa
+            max_items: Số QPixmap tối đa giữ trong bộ nhớ
+            max_workers: Số thread giải mã (mặc định THUMBNAIL_WORKERS hoặc 4)
+            quality: Chất lượng JPEG của thumbnail trên đĩa
+            max_disk_bytes: Dung lượng tối đa của thư mục cache (mặc định THUMBNAIL_CACHE_MB hoặc 100 MB)
+            max_persist_side: Cạnh dài tối đa của ảnh được lưu xuống đĩa (mặc định THUMBNAIL_PERSIST_MAX_SIDE hoặc 400)
+        """
+        super().__init__()
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.quality = quality
+        if max_disk_bytes is None:
+            max_disk_bytes = int(float(os.environ.get("THUMBNAIL_CACHE_MB", 100)) * 1024 * 1024)
+        if max_persist_side is None:
+            max_persist_side = int(os.environ.get("THUMBNAIL_PERSIST_MAX_SIDE", 400))
+        self.max_disk_bytes = max_disk_bytes
+        self.max_persist_side = max_persist_side
+        os.makedirs(cache_dir, exist_ok=True)
+        if max_workers is None:
+            max_workers = int(os.environ.get("THUMBNAIL_WORKERS", 4))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        self._memory = OrderedDict()  # key -> QPixmap (chỉ dùng trên thread GUI)
+        self._waiting = {}  # key -> [callback] đang chờ cùng một ảnh
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0  # Ước lượng dung lượng thư mục cache, tính lại mỗi lần dọn
+        self._loaded.connect(self._deliver)
+        self._pool.submit(self._prune_disk)  # Tính dung lượng ban đầu (và dọn nếu đã vượt) trong nền
+
+    def request(self, source, width, height, callback, persist=True):
+        """
+        Lấy ảnh `source` thu nhỏ vừa khung width x height (giữ tỷ lệ)
+
+        callback(pixmap) được gọi trên thread GUI: ngay lập tức nếu đã có trong bộ nhớ,
+        nếu không thì khi ảnh được tải xong (pixmap = None nếu không đọc được ảnh).
+        Widget đã bị đóng trước khi ảnh về thì callback bị bỏ qua.
+        persist=False (ảnh xem phóng to, khung thay đổi kích thước theo cửa sổ) chỉ giữ trong bộ nhớ;
+        ảnh lớn hơn max_persist_side cũng không được lưu xuống đĩa.
+        """
+        key = f"{source}|{int(width)}x{int(height)}"
+        pixmap = self._memory.get(key)
+        if pixmap is not None:
+            self._memory.move_to_end(key)
+            self._call(callback, pixmap)
+            return
+        waiting = self._waiting.setdefault(key, [])
+        waiting.append(callback)
+        if len(waiting) == 1:  # Ảnh này chưa được tải
+            persist = persist and max(int(width), int(height)) <= self.max_persist_side
+            self._pool.submit(self._load, key, source, int(width), int(height), persist)
+
+    def _disk_path(self, key, source):
+        # Ảnh cục bộ: thêm mtime/size để file bị ghi đè thì thumbnail được tạo lại
+        signature = key
+        if not is_remote(source):
+            stat = os.stat(source)
+            signature += f"|{stat.st_mtime_ns}|{stat.st_size}"
+        return os.path.join(self.cache_dir, hashlib.sha1(signature.encode("utf-8")).hexdigest() + ".jpg")
+
+    def _load(self, key, source, width, height, persist):
+        """Chạy trong thread nền: đọc thumbnail từ đĩa, hoặc giải mã ảnh gốc, scale và lưu lại (nếu persist)"""
+        image = None
+        try:
+            disk_path = self._disk_path(key, source) if persist else None
+            if disk_path and os.path.exists(disk_path):
+                image = QImage(disk_path)
+                if not image.isNull():
+                    os.utime(disk_path)  # Đánh dấu vừa dùng (LRU theo mtime)
+            if image is None or image.isNull():
+                if is_remote(source):
+                    response = get_http_session().get(source, timeout=get_timeout("snapshot"))
+                    response.raise_for_status()
+                    image = QImage.fromData(response.content)
+                else:
+                    image = QImage(source)
+                if not image.isNull():
+                    if image.width() > width or image.height() > height:
+                        image = image.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio,
+                                             Qt.TransformationMode.SmoothTransformation)
+                    if disk_path:
+                        self._save_to_disk(image, disk_path)
+        except Exception as e:
+            print(f"⚠️ Thumbnail failed ({source}): {e}")
+            image = None
+        self._loaded.emit(key, image if image is not None and not image.isNull() else None)
+
+    def _save_to_disk(self, image, disk_path):
+        """Lưu thumbnail (ghi file tạm rồi đổi tên), dọn thư mục cache khi vượt max_disk_bytes"""
+        tmp_path = disk_path + ".part"
+        if not image.save(tmp_path, "JPG", self.quality):
+            return
+        os.replace(tmp_path, disk_path)
+        with self._disk_lock:
+            self._disk_bytes += os.path.getsize(disk_path)
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """
+        Tính lại dung lượng thư mục cache; nếu vượt max_disk_bytes thì xóa file có mtime cũ nhất
+        đến khi còn 90% ngân sách (tránh dọn lại sau mỗi lần lưu)
+        """
+        with self._disk_lock:
+            files = []
+            for entry in os.scandir(self.cache_dir):
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    pass  # File vừa bị xóa
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            if total > self.max_disk_bytes:
+                target = self.max_disk_bytes * 0.9
+                for _, size, path in sorted(files):
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    removed += 1
+            self._disk_bytes = total
+        if removed:
+            print(f"🧹 Thumbnail cache pruned {removed} file(s), {total / (1024 * 1024):.1f} MB left")
+
+    @pyqtSlot(str, object)
+    def _deliver(self, key, image):
+        pixmap = QPixmap.fromImage(image) if image is not None else None
+        if pixmap is not None:
+            self._memory[key] = pixmap
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+        for callback in self._waiting.pop(key, []):
+            self._call(callback, pixmap)
+
+    @staticmethod
+    def _call(callback, pixmap):
+        try:
+            callback(pixmap)
+        except RuntimeError:
+            pass  # Widget (QLabel) đã bị hủy, ví dụ dialog đóng trước khi ảnh về
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def is_remote(source):
+    return isinstance(source, str) and source.startswith(("http://", "https://"))
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """Lấy ThumbnailCache dùng chung (thư mục data/cache/thumbnails), tạo khi dùng lần đầu trên thread GUI"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            _default_cache = ThumbnailCache(os.path.join(root_dir, "data", "cache", "thumbnails"))
+        return _default_cache
@@ -0,0 +1,199 @@
+import cv2
+import os
+import tempfile
+
+from utils.lazy_import import lazy_import
+
+# Codec có thể copy nguyên gói (không mã hóa lại) -> container tương ứng
+STREAM_COPY_CONTAINERS = {
+    "h264": ".mp4",
+    "hevc": ".mp4",
+    "mpeg4": ".mp4",
+    "av1": ".mp4",
+    "vp8": ".webm",
+    "vp9": ".webm",
+}
+
+
+def clip_path_for(video_path, start_sec, end_sec, directory=None):
+    """Tạo đường dẫn cho clip cắt từ video_path (mặc định trong thư mục tạm)"""
+    base = os.path.splitext(os.path.basename(video_path))[0]
+    directory = directory or tempfile.gettempdir()
+    return os.path.join(directory, f"{base}_clip_{int(start_sec * 1000)}_{int(end_sec * 1000)}.mp4")
+
+
+def trim_clip(video_path, start_sec, end_sec, output_path=None):
+    """
+    Cắt đoạn [start_sec, end_sec] của video thành một file MP4 nhỏ
+    Dùng để gửi clip quanh sự cố thay vì cả video (giải mã và mã hóa lại bằng OpenCV)
+
+    Returns:
+        Đường dẫn clip, hoặc None nếu không đọc được video
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if not fps or fps <= 0:
+            fps = 30.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        start_frame = max(0, int(start_sec * fps))
+        end_frame = int(end_sec * fps)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        output_path = output_path or clip_path_for(video_path, start_sec, end_sec)
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        written = 0
+        for _ in range(start_frame, end_frame + 1):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+            written += 1
+        out.release()
+    finally:
+        cap.release()
+
+    if written == 0:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return None
+    return output_path
+
+
+def copy_clip(video_path, start_sec, end_sec, output_path=None):
+    """
+    Cắt đoạn [start_sec, end_sec] bằng stream copy (không giải mã / mã hóa lại)
+    Bắt đầu từ keyframe gần nhất TRƯỚC start_sec nên clip có thể dài hơn một chút,
+    đổi lại rất nhanh và giữ nguyên chất lượng gốc.
+
+    Returns:
+        Đường dẫn clip (.mp4 hoặc .webm tùy codec), hoặc None nếu không có gói nào
+
+    Raises:
+        ValueError nếu codec không hỗ trợ stream copy; lỗi của PyAV nếu file hỏng
+    """
+    av = lazy_import("av")  # PyAV chỉ được import khi cắt clip lần đầu
+    with av.open(video_path) as src:
+        in_stream = src.streams.video[0]
+        ext = STREAM_COPY_CONTAINERS.get(in_stream.codec_context.name)
+        if ext is None:
+            raise ValueError(f"Codec '{in_stream.codec_context.name}' cannot be stream-copied")
+        output_path = os.path.splitext(output_path or clip_path_for(video_path, start_sec, end_sec))[0] + ext
+        time_base = in_stream.time_base
+
+        # Nhảy đến keyframe tại hoặc trước start_sec
+        src.seek(int(start_sec / time_base), stream=in_stream, backward=True, any_frame=False)
+
+        written = 0
+        with av.open(output_path, 'w') as dst:
+            from_template = getattr(dst, "add_stream_from_template", None)
+            out_stream = from_template(in_stream) if from_template else dst.add_stream(template=in_stream)
+            offset = None
+            for packet in src.demux(in_stream):
+                if packet.dts is None:  # Gói flush cuối stream
+                    continue
+                ts = packet.pts if packet.pts is not None else packet.dts
+                if ts * time_base > end_sec:
+                    break
+                # Clip bắt đầu từ thời điểm 0
+                if offset is None:
+                    offset = packet.dts
+                packet.dts -= offset
+                if packet.pts is not None:
+                    packet.pts -= offset
+                packet.stream = out_stream
+                dst.mux(packet)
+                written += 1
+
+    if written == 0:
+        os.remove(output_path)
+        return None
+    return output_path
+
+
+def extract_clip(video_path, start_sec, end_sec, output_path=None):
+    """
+    Cắt clip bằng chứng: ưu tiên stream copy, mã hóa lại bằng OpenCV nếu không copy được
+    (codec không hỗ trợ, file không có index...)
+    """
+    try:
+        clip = copy_clip(video_path, start_sec, end_sec, output_path)
+        if clip:
+            return clip
+    except Exception as e:
+        print(f"⚠️ Stream copy failed for {os.path.basename(video_path)} ({e}), re-encoding clip")
+    return trim_clip(video_path, start_sec, end_sec, output_path)
+
+
+def concat_videos(part_paths, output_path):
+    """
+    Nối các phần video (cùng codec, cùng kích thước) thành một file bằng stream copy
+    Dùng cho video đầu ra của job batch được ghi thành nhiều phần (mỗi checkpoint một phần).
+    Nếu copy thất bại thì giải mã và mã hóa lại bằng OpenCV (VP8/WebM như video đầu ra).
+    """
+    if len(part_paths) == 1:
+        os.replace(part_paths[0], output_path)
+        return output_path
+    try:
+        _concat_copy(part_paths, output_path)
+    except Exception as e:
+        print(f"⚠️ Stream copy concat failed ({e}), re-encoding {len(part_paths)} parts")
+        _concat_reencode(part_paths, output_path)
+    for path in part_paths:
+        os.remove(path)
+    return output_path
+
+
+def _concat_copy(part_paths, output_path):
+    # Các phần do cùng một VideoWriter tạo ra nên có cùng time_base:
+    # chỉ cần dịch timestamp của mỗi phần lên sau điểm kết thúc của phần trước
+    av = lazy_import("av")
+    with av.open(output_path, 'w') as dst:
+        out_stream = None
+        offset = 0
+        for path in part_paths:
+            with av.open(path) as src:
+                in_stream = src.streams.video[0]
+                if out_stream is None:
+                    from_template = getattr(dst, "add_stream_from_template", None)
+                    out_stream = from_template(in_stream) if from_template else dst.add_stream(template=in_stream)
+                base = None
+                end = offset
+                for packet in src.demux(in_stream):
+                    if packet.dts is None:  # Gói flush cuối stream
+                        continue
+                    if base is None:
+                        base = packet.dts
+                    pts = packet.pts if packet.pts is not None else packet.dts
+                    packet.dts = packet.dts - base + offset
+                    packet.pts = pts - base + offset
+                    end = max(end, packet.pts + (packet.duration or 1))
+                    packet.stream = out_stream
+                    dst.mux(packet)
+                offset = end
+
+
+def _concat_reencode(part_paths, output_path):
+    out = None
+    try:
+        for path in part_paths:
+            cap = cv2.VideoCapture(path)
+            try:
+                if out is None:
+                    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'VP80'), fps, size)
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    out.write(frame)
+            finally:
+                cap.release()
+    finally:
+        if out is not None:
+            out.release()
@@ -0,0 +1,183 @@
+import cv2
+import os
+import time
+import threading
+
+# Các scheme được coi là nguồn trực tiếp (camera mạng)
+LIVE_SCHEMES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+
+def is_live_source(source):
+    """
+    Kiểm tra nguồn video có phải nguồn trực tiếp không
+    (URL camera mạng hoặc chỉ số webcam như 0, "1")
+    """
+    if isinstance(source, int):
+        return True
+    source = str(source).strip()
+    return source.isdigit() or source.lower().startswith(LIVE_SCHEMES)
+
+
+class LiveVideoSource:
+    """
+    Đọc nguồn video trực tiếp trong thread nền, chỉ giữ frame MỚI NHẤT
+    Frame cũ bị bỏ qua nếu bên tiêu thụ (AI) chậm hơn camera -> không bị trễ tích lũy
+
+    Tự kết nối lại khi mất tín hiệu, với số lần thử giới hạn và backoff tăng dần.
+    Có cùng giao diện cơ bản với cv2.VideoCapture (isOpened, read, get, release)
+    nên có thể thay thế trực tiếp.
+
+    Có thể dùng một file video làm camera giả lập để kiểm thử: frame được phát
+    theo đúng FPS của file, và hết file được xử lý như mất kết nối (mở lại từ đầu).
+    """
+
+    def __init__(self, source, max_retries=5, backoff_base=0.5, backoff_max=8.0, read_timeout=5.0):
+        """
+        Args:
+            source: URL camera (rtsp/http...), chỉ số webcam, hoặc đường dẫn file (giả lập)
+            max_retries: Số lần kết nối lại liên tiếp tối đa trước khi bỏ cuộc
+            backoff_base: Thời gian chờ ban đầu giữa các lần thử (giây), nhân đôi mỗi lần
+            backoff_max: Thời gian chờ tối đa giữa các lần thử (giây)
+            read_timeout: Thời gian tối đa read() chờ frame mới trước khi trả về thất bại
+        """
+        self.source = int(source) if str(source).strip().isdigit() else source
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.read_timeout = read_timeout
+
+        # File cục bộ: phát theo FPS để mô phỏng camera thật
+        self.simulated = isinstance(self.source, str) and os.path.isfile(self.source)
+
+        self.cap = None  # Chỉ thread đọc thay/giải phóng; đổi cap và get() từ thread khác đi qua _cap_lock
+        self._cap_lock = threading.Lock()
+        self.frame = None  # Frame mới nhất
+        self.frame_id = 0  # Tăng mỗi khi có frame mới
+        self.last_read_id = 0  # frame_id cuối cùng đã trả về cho read()
+        self.dropped_frames = 0  # Số frame bị bỏ qua vì bên tiêu thụ chậm
+        self.reconnects = 0
+
+        self._cond = threading.Condition()
+        self._running = True
+        self._failed = False  # True khi đã hết số lần thử kết nối lại
+
+        self._open()
+        self._thread = threading.Thread(target=self._reader, daemon=True, name=f"LiveVideoSource-{self.source}")
+        self._thread.start()
+
+    def _open(self):
+        """Mở (hoặc mở lại) VideoCapture, trả về True nếu thành công"""
+        cap = cv2.VideoCapture(self.source)
+        with self._cap_lock:
+            old, self.cap = self.cap, cap
+            if old is not None:
+                old.release()
+        if cap.isOpened():
+            # Giữ buffer nội bộ của backend nhỏ nhất có thể để giảm độ trễ
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            return True
+        return False
+
+    def _reconnect(self):
+        """
+        Kết nối lại với backoff tăng dần (0.5s, 1s, 2s, ... tối đa backoff_max)
+        Trả về False nếu đã thử max_retries lần mà vẫn thất bại
+        """
+        for attempt in range(1, self.max_retries + 1):
+            if not self._running:
+                return False
+            delay = min(self.backoff_base * (2 ** (attempt - 1)), self.backoff_max)
+            print(f"[LiveSource] Lost '{self.source}'. Reconnecting in {delay:.1f}s ({attempt}/{self.max_retries})...")
+            time.sleep(delay)
+            if self._open():
+                self.reconnects += 1
+                print(f"[LiveSource] Reconnected to '{self.source}'")
+                return True
+        print(f"[LiveSource] Giving up on '{self.source}' after {self.max_retries} attempts")
+        return False
+
+    def _reader(self):
+        """Thread nền: đọc frame liên tục, VideoCapture được giải phóng khi thread kết thúc"""
+        try:
+            self._read_loop()
+        finally:
+            with self._cap_lock:
+                if self.cap is not None:
+                    self.cap.release()
+                    self.cap = None
+
+    def _read_loop(self):
+        """Vòng lặp đọc frame, tự kết nối lại khi mất tín hiệu"""
+        if not self.cap.isOpened() and not self._reconnect():
+            self._fail()
+            return
+
+        fps = self.get(cv2.CAP_PROP_FPS)
+        frame_interval = 1.0 / fps if self.simulated else 0.0
+
+        while self._running:
+            started = time.time()
+            ret, frame = self.cap.read()
+            if not ret:
+                if not self._reconnect():
+                    self._fail()
+                    return
+                continue
+
+            with self._cond:
+                if self.frame_id > self.last_read_id:
+                    # Frame trước chưa được lấy -> bị thay thế (frame cũ)
+                    self.dropped_frames += 1
+                self.frame = frame
+                self.frame_id += 1
+                self._cond.notify_all()
+
+            if frame_interval:
+                time.sleep(max(0.0, frame_interval - (time.time() - started)))
+
+    def _fail(self):
+        with self._cond:
+            self._failed = True
+            self._cond.notify_all()
+
+    def isOpened(self):
+        """True khi nguồn còn hoạt động (kể cả khi đang kết nối lại)"""
+        return self._running and not self._failed
+
+    def read(self):
+        """
+        Lấy frame mới nhất chưa được đọc (chờ tối đa read_timeout giây)
+        Trả về (False, None) nếu nguồn đã dừng, bỏ cuộc, hoặc quá thời gian chờ
+        """
+        deadline = time.time() + self.read_timeout
+        with self._cond:
+            while self.frame_id == self.last_read_id:
+                remaining = deadline - time.time()
+                if not self.isOpened() or remaining <= 0:
+                    return False, None
+                self._cond.wait(remaining)
+            self.last_read_id = self.frame_id
+            return True, self.frame
+
+    def get(self, prop):
+        """Đọc thuộc tính từ VideoCapture; FPS không hợp lệ (0, 90000 của RTSP...) được thay bằng 30"""
+        with self._cap_lock:  # Thread đọc có thể đang thay cap khi kết nối lại
+            value = self.cap.get(prop) if self.cap is not None else 0
+        if prop == cv2.CAP_PROP_FPS and (not value or value <= 0 or value > 120):
+            return 30.0
+        return value
+
+    def set(self, prop, value):
+        """Nguồn trực tiếp không hỗ trợ tua (CAP_PROP_POS_FRAMES...)"""
+        return False
+
+    def release(self):
+        """
+        Dừng thread đọc; VideoCapture được thread tự giải phóng khi thoát
+        (tránh release() trong khi thread vẫn đang read())
+        """
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
@@ -0,0 +1,73 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class IncidentTableModel(QAbstractTableModel):
+    """
+    Model cho bảng lịch sử sự cố (model/view, không tạo widget cho từng dòng)
+    Dòng được sắp mới nhất trước; cột "Report" chỉ là chữ, click vào để xem chi tiết
+    """
+    HEADERS = ["ID", "Timestamp", "Type", "Location", "Report"]
+    REPORT_COLUMN = 4
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._incidents = []
+        self._ids = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._incidents)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        incident = self._incidents[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return incident.get('id')  # Số nguyên -> sắp xếp theo số
+            if column == 1:
+                return str(incident.get('timestamp', ''))
+            if column == 2:
+                return incident.get('type', 'Unknown')
+            if column == 3:
+                return incident.get('location', 'N/A')
+            return "🔍 View"
+        if role == Qt.ItemDataRole.TextAlignmentRole and column == self.REPORT_COLUMN:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def incident_at(self, row):
+        return self._incidents[row]
+
+    def set_incidents(self, incidents):
+        """Thay toàn bộ dữ liệu (danh sách mới nhất trước)"""
+        self.beginResetModel()
+        self._incidents = list(incidents)
+        self._ids = {i.get('id') for i in self._incidents}
+        self.endResetModel()
+
+    def add_incidents(self, incidents):
+        """Thêm các sự cố mới tải về lên đầu bảng (sự cố đã có thì cập nhật tại chỗ)"""
+        new = []
+        for incident in incidents:
+            if incident.get('id') in self._ids:
+                row = next(r for r, i in enumerate(self._incidents) if i.get('id') == incident.get('id'))
+                self._incidents[row] = incident
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+            else:
+                new.append(incident)
+        if not new:
+            return
+        new.sort(key=lambda i: i.get('id') or 0, reverse=True)
+        self.beginInsertRows(QModelIndex(), 0, len(new) - 1)
+        self._incidents[0:0] = new
+        self._ids.update(i.get('id') for i in new)
+        self.endInsertRows()